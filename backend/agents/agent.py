@@ -1,6 +1,22 @@
-from backend.vector_db.db_manager import search_similar
-from backend.generator import generate_text
+import os
+import hashlib
+from typing import Iterator, Optional, Tuple
+from backend.vector_db.db_manager import search_filtered, metadata_filter
+from backend.agents.multi_query import multi_query_search
+from backend.vector_db.reranker import reranker, RERANK_FETCH_FACTOR, RERANK_TOP_N
+from backend.agents.context_selector import select_context, CONTEXT_SELECTION_ENABLED, CONTEXT_FETCH_FACTOR
+from backend.generator import generate_text, generate_text_stream
 from backend.image_generator import generate_image_url
+from backend.metrics import instrument, record_stage_error, SEMANTIC_CACHE_LOOKUPS
+from backend.llm.semantic_cache import semantic_cache, SEMANTIC_CACHE_ENABLED
+from backend.timing import stage
+from backend.llm.prompt_builder import budget_sections, record_prompt_tokens, join_context, context_for_prompt
+from backend.llm.generation_profiles import get_profile, GenerationProfile
+
+# Modelo lógico de redacción; el router lo traduce al nombre de cada backend (Groq, OpenRouter...)
+WRITER_MODEL = os.getenv("LLM_WRITER_MODEL", "llama-3.3-70b-versatile")
+# "single": una consulta con el tema; "multi": varias consultas en paralelo fusionadas con RRF
+RESEARCH_MODE = os.getenv("RESEARCH_MODE", "single").lower()
 
 def get_language_instruction(language):
     return {
@@ -10,38 +26,78 @@ def get_language_instruction(language):
         "Italiano": "Comunica in italiano con calore e autenticità, come se stessi avendo una conversazione amichevole con qualcuno a cui tieni."
     }.get(language, "Comunícate en español de manera natural y fluida, como si estuvieras conversando con alguien que valoras mucho.")
 
-def research_agent(topic: str, company: str, top_k: int = 5, model: str = "llama3-8b-8192") -> str:
+@instrument("research_agent")
+def research_agent(topic: str, company: str, top_k: int = 5, model: str = "llama3-8b-8192",
+                   language: Optional[str] = None, platform: Optional[str] = None, source_type=None,
+                   audience: Optional[str] = None, mode: Optional[str] = None) -> str:
+        """
+        Recupera de Pinecone el contexto para el prompt de redacción.
+        El filtro por empresa (y opcionalmente idioma, plataforma y tipo de fuente) se resuelve en Pinecone,
+        así que los top_k resultados ya son de esa empresa en lugar de descartarse después.
+        - mode: "single" o "multi" (consultas derivadas del tema, la empresa y la audiencia); por defecto RESEARCH_MODE
+        Con RERANK_ENABLED se recuperan top_k * RERANK_FETCH_FACTOR candidatos y el cross-encoder elige
+        los RERANK_TOP_N mejores; si no llega a tiempo se usan los top_k de Pinecone como siempre.
+        Con CONTEXT_SELECTION_ENABLED se quitan los fragmentos casi duplicados y el resto se elige con MMR.
+        """
         context_text = ""
         try:
-            company_clean = company.strip().lower() if company else ""
-            context_results = search_similar(topic, top_k=top_k)
             score_minimo = 0.65
-            empresa_actual = company_clean if company_clean else None
+            if reranker:
+                fetch_k = top_k * RERANK_FETCH_FACTOR
+            else:
+                fetch_k = top_k * CONTEXT_FETCH_FACTOR if CONTEXT_SELECTION_ENABLED else top_k
+            filtros = metadata_filter(company=company, language=language, platform=platform, source_type=source_type)
+            if (mode or RESEARCH_MODE) == "multi":
+                context_results, stats = multi_query_search(topic, company, audience, top_k=fetch_k,
+                                                            filters=filtros, min_score=score_minimo)
+                print(f"🔎 Pinecone ({len(stats['queries'])} consultas fusionadas con RRF): "
+                      f"{stats['scanned']} candidatos escaneados, {stats['fused']} distintos, {stats['kept']} conservados")
+            else:
+                context_results, stats = search_filtered(topic, top_k=fetch_k, filters=filtros, min_score=score_minimo)
+                print(f"🔎 Pinecone: {stats['scanned']} candidatos escaneados, {stats['kept']} conservados "
+                      f"(filtros {filtros or 'ninguno'}{', completado sin filtro nativo' if stats['fallback'] else ''})")
+
+            if CONTEXT_SELECTION_ENABLED:
+                # Con reranker solo se colapsan duplicados (menos pares que puntuar); sin él, MMR elige los top_k
+                context_results, selection_stats = select_context(topic, context_results,
+                                                                  max_chunks=None if reranker else top_k, model=model,
+                                                                  prompt_chunks=top_k)
+                print(f"🧹 Contexto sin redundancia: {selection_stats['selected']} de {selection_stats['candidates']} "
+                      f"fragmentos ({selection_stats['collapsed']} casi duplicados), "
+                      f"{selection_stats['tokens_saved']} tokens ahorrados")
+
+            if reranker:
+                context_results, rerank_stats = reranker.rerank(topic, context_results, top_n=min(top_k, RERANK_TOP_N))
+                if rerank_stats["reranked"]:
+                    print(f"🎯 Reranking: {len(context_results)} de {rerank_stats['candidates']} candidatos "
+                          f"({rerank_stats['cached']} en caché) en {rerank_stats['latency_ms']} ms")
+                else:
+                    print(f"🎯 Reranking omitido ({rerank_stats['outcome']}), se usa el orden de Pinecone")
+                    context_results = context_results[:top_k]
 
-            contexto_filtrado = [
-                doc.page_content for doc, score in context_results
-                if score >= score_minimo
-                and (not empresa_actual or doc.metadata.get("company", "").lower() == empresa_actual)
-            ]
+            contexto_filtrado = [doc.page_content for doc, score in context_results]
 
             if contexto_filtrado:
-                context_text = "\n".join(contexto_filtrado)
+                context_text = join_context(contexto_filtrado)
                 print("🧠 Contexto añadido al prompt desde Pinecone:\n")
                 for fragmento in contexto_filtrado:
                     print(f"- {fragmento[:120]}...")
 
         except Exception as e:
+            record_stage_error("research_agent")
             print(f"⚠️ Error al recuperar contexto desde Pinecone: {e}")
     
         return context_text
 
 
-def writing_agent(topic, platform, tone, company, language, audience, context, model: str, extra_context: str = "") -> tuple[str, str]:
+def build_writing_prompt(topic, platform, tone, company, language, audience, context, extra_context: str = "",
+                         length_instruction: str = "") -> str:
     instruction = get_language_instruction(language)
     audience_text = f"\n🎯 Tu audiencia son: {audience}. Habla su idioma, entiende sus necesidades y conecta con sus intereses genuinos." if audience else ""
     company_text = f"representando la voz auténtica de {company}" if company else "manteniendo una voz profesional pero accesible"
     context_text = f"\n📚 **Información de contexto relevante:**\n{context}\n" if context else ""
     extra_context_text = f"\n📎 Contexto adicional proporcionado por el usuario:\n{extra_context.strip()}" if extra_context else ""
+    length_text = f"\n📏 {length_instruction}" if length_instruction else ""
 
     base_prompt = f"""{instruction}
 
@@ -49,8 +105,119 @@ def writing_agent(topic, platform, tone, company, language, audience, context, m
 
 Escribe un contenido para la plataforma {platform}, sobre el tema: "{topic}" solo adaptate a ese tema, da la informacion que consideres necesaria y basate solo en lo que pide el usuario.
 Usa un tono {tone.lower()} y adáptalo {company_text}.{audience_text}
-Debe ser directo, atractivo y adecuado para esa audiencia {audience}."""
+Debe ser directo, atractivo y adecuado para esa audiencia {audience}.{length_text}"""
+    return base_prompt
+
+
+def build_budgeted_prompt(topic, platform, tone, company, language, audience, context, extra_context: str = "",
+                          model: str = WRITER_MODEL, profile: Optional[GenerationProfile] = None) -> Tuple[str, dict]:
+    """
+    Construye el prompt de redacción ajustando el contexto de Pinecone y el documento subido
+    a su presupuesto de tokens (se conservan los fragmentos más relevantes para el tema).
+    Con `profile`, el prompt pide la longitud objetivo de la plataforma.
+    Devuelve (prompt, tokens por sección y total).
+    """
+    with stage("prompt_build"):
+        sections = budget_sections(f"{topic} {audience or ''}".strip(), context, extra_context, model)
+        prompt = build_writing_prompt(topic, platform, tone, company, language, audience,
+                                      sections.context, sections.extra_context,
+                                      profile.length_instruction() if profile is not None else "")
+        tokens = record_prompt_tokens(prompt, sections, model)
+    return prompt, tokens
+
+
+def _semantic_cache_key(topic, platform, tone, company, language, audience, context, extra_context, model,
+                        llm_backend=None) -> Tuple[tuple, str]:
+    """
+    Clave de la caché semántica de textos:
+    - partición exacta: modelo, backend pedido, idioma, plataforma, tono, empresa y hashes del contexto
+      recuperado y del documento subido (un texto solo se reutiliza si se escribió con la misma información)
+    - texto que se compara por similitud: tema y audiencia (lo que el usuario redacta a mano)
+
+    Se compara solo lo variable y no el prompt completo: MiniLM trunca a 256 tokens, y el
+    contexto de Pinecone que va al principio del prompt dejaría fuera el tema.
+    """
+    def norm(value):
+        return " ".join((value or "").split()).lower()
+
+    def text_hash(value):
+        return hashlib.sha256(norm(value).encode("utf-8")).hexdigest()[:16] if value else None
+
+    partition = (model, llm_backend or "auto", norm(language), norm(platform), norm(tone), norm(company),
+                 text_hash(context_for_prompt(context)), text_hash(extra_context))
+    key_text = f"{' '.join(topic.split())}\n{' '.join((audience or '').split())}"
+    return partition, key_text
 
-    model = "llama-3.3-70b-versatile"
-    text = generate_text(base_prompt, model=model)
+
+def _cache_lookup(use_cache, topic, platform, tone, company, language, audience, context, extra_context, model,
+                  llm_backend=None):
+    """Devuelve (texto en caché o None, función para guardar el texto generado o None)."""
+    if not (use_cache and SEMANTIC_CACHE_ENABLED):
+        SEMANTIC_CACHE_LOOKUPS.labels("bypass").inc()
+        return None, None
+    partition, key_text = _semantic_cache_key(topic, platform, tone, company, language, audience, context,
+                                              extra_context, model, llm_backend)
+    try:
+        with stage("semantic_cache"):
+            cached, embedding = semantic_cache.lookup(partition, key_text)
+    except Exception as e:
+        # Sin modelo de embeddings la generación sigue, solo que sin caché
+        print(f"⚠️ Caché semántica no disponible: {e}")
+        return None, None
+    if cached is not None:
+        print("♻️ Texto reutilizado desde la caché semántica")
+    return cached, lambda text: semantic_cache.store(partition, key_text, text, embedding)
+
+
+def _cached_prompt(topic, platform, tone, company, language, audience, context, extra_context,
+                   profile: GenerationProfile) -> str:
+    """Prompt que se devuelve con un texto de la caché: sin recorte por presupuesto (no se envía al LLM)."""
+    return build_writing_prompt(topic, platform, tone, company, language, audience, context_for_prompt(context),
+                                extra_context, profile.length_instruction())
+
+
+def writing_agent(topic, platform, tone, company, language, audience, context, model: str, extra_context: str = "",
+                  use_cache: bool = False, llm_backend: Optional[str] = None) -> tuple[str, str]:
+    # El perfil de la plataforma fija la longitud, la decodificación y (opcionalmente) el nivel de modelo
+    profile = get_profile(platform)
+    model = profile.model(WRITER_MODEL)
+    # La caché va primero: un acierto se ahorra el tokenizador y la ordenación por embeddings del prompt
+    cached, store = _cache_lookup(use_cache, topic, platform, tone, company, language, audience, context,
+                                  extra_context, model, llm_backend)
+    if cached is not None:
+        return cached, _cached_prompt(topic, platform, tone, company, language, audience, context, extra_context, profile)
+    base_prompt, _tokens = build_budgeted_prompt(topic, platform, tone, company, language, audience, context,
+                                                 extra_context, model, profile)
+    text = generate_text(base_prompt, model=model, llm_backend=llm_backend, profile=profile)
+    if store:
+        store(text)
     return text, base_prompt
+
+
+def writing_agent_stream(topic, platform, tone, company, language, audience, context, model: str, extra_context: str = "",
+                         use_cache: bool = False, llm_backend: Optional[str] = None) -> tuple[Iterator[str], str]:
+    """
+    Igual que writing_agent, pero devuelve un iterador con los fragmentos
+    de texto según los genera el modelo (para el modo SSE) junto con el prompt.
+    Si el texto está en la caché semántica, se devuelve en un único fragmento.
+    """
+    profile = get_profile(platform)
+    model = profile.model(WRITER_MODEL)
+    cached, store = _cache_lookup(use_cache, topic, platform, tone, company, language, audience, context,
+                                  extra_context, model, llm_backend)
+    if cached is not None:
+        return iter([cached]), _cached_prompt(topic, platform, tone, company, language, audience, context,
+                                              extra_context, profile)
+    base_prompt, _tokens = build_budgeted_prompt(topic, platform, tone, company, language, audience, context,
+                                                 extra_context, model, profile)
+
+    def _deltas():
+        parts = []
+        for delta in generate_text_stream(base_prompt, model=model, llm_backend=llm_backend, profile=profile):
+            parts.append(delta)
+            yield delta
+        # Solo se guarda si el streaming terminó completo
+        if store:
+            store("".join(parts))
+
+    return _deltas(), base_prompt
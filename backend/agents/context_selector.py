@@ -0,0 +1,136 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from backend.metrics import track_stage, CONTEXT_COLLAPSED_CHUNKS, CONTEXT_TOKENS_SAVED
+from backend.llm.prompt_builder import get_token_counter, estimate_tokens
+
+load_dotenv()
+
+# Selección del contexto de Pinecone sin redundancia: los fragmentos de un mismo documento se solapan
+# (chunk_overlap) y los posts generados sobre un mismo tema son casi idénticos.
+CONTEXT_SELECTION_ENABLED = os.getenv("CONTEXT_SELECTION_ENABLED", "true").lower() in ("1", "true", "yes")
+# Similitud coseno a partir de la cual dos fragmentos se consideran el mismo y solo se conserva el primero
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.92"))
+# Peso de la relevancia frente a la diversidad en MMR (1 = solo relevancia)
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+# Candidatos = top_k * factor, para que MMR tenga entre qué elegir
+CONTEXT_FETCH_FACTOR = int(os.getenv("CONTEXT_FETCH_FACTOR", "2"))
+CONTEXT_EMBED_CACHE_MAX = int(os.getenv("CONTEXT_EMBED_CACHE_MAX", "5000"))
+
+
+class _EmbeddingCache:
+    """
+    Embeddings normalizados por hash de texto. El wrapper de Pinecone no devuelve los vectores guardados,
+    así que los fragmentos se codifican una vez con el modelo compartido y se reutilizan en las siguientes consultas.
+    """
+
+    def __init__(self, max_size: int = CONTEXT_EMBED_CACHE_MAX):
+        self.max_size = max_size
+        self._items: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        keys = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+        with self._lock:
+            found = {key: self._items[key] for key in keys if key in self._items}
+        missing = list(dict.fromkeys(key for key in keys if key not in found))
+        if missing:
+            from backend.model_registry import get_sentence_transformer
+            texts_by_key = dict(zip(keys, texts))
+            vectors = get_sentence_transformer().encode([texts_by_key[key] for key in missing],
+                                                        normalize_embeddings=True, batch_size=64)
+            found.update(zip(missing, vectors))
+            with self._lock:
+                for key in missing:
+                    self._items[key] = found[key]
+                    self._items.move_to_end(key)
+                while len(self._items) > self.max_size:
+                    self._items.popitem(last=False)
+        return np.asarray([found[key] for key in keys], dtype=np.float32)
+
+
+_embedding_cache = _EmbeddingCache()
+
+
+def mmr_select(relevance: np.ndarray, similarity: np.ndarray, max_chunks: int,
+               lambda_mult: float = CONTEXT_MMR_LAMBDA,
+               dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD) -> Tuple[List[int], List[int]]:
+    """
+    Maximal Marginal Relevance con colapso de casi duplicados.
+    Devuelve (índices elegidos en orden de selección, índices colapsados por parecerse demasiado a uno elegido).
+    """
+    remaining = list(range(len(relevance)))
+    selected: List[int] = []
+    collapsed: List[int] = []
+    while remaining and len(selected) < max_chunks:
+        if selected:
+            redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+            duplicates = {remaining[i] for i in np.flatnonzero(redundancy >= dedup_threshold)}
+            if duplicates:
+                collapsed.extend(index for index in remaining if index in duplicates)
+                remaining = [index for index in remaining if index not in duplicates]
+                if not remaining:
+                    break
+                redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+            scores = lambda_mult * relevance[remaining] - (1 - lambda_mult) * redundancy
+        else:
+            scores = relevance[remaining]
+        # argmax devuelve el primero en caso de empate: se respeta el orden de la búsqueda
+        selected.append(remaining.pop(int(np.argmax(scores))))
+    return selected, collapsed
+
+
+def select_context(query: str, results: List[Tuple[Any, float]], max_chunks: Optional[int] = None,
+                   model: Optional[str] = None,
+                   prompt_chunks: Optional[int] = None) -> Tuple[List[Tuple[Any, float]], Dict[str, Any]]:
+    """
+    Elige entre los resultados de Pinecone los fragmentos que van al prompt:
+    1️⃣ Colapsa los repetidos y casi duplicados (se queda con el primero, que es el más relevante).
+    2️⃣ Ordena el resto con MMR (relevancia para la consulta menos parecido con lo ya elegido) hasta max_chunks.
+
+    Devuelve (resultados elegidos, estadísticas con los tokens ahorrados).
+    - prompt_chunks: fragmentos que irían al prompt (top_k); el ahorro compara los prompt_chunks primeros
+      resultados de la búsqueda con los prompt_chunks primeros elegidos (por defecto max_chunks).
+    Si no hay embeddings disponibles solo se quitan los textos idénticos.
+    """
+    max_chunks = len(results) if max_chunks is None else max_chunks
+    prompt_chunks = max_chunks if prompt_chunks is None else prompt_chunks
+    stats: Dict[str, Any] = {"candidates": len(results), "selected": 0, "collapsed": 0, "tokens_saved": 0,
+                             "mmr": False}
+    if not results:
+        return results, stats
+
+    # Textos idénticos (mismo post guardado varias veces, mismo fragmento en varias consultas)
+    unique, seen = [], set()
+    for doc, score in results:
+        text = " ".join(doc.page_content.split())
+        if text not in seen:
+            seen.add(text)
+            unique.append((doc, score))
+    collapsed = len(results) - len(unique)
+
+    selected = unique[:max_chunks]
+    if len(unique) > 1:
+        try:
+            with track_stage("context_selection"):
+                vectors = _embedding_cache.encode([query] + [doc.page_content for doc, _ in unique])
+                chunk_vectors = vectors[1:]
+                order, near_duplicates = mmr_select(chunk_vectors @ vectors[0], chunk_vectors @ chunk_vectors.T,
+                                                    max_chunks)
+            selected = [unique[i] for i in order]
+            collapsed += len(near_duplicates)
+            stats["mmr"] = True
+        except Exception as e:
+            print(f"⚠️ Selección de contexto por embeddings no disponible, solo se quitan repetidos: {e}")
+
+    counter = get_token_counter(model) if model else estimate_tokens
+    baseline = counter("\n".join(doc.page_content for doc, _ in results[:prompt_chunks]))
+    stats["tokens_saved"] = baseline - counter("\n".join(doc.page_content for doc, _ in selected[:prompt_chunks]))
+    CONTEXT_TOKENS_SAVED.inc(max(0, stats["tokens_saved"]))
+    CONTEXT_COLLAPSED_CHUNKS.inc(collapsed)
+    stats.update({"selected": len(selected), "collapsed": collapsed})
+    return selected, stats
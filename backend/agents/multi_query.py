@@ -0,0 +1,113 @@
+import os
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from backend.metrics import track_stage
+from backend.timing import stage
+from backend.model_registry import get_embedding_model
+from backend.vector_db.db_manager import search_filtered
+from backend.vector_db.fusion import reciprocal_rank_fusion
+
+load_dotenv()
+
+# Investigación ampliada: varias consultas derivadas del tema, la empresa y la audiencia,
+# lanzadas en paralelo y fusionadas con Reciprocal Rank Fusion
+RESEARCH_MAX_QUERIES = int(os.getenv("RESEARCH_MAX_QUERIES", "4"))
+# "template" (sin coste) o "llm" (reformulaciones con un modelo pequeño; si falla, plantillas)
+RESEARCH_QUERY_EXPANSION = os.getenv("RESEARCH_QUERY_EXPANSION", "template").lower()
+RESEARCH_EXPANSION_MODEL = os.getenv("RESEARCH_EXPANSION_MODEL", "llama3-8b-8192")
+RESEARCH_WORKERS = int(os.getenv("RESEARCH_WORKERS", "8"))
+
+_executor = ThreadPoolExecutor(max_workers=RESEARCH_WORKERS, thread_name_prefix="research")
+
+
+def _clean(value: Optional[str]) -> str:
+    return " ".join((value or "").split())
+
+
+def template_queries(topic: str, company: Optional[str] = None, audience: Optional[str] = None) -> List[str]:
+    """Consultas derivadas por plantilla: el tema solo y combinado con la empresa y la audiencia."""
+    topic, company, audience = _clean(topic), _clean(company), _clean(audience)
+    queries = [topic]
+    if company:
+        queries.append(f"{topic} {company}")
+    if audience:
+        queries.append(f"{topic} para {audience}")
+    if company and audience:
+        queries.append(f"{company} {audience}")
+    return queries
+
+
+def llm_queries(topic: str, company: Optional[str] = None, audience: Optional[str] = None, count: int = 3) -> List[str]:
+    """Reformulaciones del tema con un modelo pequeño (una por línea)."""
+    # Import diferido: el generador arrastra el router de LLM, que el modo por plantillas no necesita
+    from backend.generator import generate_text
+    prompt = (f"Escribe {count} búsquedas cortas y distintas (una por línea, sin numerar ni comentar) "
+              f"para encontrar contenido relacionado con el tema \"{_clean(topic)}\""
+              + (f", la empresa {_clean(company)}" if company else "")
+              + (f" y la audiencia {_clean(audience)}" if audience else "") + ".")
+    text = generate_text(prompt, model=RESEARCH_EXPANSION_MODEL)
+    lines = [line.strip(" -•*\t0123456789.)\"'") for line in text.splitlines()]
+    return [line for line in lines if line][:count]
+
+
+def expand_queries(topic: str, company: Optional[str] = None, audience: Optional[str] = None,
+                   max_queries: int = RESEARCH_MAX_QUERIES) -> List[str]:
+    """Consultas de la investigación ampliada, sin repetidas y empezando siempre por el tema tal cual."""
+    queries = template_queries(topic, company, audience)
+    if RESEARCH_QUERY_EXPANSION == "llm":
+        try:
+            with stage("query_expansion"):
+                queries = [queries[0]] + llm_queries(topic, company, audience, count=max(1, max_queries - 1))
+        except Exception as e:
+            print(f"⚠️ Expansión de consultas con LLM no disponible, se usan plantillas: {e}")
+    unique, seen = [], set()
+    for query in queries:
+        normalized = query.lower()
+        if query and normalized not in seen:
+            seen.add(normalized)
+            unique.append(query)
+    return unique[:max_queries]
+
+
+def multi_query_search(
+    topic: str,
+    company: Optional[str] = None,
+    audience: Optional[str] = None,
+    top_k: int = 5,
+    filters: Optional[Dict[str, Any]] = None,
+    min_score: Optional[float] = None
+) -> Tuple[List[Tuple[Any, float]], Dict[str, Any]]:
+    """
+    Investigación ampliada:
+    1️⃣ Deriva varias consultas del tema, la empresa y la audiencia.
+    2️⃣ Calcula sus embeddings en un solo lote.
+    3️⃣ Lanza las consultas a Pinecone en paralelo (con los mismos filtros de metadatos).
+    4️⃣ Fusiona las listas con RRF y solo entonces aplica el score mínimo (sobre el mejor score de cada fragmento).
+
+    Devuelve (resultados ordenados por RRF con su mejor score, estadísticas).
+    """
+    queries = expand_queries(topic, company, audience)
+    with track_stage("multi_query_search"):
+        with stage("query_embedding"):
+            embeddings = get_embedding_model().embed_documents(queries)
+
+        # Cada consulta lleva una copia del contexto de la petición (cronómetro de etapas)
+        futures = [
+            _executor.submit(contextvars.copy_context().run, search_filtered, query, top_k, filters, None, embedding)
+            for query, embedding in zip(queries, embeddings)
+        ]
+        per_query = [future.result() for future in futures]
+
+    fused = reciprocal_rank_fusion([results for results, _ in per_query])
+    kept = [(doc, info["best_score"]) for doc, _rrf, info in fused
+            if min_score is None or info["best_score"] >= min_score][:top_k]
+    stats = {
+        "queries": queries,
+        "scanned": sum(query_stats["scanned"] for _, query_stats in per_query),
+        "fused": len(fused),
+        "kept": len(kept),
+        "fallback": any(query_stats["fallback"] for _, query_stats in per_query),
+    }
+    return kept, stats
@@ -0,0 +1,120 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+from dotenv import load_dotenv
+from backend.agents.agent import research_agent, RESEARCH_MODE
+from backend.generate_with_rag import generate_text_with_context
+from backend.content_pipeline import create_post_image, persist_post
+from backend.response_cache import RESPONSE_CACHE_DEFAULT
+
+load_dotenv()
+
+# Límites de concurrencia por defecto para /generate/batch
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "50"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+BATCH_IMAGE_CONCURRENCY = int(os.getenv("BATCH_IMAGE_CONCURRENCY", "4"))
+
+
+def _research_key(item) -> Tuple[str, ...]:
+    """
+    Clave de agrupación: mismo tema y misma empresa comparten investigación
+    (y misma audiencia en la investigación ampliada, que también consulta por audiencia).
+    """
+    topic = " ".join(item.topic.split()).lower()
+    company = " ".join((item.company or "").split()).lower()
+    if RESEARCH_MODE == "multi":
+        return topic, company, " ".join((item.audience or "").split()).lower()
+    return topic, company
+
+
+def _generate_item(item, context: str, llm_slots: threading.Semaphore, image_slots: threading.Semaphore) -> Dict[str, Any]:
+    model_research = item.model_research or item.model_writer
+
+    with llm_slots:
+        text, prompt_used = generate_text_with_context(
+            topic=item.topic,
+            platform=item.platform,
+            company=item.company,
+            tone=item.tone,
+            language=item.language,
+            model_writer=item.model_writer,
+            model_research=model_research,
+            audience=item.audience,
+            context=context,
+            use_cache=(item.cache or RESPONSE_CACHE_DEFAULT) == "prefer",
+            llm_backend=item.llm_backend
+        )
+
+    image_url = None
+    if item.generate_image:
+        with image_slots:
+            image_url = create_post_image(text, item.img_model)
+
+    persist_post({
+        "prompt": prompt_used,
+        "text": text,
+        "platform": item.platform,
+        "tone": item.tone,
+        "company": item.company,
+        "language": item.language,
+        "audience": item.audience,
+        "model": item.model_writer,
+        "image_url": image_url
+    })
+    return {"text": text, "image_url": image_url}
+
+
+def generate_batch(
+    items: List[Any],
+    llm_concurrency: Optional[int] = None,
+    image_concurrency: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Genera varios contenidos en paralelo (p. ej. un mismo tema para varias plataformas e idiomas).
+
+    1️⃣ Agrupa los elementos por (tema, empresa) y hace una sola investigación en Pinecone por grupo.
+    2️⃣ Lanza todos los elementos a la vez, limitando con semáforos cuántas llamadas
+       al LLM y a los proveedores de imagen hay en vuelo.
+    3️⃣ Devuelve un resultado por elemento, en el mismo orden, con su error si lo hubo.
+    """
+    if len(items) > BATCH_MAX_ITEMS:
+        raise ValueError(f"❌ Máximo {BATCH_MAX_ITEMS} elementos por lote (recibidos {len(items)})")
+
+    llm_slots = threading.Semaphore(max(1, llm_concurrency or BATCH_LLM_CONCURRENCY))
+    image_slots = threading.Semaphore(max(1, image_concurrency or BATCH_IMAGE_CONCURRENCY))
+
+    groups: Dict[Tuple[str, ...], Any] = {}
+    for item in items:
+        groups.setdefault(_research_key(item), item)
+
+    results: List[Dict[str, Any]] = [None] * len(items)
+    if not items:
+        return {"results": results, "research_queries": 0}
+
+    with ThreadPoolExecutor(max_workers=len(items) + len(groups), thread_name_prefix="batch") as executor:
+        # 1️⃣ Investigación compartida (una consulta por grupo, todas en paralelo)
+        research_futures = {
+            key: executor.submit(research_agent, item.topic, item.company, model=item.model_research or item.model_writer,
+                                 audience=item.audience)
+            for key, item in groups.items()
+        }
+
+        def _run(index, item):
+            try:
+                context = research_futures[_research_key(item)].result()
+                return {"index": index, **_generate_item(item, context, llm_slots, image_slots),
+                        "error": None, "error_type": None}
+            except Exception as e:
+                print(f"❌ Error en el elemento {index} del lote: {e}")
+                return {"index": index, "text": None, "image_url": None, "error": str(e),
+                        "error_type": type(e).__name__}
+
+        # 2️⃣ Generación concurrente con límites
+        futures = [executor.submit(_run, index, item) for index, item in enumerate(items)]
+        for future in futures:
+            result = future.result()
+            results[result["index"]] = result
+
+    print(f"✅ Lote generado: {len(items)} elementos, {len(groups)} investigaciones")
+    return {"results": results, "research_queries": len(groups)}
@@ -1,5 +1,4 @@
 import os
-import requests
 import feedparser
 import fitz  # PyMuPDF
 from typing import List, Tuple
@@ -7,39 +6,32 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.docstore.document import Document
 from langchain.chains import RetrievalQA
 from langchain_groq import ChatGroq
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_pinecone import Pinecone as PineconeVectorStore
 from tempfile import gettempdir
 from urllib.parse import quote_plus
 from langchain.prompts import PromptTemplate
 from dotenv import load_dotenv
+# Los papers se indexan en el mismo índice de Pinecone ("generated-posts") que los posts,
+# así que se reutilizan la conexión y el modelo de embeddings de db_manager
+from backend.vector_db.db_manager import get_vector_db
+from backend.vector_db.lexical_index import index_chunks
+from backend.metrics import track_stage, record_ingested_chunks
+from backend.http_client import get_client
 
 load_dotenv()
 
-# Inicializamos el modelo de embeddings que convertirá texto en vectores numéricos
-embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-
-# Pinecone index config (debe existir en la nube)
-PINECONE_INDEX = "generated-posts"   
-API_KEY = os.getenv("PINECONE_API_KEY")
-ENVIRONMENT = os.getenv("PINECONE_ENV")
-
-# Creamos la conexión al vector store de Pinecone usando el modelo de embeddings
-vector_db = PineconeVectorStore.from_existing_index(
-    index_name=PINECONE_INDEX,
-    embedding=embedding_model
-)
+ARXIV_API_URL = os.getenv("ARXIV_API_URL", "http://export.arxiv.org/api")
 
 
 def search_arxiv(topic: str, max_results: int = 3):
     encoded_topic = quote_plus(topic)
-    url = f"http://export.arxiv.org/api/query?search_query=all:{encoded_topic}&start=0&max_results={max_results}"
+    url = f"{ARXIV_API_URL}/query?search_query=all:{encoded_topic}&start=0&max_results={max_results}"
     
-    response = requests.get(url)
+    response = get_client("arxiv").get(url)
     if response.status_code != 200:
         raise Exception("❌ Error al consultar arXiv")
 
-    feed = feedparser.parse(url)
+    # Se parsea la respuesta ya descargada (feedparser.parse(url) volvería a pedirla)
+    feed = feedparser.parse(response.content)
     results = []
     for entry in feed.entries:
         pdf_url = next((l.href for l in entry.links if l.type == "application/pdf"), None)
@@ -55,7 +47,8 @@ def search_arxiv(topic: str, max_results: int = 3):
 def download_and_extract(pdf_url: str, paper_id: str) -> Tuple[str, str]:
     pdf_path = os.path.join(gettempdir(), f"{paper_id}.pdf")
 
-    r = requests.get(pdf_url)
+    r = get_client("arxiv").get(pdf_url)
+    r.raise_for_status()
     with open(pdf_path, "wb") as f:
         f.write(r.content)
 
@@ -73,17 +66,20 @@ def download_and_extract(pdf_url: str, paper_id: str) -> Tuple[str, str]:
 
 # 🧠 Ingestar texto en Pinecone
 def ingest_arxiv_documents(docs: List[Tuple[str, str]]):
-    documents = [Document(page_content=text, metadata={"source": source}) for text, source in docs]
+    documents = [Document(page_content=text, metadata={"source": source, "source_type": "arxiv"}) for text, source in docs]
     splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
     chunks = splitter.split_documents(documents)
 
-    vector_db.add_documents(chunks)
+    with track_stage("ingest_arxiv_documents"):
+        get_vector_db().add_documents(chunks)
+    index_chunks(((chunk.page_content, chunk.metadata) for chunk in chunks), source="arxiv")
+    record_ingested_chunks("arxiv", len(chunks))
     print(f"✅ Ingestados {len(chunks)} fragmentos a Pinecone")
 
 
 # 🔁 Crear cadena RAG con retriever y LLM
 def create_arxiv_rag_chain():
-    retriever = vector_db.as_retriever(search_kwargs={"k": 4})
+    retriever = get_vector_db().as_retriever(search_kwargs={"k": 4})
 
     llm = ChatGroq(
         groq_api_key=os.getenv("GROQ_API_KEY"),
@@ -0,0 +1,173 @@
+import os
+import json
+from concurrent.futures import Future
+from typing import Optional, Dict, Any, Iterator
+from .image_generator import generate_image_url
+from backend.agents.agent import research_agent, writing_agent_stream, WRITER_MODEL
+from backend.llm.prompt_builder import count_tokens
+from backend.llm.generation_profiles import get_profile
+from backend.vector_db.db_manager import save_post
+from backend.database.supabase_logger import log_post_to_supabase, monotonic_timestamp
+from backend.database.storage import upload_image_to_supabase
+from backend.side_effects import dispatch_side_effects
+from backend.timing import stage, current_timings
+from backend.llm.errors import RateLimitError
+
+# Tiempo máximo que el modo streaming espera a las escrituras para informar de los ids
+PERSIST_WAIT_TIMEOUT_S = float(os.getenv("PERSIST_WAIT_TIMEOUT_S", "30"))
+
+
+def create_post_image(text: str, img_model: str) -> Optional[str]:
+    """
+    Genera la imagen del post, la sube a Supabase y devuelve su URL pública.
+    Devuelve None si no se pudo generar o subir.
+    """
+    image_url = None
+    image_path = generate_image_url(text, img_model)
+    if image_path and os.path.exists(image_path):
+        with stage("supabase_upload"):
+            uploaded_url = upload_image_to_supabase(image_path)
+        if uploaded_url and uploaded_url.startswith("http"):
+            image_url = uploaded_url
+            try:
+                os.remove(image_path)
+            except Exception as del_err:
+                print(f"⚠️ No se pudo eliminar imagen local: {del_err}")
+        else:
+            print("⚠️ La imagen no se subió correctamente")
+    else:
+        print("⚠️ No se generó imagen válida")
+    return image_url
+
+
+def persist_post(record: Dict[str, Any], save_vector: bool = True) -> Dict[str, Future]:
+    """
+    Lanza en segundo plano el guardado del post en Pinecone y en Supabase (posts_history).
+    - record: mismas claves que espera log_post_to_supabase
+    - save_vector: False para no indexar el post en Pinecone
+    """
+    # Misma marca de tiempo en Pinecone y en posts_history
+    record = {**record, "created_at": record.get("created_at") or monotonic_timestamp()}
+    tasks = {}
+    if save_vector:
+        tasks["save_post"] = lambda: save_post(
+            text=record["text"],
+            prompt=record["prompt"],
+            platform=record["platform"],
+            tone=record["tone"],
+            company=record.get("company"),
+            language=record.get("language"),
+            audience=record.get("audience"),
+            model=record.get("model"),
+            image_url=record.get("image_url"),
+            created_at=record["created_at"]
+        )
+    tasks["log_post_to_supabase"] = lambda: log_post_to_supabase(record)
+    return dispatch_side_effects(tasks)
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Formatea un evento Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def stream_generation(
+    topic: str,
+    platform: str,
+    tone: str,
+    company: Optional[str],
+    language: str,
+    model_writer: str,
+    model_research: Optional[str],
+    audience: Optional[str] = None,
+    img_model: Optional[str] = None,
+    generate_image: bool = True,
+    extra_context: str = "",
+    doc_upload: Optional[Future] = None,
+    save_vector: bool = True,
+    use_cache: bool = False,
+    llm_backend: Optional[str] = None
+) -> Iterator[str]:
+    """
+    Pipeline de generación en modo streaming (SSE).
+
+    Eventos emitidos, en orden:
+    - research_done: contexto recuperado de Pinecone
+    - writing_started: prompt construido (caracteres y tokens), comienza la generación
+    - token: cada fragmento de texto que devuelve Groq
+    - image_ready: URL de la imagen (o null)
+    - done: texto completo, ids persistidos en Pinecone/Supabase y tiempos por etapa
+    - error: si algo falla, con el mensaje y el tipo de error (RateLimitError incluye retry_after_s)
+    """
+    try:
+        with stage("research"):
+            context = research_agent(topic, company, model=model_research or model_writer, audience=audience)
+        yield sse_event("research_done", {"context_found": bool(context), "context_chars": len(context)})
+
+        deltas, prompt_used = writing_agent_stream(
+            topic, platform, tone, company, language, audience, context,
+            model=model_writer, extra_context=extra_context, use_cache=use_cache, llm_backend=llm_backend
+        )
+        yield sse_event("writing_started", {
+            "prompt_chars": len(prompt_used),
+            "prompt_tokens": count_tokens(prompt_used, get_profile(platform).model(WRITER_MODEL))
+        })
+
+        parts = []
+        with stage("llm"):
+            for delta in deltas:
+                parts.append(delta)
+                yield sse_event("token", {"delta": delta})
+        text = "".join(parts)
+
+        image_url = None
+        if generate_image and img_model:
+            image_url = create_post_image(text, img_model)
+        yield sse_event("image_ready", {"image_url": image_url})
+
+        doc_url = None
+        if doc_upload is not None:
+            try:
+                doc_url = doc_upload.result()
+            except Exception as e:
+                print(f"⚠️ No se pudo subir el documento: {e}")
+
+        record = {
+            "prompt": prompt_used,
+            "text": text,
+            "platform": platform,
+            "tone": tone,
+            "company": company,
+            "language": language,
+            "audience": audience,
+            "model": model_writer,
+            "image_url": image_url,
+            "doc_url": doc_url
+        }
+        futures = persist_post(record, save_vector=save_vector)
+
+        # El cliente ya tiene el texto y la imagen: aquí solo se espera para informar de los ids
+        persisted = {}
+        for name, future in futures.items():
+            try:
+                persisted[name] = future.result(timeout=PERSIST_WAIT_TIMEOUT_S)
+            except Exception as e:
+                persisted[name] = None
+                print(f"⚠️ '{name}' no terminó a tiempo o falló: {e}")
+
+        yield sse_event("done", {
+            "text": text,
+            "image_url": image_url,
+            "doc_url": doc_url,
+            "ids": {
+                "pinecone": persisted.get("save_post"),
+                "supabase": persisted.get("log_post_to_supabase")
+            },
+            "timings": current_timings()
+        })
+    except Exception as e:
+        print(f"❌ Error en la generación en streaming: {e}")
+        error = {"message": str(e), "error_type": type(e).__name__}
+        if isinstance(e, RateLimitError):
+            error["retry_after_s"] = e.retry_after_s
+        yield sse_event("error", error)
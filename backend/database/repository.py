@@ -1,4 +1,8 @@
-from typing import List, Optional, Dict, Any
+import json
+import uuid
+import base64
+from datetime import datetime
+from typing import List, Optional, Dict, Any, Tuple
 from .supabase_client import get_supabase_client
 from backend.financial.models import FinancialNewsRequest
 
@@ -94,4 +98,71 @@ def get_recent_financial_news(limit: int = 10) -> List[Dict[str, Any]]:
         
     except Exception as e:
         print(f"❌ Error consultando noticias recientes: {e}")
-        return []
\ No newline at end of file
+        return []
+
+def _encode_cursor(row: Dict[str, Any]) -> str:
+    raw = json.dumps({"created_at": row["created_at"], "id": row["id"]})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def _decode_cursor(cursor: str) -> Tuple[str, Any]:
+    """
+    Decodifica y valida un cursor recibido del cliente. Sus valores van dentro del filtro de PostgREST,
+    así que solo se aceptan una fecha ISO y un id entero o UUID (nada de comas ni paréntesis).
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        created_at, row_id = data["created_at"], data["id"]
+        if not isinstance(created_at, str):
+            raise TypeError("created_at debe ser una cadena")
+        created_at = datetime.fromisoformat(created_at).isoformat()
+        if isinstance(row_id, bool) or not isinstance(row_id, (int, str)):
+            raise TypeError("id no válido")
+        if isinstance(row_id, str):
+            row_id = int(row_id) if row_id.isdigit() else str(uuid.UUID(row_id))
+        return created_at, row_id
+    except Exception:
+        raise ValueError(f"❌ Cursor no válido: {cursor}") from None
+
+def get_recent_posts(limit: int = 10, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Obtiene los posts más recientes de posts_history, ordenados por fecha de creación.
+    
+    Usa paginación por cursor (keyset) sobre (created_at, id): cada página es una lectura
+    por índice de coste constante, sin OFFSET. Requiere en la tabla:
+        create index posts_history_recency_idx on posts_history (created_at desc, id desc);
+    
+    Args:
+        limit: Número máximo de posts por página
+        cursor: Valor `next_cursor` de la página anterior (None para la primera)
+        
+    Returns:
+        Dict: {"results": [...], "next_cursor": str | None}
+    """
+    
+    client = get_supabase_client()
+    if not client:
+        raise RuntimeError("Cliente Supabase no disponible")
+    
+    query = (client.table('posts_history')
+             .select("id, created_at, generated_text, prompt_input, platform, tone, language, audience, company, model_used, image_url, doc_url"))
+    
+    if cursor:
+        created_at, row_id = _decode_cursor(cursor)
+        # Filas estrictamente anteriores al último elemento devuelto
+        query = query.or_(f"created_at.lt.{created_at},and(created_at.eq.{created_at},id.lt.{row_id})")
+    
+    # Se pide un elemento de más para saber si hay otra página
+    result = (query
+              .order('created_at', desc=True)
+              .order('id', desc=True)
+              .limit(limit + 1)
+              .execute())
+    
+    rows = result.data or []
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    return {
+        "results": rows,
+        "next_cursor": _encode_cursor(rows[-1]) if has_more and rows else None
+    }
@@ -1,7 +1,9 @@
 import os
 from pathlib import Path
 from backend.database.supabase_client import get_supabase_client
+from backend.metrics import instrument
 
+@instrument("upload_image_to_supabase", error_on_falsy=True)
 def upload_image_to_supabase(local_path: str, bucket_name="posts") -> str:
     """
     Sube una imagen a Supabase Storage y devuelve la URL pública.
@@ -24,13 +26,15 @@ def upload_image_to_supabase(local_path: str, bucket_name="posts") -> str:
         print(f"❌ Error subiendo imagen a Supabase: {e}")
         return None
 
-def upload_document_to_supabase(local_path: str, bucket_name="documents") -> str:
+@instrument("upload_document_to_supabase", error_on_falsy=True)
+def upload_document_to_supabase(local_path: str, bucket_name="documents", storage_name: str = None) -> str:
     """
     Sube un documento a Supabase Storage y devuelve la URL pública.
+    - storage_name: ruta dentro del bucket (por defecto, el nombre del fichero local)
     Si falla, devuelve None.
     """
     client = get_supabase_client()
-    file_name = Path(local_path).name
+    file_name = storage_name or Path(local_path).name
     storage_path = file_name
 
     try:
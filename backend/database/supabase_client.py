@@ -2,6 +2,7 @@ import os
 from supabase import create_client, Client
 from dotenv import load_dotenv
 from pathlib import Path
+from backend.providers import LazyProvider
 
 # Cargar las variables de entorno desde el archivo .env
 load_dotenv(dotenv_path=Path(__file__).resolve().parents[2] / '.env')
@@ -99,14 +100,24 @@ class SupabaseClient:
             print("   - La tabla 'financial_news' exista en Supabase")
             return False
 
-# Instancia global del cliente
-supabase_client = SupabaseClient()
+def _create_supabase_client() -> Client:
+    client = SupabaseClient().client
+    if client is None:
+        raise RuntimeError("Cliente Supabase no disponible")
+    return client
+
+# El cliente se crea la primera vez que se pide (o en el calentamiento al arrancar)
+supabase_provider = LazyProvider("supabase", _create_supabase_client)
 
 def get_supabase_client() -> Client:
     """
     Función helper para obtener el cliente de Supabase.
     
     Returns:
-        Client: Cliente de Supabase
+        Client: Cliente de Supabase o None si no se pudo inicializar
     """
-    return supabase_client.client
\ No newline at end of file
+    try:
+        return supabase_provider.get()
+    except Exception as e:
+        print(f"⚠️ Cliente Supabase no disponible: {e}")
+        return None
@@ -1,6 +1,27 @@
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 from backend.database.supabase_client import get_supabase_client
+from backend.metrics import instrument
+from backend.timing import stage
 
+_last_timestamp = datetime.min
+_timestamp_lock = threading.Lock()
+
+def monotonic_timestamp() -> str:
+    """
+    Marca de tiempo UTC (ISO 8601) estrictamente creciente dentro del proceso:
+    si el reloj no avanza (o retrocede), se suma 1 µs a la anterior.
+    Ordena de forma estable el índice de recencia de posts_history.
+    """
+    global _last_timestamp
+    with _timestamp_lock:
+        now = datetime.utcnow()
+        if now <= _last_timestamp:
+            now = _last_timestamp + timedelta(microseconds=1)
+        _last_timestamp = now
+        return now.isoformat()
+
+@instrument("log_post_to_supabase", error_on_falsy=True)
 def log_post_to_supabase(data: dict):
     client = get_supabase_client()
 
@@ -15,7 +36,7 @@ def log_post_to_supabase(data: dict):
         "model_used": data.get("model"),
         "image_url": data.get("image_url"),
         "doc_url": data.get("doc_url"),
-        "created_at": datetime.utcnow().isoformat()
+        "created_at": data.get("created_at") or monotonic_timestamp()
     }
     
     print("📝 Payload a insertar en Supabase:")
@@ -23,8 +44,12 @@ def log_post_to_supabase(data: dict):
         print(f"{k}: {v}")
 
     try:
-        response = client.table("posts_history").insert(payload).execute()
+        with stage("supabase_log"):
+            response = client.table("posts_history").insert(payload).execute()
         print("✅ Post guardado en Supabase")
+        # Devolvemos el id de la fila insertada (o True si Supabase no devuelve la fila)
+        if response.data:
+            return response.data[0].get("id", True)
         return True
     except Exception as e:
         print(f"❌ Error al guardar en Supabase: {e}")
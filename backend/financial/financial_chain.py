@@ -4,18 +4,57 @@ from dotenv import load_dotenv
 from pathlib import Path
 from langchain_groq import ChatGroq
 from langchain.prompts import PromptTemplate
+from backend.providers import LazyProvider
+from backend.llm.config import (
+    backend_enabled, local_llm_configured, LOCAL_LLM_URL, LOCAL_LLM_MODEL, LOCAL_LLM_API_KEY
+)
 
 # Cargar las variables de entorno desde el archivo .env
 load_dotenv(dotenv_path=Path(__file__).resolve().parents[2] / '.env')
 
-# Configurar el modelo Groq
-groq_llm = ChatGroq(
-    groq_api_key=os.getenv("GROQ_API_KEY"),
-    model_name="llama3-8b-8192",
-    temperature=0.7,
-    max_tokens=500
+# Configurar el modelo Groq (se crea bajo demanda)
+groq_llm_provider = LazyProvider(
+    "financial_llm",
+    lambda: ChatGroq(
+        groq_api_key=os.getenv("GROQ_API_KEY"),
+        model_name="llama3-8b-8192",
+        temperature=0.7,
+        max_tokens=500
+    ),
+    required=False
 )
 
+
+def _build_local_llm():
+    """Modelo local compatible con OpenAI (Ollama / llama.cpp en CPU) con los mismos parámetros que Groq."""
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        base_url=LOCAL_LLM_URL,
+        api_key=LOCAL_LLM_API_KEY,
+        model=LOCAL_LLM_MODEL,
+        temperature=0.7,
+        max_tokens=500
+    )
+
+
+# LLM local (solo si hay LOCAL_LLM_URL): fallback de Groq y backend seleccionable por petición
+local_llm_provider = LazyProvider("financial_local_llm", _build_local_llm, required=False) \
+    if local_llm_configured() else None
+
+
+def _build_default_llm():
+    """
+    Groq con el LLM local como fallback (límite agotado, timeout o sin red).
+    Con LLM_BACKENDS sin groq (CI sin red), solo el local.
+    """
+    remote = groq_llm_provider.get() if backend_enabled("groq") else None
+    local = local_llm_provider.get() if local_llm_provider is not None else None
+    if remote is not None and local is not None:
+        return remote.with_fallbacks([local])
+    if remote is None and local is None:
+        raise ValueError("❌ No hay ningún LLM configurado para las noticias financieras (GROQ_API_KEY o LOCAL_LLM_URL)")
+    return remote or local
+
 def get_language_instruction(language: str) -> str:
     """
     Devuelve instrucciones específicas para cada idioma.
@@ -138,9 +177,25 @@ news_prompt = PromptTemplate(
 )
 
 # Crear el chain de LangChain
-financial_news_chain = news_prompt | groq_llm
+financial_news_chain_provider = LazyProvider(
+    "financial_news_chain",
+    lambda: news_prompt | _build_default_llm(),
+    required=False
+)
+
+
+def _chain_for(llm_backend: str = None):
+    """Chain según el backend pedido: "groq" o "local" fuerzan ese modelo; el resto usa el chain con fallback."""
+    if llm_backend == "groq":
+        return news_prompt | groq_llm_provider.get()
+    if llm_backend == "local":
+        if local_llm_provider is None:
+            raise ValueError("❌ LLM local no configurado (LOCAL_LLM_URL)")
+        return news_prompt | local_llm_provider.get()
+    return financial_news_chain_provider.get()
+
 
-def generate_financial_news(topic: str, language: str, market_data: str) -> str:
+def generate_financial_news(topic: str, language: str, market_data: str, llm_backend: str = None) -> str:
     """
     Función principal que orquesta la generación de noticias financieras.
     
@@ -155,7 +210,7 @@ def generate_financial_news(topic: str, language: str, market_data: str) -> str:
     language_instruction = get_language_instruction(language)
     
     # Ejecutar el chain de LangChain (sin try-catch)
-    result = financial_news_chain.invoke({
+    result = _chain_for(llm_backend).invoke({
         "language_instruction": language_instruction,
         "market_data": market_data,
         "topic": topic
@@ -5,6 +5,7 @@ from .models import FinancialNewsRequest
 from .financial_tools import get_stock_data, format_market_data_for_llm
 from .financial_chain import generate_financial_news as generate_news_with_llm
 import time
+from backend.timing import stage, current_timings
 
 def generate_financial_news(request: FinancialNewsRequest) -> Dict[str, Any]:
     """
@@ -18,9 +19,13 @@ def generate_financial_news(request: FinancialNewsRequest) -> Dict[str, Any]:
     5. Devuelve todo estructurado
     """
     
+    # Tiempo total de la petición (datos de mercado + LLM), guardado como processing_time_ms
+    start_time = time.time()
+
     try:
         # 1. Obtener datos financieros para la empresa específica
-        stock_data = get_stock_data(request.company)
+        with stage("market_data"):
+            stock_data = get_stock_data(request.company)
         symbol = stock_data.get("symbol", "UNKNOWN")
         company_name = stock_data.get("company_name", request.company)
         
@@ -28,11 +33,13 @@ def generate_financial_news(request: FinancialNewsRequest) -> Dict[str, Any]:
         formatted_market_data = format_market_data_for_llm(stock_data)
         
         # 3. Generar noticia financiera
-        generated_news = generate_news_with_llm(
-            topic=request.topic,
-            language=request.language,
-            market_data=formatted_market_data
-        )
+        with stage("llm"):
+            generated_news = generate_news_with_llm(
+                topic=request.topic,
+                language=request.language,
+                market_data=formatted_market_data,
+                llm_backend=request.llm_backend
+            )
         
         # 4. Estructurar respuesta final
         response_data = {
@@ -55,20 +62,24 @@ def generate_financial_news(request: FinancialNewsRequest) -> Dict[str, Any]:
         }
 
         # 5. Guardar en base de datos
-        start_time = time.time()
         processing_time_ms = int((time.time() - start_time) * 1000)
+        response_data["processing_time_ms"] = processing_time_ms
 
         from backend.database.repository import save_financial_news_record
         try:
-            save_financial_news_record(
-                request=request,
-                response_data=response_data, 
-                processing_time_ms=processing_time_ms,
-                success=True
-            )
+            with stage("supabase_log"):
+                save_financial_news_record(
+                    request=request,
+                    response_data=response_data, 
+                    processing_time_ms=processing_time_ms,
+                    success=True
+                )
         except Exception as e:
             # Error guardando en BD (no crítico)
             pass
+
+        if request.include_timings:
+            response_data["timings"] = current_timings()
         
         return response_data
         
@@ -1,15 +1,29 @@
 import os
-import requests
 from dotenv import load_dotenv
 from pathlib import Path
 from datetime import datetime, timedelta
 from langchain_community.tools.polygon import PolygonAggregates
 from langchain_community.utilities.polygon import PolygonAPIWrapper
+from backend.providers import LazyProvider
+from backend.metrics import instrument
+from backend.http_client import get_client
 
 # Cargar configuración
 load_dotenv(dotenv_path=Path(__file__).resolve().parents[2] / '.env')
-polygon_wrapper = PolygonAPIWrapper(polygon_api_key=os.getenv("POLYGON_API_KEY"))
-polygon_tool = PolygonAggregates(api_wrapper=polygon_wrapper)
+
+# URLs base de las APIs (configurables para apuntar a servicios locales en pruebas de carga)
+TWELVE_DATA_API_URL = os.getenv("TWELVE_DATA_API_URL", "https://api.twelvedata.com")
+POLYGON_API_URL = os.getenv("POLYGON_API_URL")
+
+def _create_polygon_tool():
+    if POLYGON_API_URL:
+        # PolygonAPIWrapper lee la URL base de una constante de su módulo
+        import langchain_community.utilities.polygon as polygon_utils
+        polygon_utils.POLYGON_BASE_URL = POLYGON_API_URL.rstrip("/") + "/"
+    return PolygonAggregates(api_wrapper=PolygonAPIWrapper(polygon_api_key=os.getenv("POLYGON_API_KEY")))
+
+# Herramienta de Polygon, creada bajo demanda
+polygon_provider = LazyProvider("polygon", _create_polygon_tool, required=False)
 
 def get_best_symbol(company_name: str) -> str:
     """
@@ -17,10 +31,9 @@ def get_best_symbol(company_name: str) -> str:
     Prioriza: NYSE/NASDAQ > otros mercados > símbolos cortos y limpios
     """
     try:
-        response = requests.get(
-            "https://api.twelvedata.com/symbol_search",
-            params={'symbol': company_name, 'apikey': os.getenv("TWELVE_DATA_API_KEY")},
-            timeout=8
+        response = get_client("twelvedata").get(
+            f"{TWELVE_DATA_API_URL}/symbol_search",
+            params={'symbol': company_name, 'apikey': os.getenv("TWELVE_DATA_API_KEY")}
         )
         
         results = response.json().get('data', [])
@@ -54,7 +67,7 @@ def get_polygon_data(symbol: str) -> dict:
         end_date = datetime.now().strftime('%Y-%m-%d')
         start_date = (datetime.now() - timedelta(days=5)).strftime('%Y-%m-%d')
         
-        result = polygon_tool.run({
+        result = polygon_provider.get().run({
             "ticker": symbol,
             "timespan": "day", 
             "timespan_multiplier": 1,
@@ -83,6 +96,7 @@ def get_polygon_data(symbol: str) -> dict:
     print(f"❌ Polygon sin datos para {symbol}")
     return {"success": False}
 
+@instrument("get_stock_data")
 def get_stock_data(company_name: str) -> dict:
     """
     Función principal: Obtiene datos financieros para una empresa
@@ -9,6 +9,8 @@ class FinancialNewsRequest(BaseModel):
     topic: str
     company: str
     language: str
+    include_timings: bool = False  # Añade el desglose de tiempos por etapa a la respuesta
+    llm_backend: Optional[str] = None  # "groq", "local" o "auto" (Groq con el LLM local como fallback)
 
 class FinancialNewsResponse(BaseModel):
     """
@@ -2,6 +2,7 @@ import os
 from dotenv import load_dotenv
 from backend.agents.agent import writing_agent, research_agent
 from langsmith import traceable
+from backend.timing import stage
 
 load_dotenv()
 
@@ -16,8 +17,17 @@ def generate_text_with_context(
     model_research,
     img_model=None,
     audience=None,
-    extra_context=None
+    extra_context=None,
+    context=None,
+    use_cache=False,
+    llm_backend=None
 ):
-    context = research_agent(topic, company, model=model_research)
-    text, prompt = writing_agent(topic, platform, tone, company, language, audience, context, model=model_writer, extra_context=extra_context)
+    # `context` permite reutilizar una investigación ya hecha (p. ej. en /generate/batch)
+    # `use_cache` True consulta la caché semántica de textos (cache: "prefer" en la petición)
+    # `llm_backend` fuerza el backend de LLM ("groq", "openrouter", "local"); None elige el router
+    if context is None:
+        with stage("research"):
+            context = research_agent(topic, company, model=model_research, audience=audience)
+    with stage("llm"):
+        text, prompt = writing_agent(topic, platform, tone, company, language, audience, context, model=model_writer, extra_context=extra_context, use_cache=use_cache, llm_backend=llm_backend)
     return text, prompt
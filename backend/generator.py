@@ -1,26 +1,21 @@
 import os
-import requests
+import hashlib
 from dotenv import load_dotenv
 from pathlib import Path
 from langsmith import traceable
+from backend.metrics import track_stage
+from backend.llm.router import get_llm_router
+from backend.single_flight import SingleFlight
 
 # Cargar variables de entorno desde .env en la raíz del proyecto
 load_dotenv()
 
-API_URL = "https://api.groq.com/openai/v1/chat/completions"
+# Los backends (Groq, OpenRouter...) y sus URLs/claves se configuran en backend/llm/router.py
 
-headers = {
-    "Authorization": f"Bearer {os.getenv('GROQ_API_KEY')}",
-    "Content-Type": "application/json"
-}
+# Peticiones idénticas simultáneas (mismo modelo y mismo prompt normalizado) comparten una sola llamada al LLM
+generate_flight = SingleFlight("generate_text")
 
-@traceable(name="Llamada al LLM vía Groq")
-def generate_text(prompt, model):
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "system",
-              "content": f"""Eres un creador de contenido experto y empático, especializado en adaptar mensajes para diferentes plataformas digitales y audiencias diversas.
+SYSTEM_PROMPT = """Eres un creador de contenido experto y empático, especializado en adaptar mensajes para diferentes plataformas digitales y audiencias diversas.
 
             🌟 **Tu misión es:**
             - Crear contenido auténtico que resuene emocionalmente con la audiencia
@@ -34,19 +29,58 @@ def generate_text(prompt, model):
             - Sabes cuándo ser directo y cuándo ser más elaborado
             - Siempre priorizas la claridad sin sacrificar el engagement
 
-            """},
+            """
+
+
+def _build_payload(prompt, model, stream=False, profile=None):
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": prompt}
         ],
         "temperature": 0.7
     }
+    if profile is not None:
+        # Perfil de la plataforma: temperatura, max_tokens y secuencias de parada
+        payload = profile.apply(payload)
+    if stream:
+        payload["stream"] = True
+    return payload
+
+
+def _generate_key(prompt, model, llm_backend=None, profile=None):
+    normalized = " ".join(prompt.split())
+    return (model, llm_backend or "auto", profile.name if profile is not None else None,
+            hashlib.sha256(normalized.encode("utf-8")).hexdigest())
+
+
+@traceable(name="Llamada al LLM vía Groq")
+def generate_text(prompt, model, llm_backend=None, profile=None):
+    """
+    Genera el texto a través del router de LLM: backend más rápido según latencia reciente,
+    petición duplicada si tarda más que su p95 y failover si falla.
+    Cada backend respeta sus límites de peticiones y tokens; si los remotos están agotados
+    y hay un LLM local configurado, la petición se desborda a él.
+    - llm_backend: fuerza un backend ("groq", "openrouter", "local"); None o "auto" elige el router
+    - profile: GenerationProfile de la plataforma (backend/llm/generation_profiles.py); None = sin tope de tokens
 
-    response = requests.post(API_URL, headers=headers, json=payload)
+    Raises:
+        LLMError (RateLimitError, LLMTimeoutError, APIError, ResponseParseError, LLMConfigError):
+            el error nunca se devuelve como si fuera el texto del post
+            (si la llamada era compartida, todos los que esperaban reciben el mismo error)
+    """
+    payload = _build_payload(prompt, model, profile=profile)
+    with track_stage("generate_text", label=model):
+        return generate_flight.do(_generate_key(prompt, model, llm_backend, profile), get_llm_router().complete_text,
+                                  payload, llm_backend)
 
-    if response.status_code == 200:
-        try:
-            return response.json()["choices"][0]["message"]["content"]
-        except Exception as e:
-            return f"❌ Parse Error: {str(e)} | Raw Response: {response.text}"
-    else:
-        return f"❌ API Error: {response.status_code} | {response.text}"
 
+def generate_text_stream(prompt, model, llm_backend=None, profile=None):
+    """
+    Variante en streaming de generate_text: pide a Groq `stream: true`
+    y va devolviendo los fragmentos de texto (deltas) según llegan.
+    """
+    payload = _build_payload(prompt, model, stream=True, profile=profile)
+    with track_stage("generate_text_stream", label=model):
+        yield from get_llm_router().stream_text(payload, llm_backend)
@@ -0,0 +1,139 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Tuple, Iterator
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from backend.metrics import HTTP_POOL_IN_USE, HTTP_POOL_WAIT, HTTP_REQUESTS
+
+load_dotenv()
+
+# Cliente HTTP saliente compartido: una sesión por servicio externo, con su pool de conexiones
+# keep-alive (sin repetir el handshake TCP+TLS en cada llamada) y timeouts de conexión y lectura.
+#
+# Timeouts por servicio: HTTP_TIMEOUT_<SERVICIO>="conexión,lectura" en segundos (p. ej. HTTP_TIMEOUT_GROQ=5,120)
+# Tamaño del pool por servicio: HTTP_POOL_<SERVICIO> (por defecto HTTP_POOL_MAXSIZE)
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+
+DEFAULT_TIMEOUTS: Dict[str, Tuple[float, float]] = {
+    "groq": (5, 120),
+    "openrouter": (5, 120),
+    "stability": (5, 120),
+    "pexels": (5, 15),
+    "unsplash": (5, 15),
+    "images": (5, 30),       # descarga de imágenes de Pexels/Unsplash (CDN)
+    "twelvedata": (5, 10),
+    "arxiv": (5, 60),
+    "local": (2, 300),       # LLM local en CPU (Ollama / llama.cpp): lento pero sin límites de cuota
+}
+FALLBACK_TIMEOUT = (5, 30)
+
+# Tamaño del pool por defecto cuando no es HTTP_POOL_MAXSIZE: un servidor de LLM en CPU
+# atiende pocas peticiones a la vez y el resto debe esperar aquí, no en su cola interna
+DEFAULT_POOL_SIZES: Dict[str, int] = {
+    "local": 2,
+}
+
+
+def _timeout_for(service: str) -> Tuple[float, float]:
+    raw = os.getenv(f"HTTP_TIMEOUT_{service.upper()}")
+    if raw:
+        try:
+            connect, read = (float(part) for part in raw.split(","))
+            return connect, read
+        except ValueError:
+            print(f"⚠️ HTTP_TIMEOUT_{service.upper()} inválido ('{raw}'), se usa el valor por defecto")
+    return DEFAULT_TIMEOUTS.get(service, FALLBACK_TIMEOUT)
+
+
+class ServiceClient:
+    """
+    Sesión HTTP de un servicio externo.
+
+    Un semáforo del mismo tamaño que el pool limita las peticiones simultáneas: así el tiempo
+    de espera por una conexión libre se puede medir (magicpost_http_pool_wait_seconds) y el pool
+    nunca abre conexiones extra que luego descarta.
+    """
+
+    def __init__(self, service: str, timeout: Tuple[float, float], pool_maxsize: int):
+        self.service = service
+        self.timeout = timeout
+        self.pool_maxsize = pool_maxsize
+        self._slots = threading.BoundedSemaphore(pool_maxsize)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @contextmanager
+    def _slot(self):
+        start = time.perf_counter()
+        self._slots.acquire()
+        HTTP_POOL_WAIT.labels(self.service).observe(time.perf_counter() - start)
+        in_use = HTTP_POOL_IN_USE.labels(self.service)
+        in_use.inc()
+        try:
+            yield
+        finally:
+            in_use.dec()
+            self._slots.release()
+
+    def _send(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.Timeout:
+            HTTP_REQUESTS.labels(self.service, "timeout").inc()
+            raise
+        except requests.RequestException:
+            HTTP_REQUESTS.labels(self.service, "error").inc()
+            raise
+        HTTP_REQUESTS.labels(self.service, str(response.status_code)).inc()
+        return response
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Petición completa: el cuerpo se lee entero y la conexión vuelve al pool al terminar."""
+        if kwargs.get("stream"):
+            raise ValueError("Para respuestas en streaming usar ServiceClient.stream()")
+        with self._slot():
+            return self._send(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    @contextmanager
+    def stream(self, method: str, url: str, **kwargs) -> Iterator[requests.Response]:
+        """
+        Respuesta en streaming (SSE). La conexión queda ocupada hasta salir del bloque `with`.
+        El timeout de lectura se aplica a cada fragmento, no a la respuesta completa.
+        """
+        with self._slot():
+            response = self._send(method, url, stream=True, **kwargs)
+            try:
+                yield response
+            finally:
+                response.close()
+
+
+_clients: Dict[str, ServiceClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(service: str) -> ServiceClient:
+    """Devuelve (creándolo la primera vez) el cliente compartido de un servicio."""
+    client = _clients.get(service)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(service)
+            if client is None:
+                default_size = DEFAULT_POOL_SIZES.get(service, HTTP_POOL_MAXSIZE)
+                pool_maxsize = int(os.getenv(f"HTTP_POOL_{service.upper()}", str(default_size)))
+                client = ServiceClient(service, _timeout_for(service), pool_maxsize)
+                _clients[service] = client
+    return client
+
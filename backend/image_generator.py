@@ -7,6 +7,7 @@ from backend.img_gen.main import generate_post_image
 from pathlib import Path
 import time
 from langsmith import traceable
+from backend.timing import stage
 
 # Cargar .env desde la raíz del proyecto
 load_dotenv(dotenv_path=Path(__file__).resolve().parents[1] / ".env")
@@ -32,7 +33,8 @@ def generate_image_url(text, model):
         output_path = str(output_path)
 
         print(f"📁 Ruta de salida: {output_path}")
-        result_path = generate_post_image(text[:2000], model, output_path)
+        with stage("image"):
+            result_path = generate_post_image(text[:2000], model, output_path)
         return result_path
     except Exception as e:
         print("Error retrieving image from model:", e)
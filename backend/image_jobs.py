@@ -0,0 +1,201 @@
+import os
+import re
+import json
+import time
+import uuid
+import queue
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, Callable
+from dotenv import load_dotenv
+from backend.content_pipeline import create_post_image
+
+load_dotenv()
+
+# Número de hilos que procesan la cola de imágenes y tiempo que se conservan los trabajos terminados
+IMAGE_JOB_WORKERS = int(os.getenv("IMAGE_JOB_WORKERS", "2"))
+IMAGE_JOB_TTL_S = int(os.getenv("IMAGE_JOB_TTL_S", "3600"))
+# Trabajos pendientes como máximo en la cola del proceso (cada worker de uvicorn tiene la suya,
+# compartida por sus IMAGE_JOB_WORKERS hilos); si la cola está llena, /generate responde 503
+IMAGE_JOB_QUEUE_MAX = int(os.getenv("IMAGE_JOB_QUEUE_MAX", "100"))
+# Estado de los trabajos en disco, compartido por los workers de uvicorn del mismo host:
+# /jobs/{id} responde aunque la consulta llegue a un worker distinto del que encoló el trabajo.
+# Con varios hosts, el directorio debe ser compartido (o el balanceador, con afinidad de sesión).
+IMAGE_JOBS_DIR = Path(os.getenv("IMAGE_JOBS_DIR") or Path(__file__).resolve().parents[1] / "data" / "image_jobs")
+
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+
+class ImageQueueFullError(RuntimeError):
+    """La cola de imágenes ha llegado a IMAGE_JOB_QUEUE_MAX trabajos pendientes."""
+
+
+class ImageJob:
+    """
+    Trabajo de generación de imagen.
+    Estados: "queued" → "running" → "done" | "failed"
+    """
+
+    def __init__(self, text: str, img_model: str, on_complete: Optional[Callable[[Optional[str]], None]] = None):
+        self.id = uuid.uuid4().hex
+        self.text = text
+        self.img_model = img_model
+        self.on_complete = on_complete
+        self.status = "queued"
+        self.image_url: Optional[str] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.finished = threading.Event()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "image_url": self.image_url,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+
+
+_jobs: Dict[str, ImageJob] = {}
+_jobs_lock = threading.Lock()
+_queue: "queue.Queue[ImageJob]" = queue.Queue(maxsize=IMAGE_JOB_QUEUE_MAX)
+_workers = []
+_workers_lock = threading.Lock()
+
+
+def _job_path(job_id: str) -> Path:
+    return IMAGE_JOBS_DIR / f"{job_id}.json"
+
+
+def _save_job(job: ImageJob):
+    """Escribe el estado del trabajo de forma atómica (fichero temporal + rename)."""
+    try:
+        IMAGE_JOBS_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = IMAGE_JOBS_DIR / f".{job.id}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job.to_dict(), f)
+        os.replace(tmp_path, _job_path(job.id))
+    except OSError as e:
+        print(f"⚠️ No se pudo guardar el estado del trabajo de imagen {job.id}: {e}")
+
+
+def _load_job(job_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_job_path(job_id), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _worker():
+    while True:
+        job = _queue.get()
+        job.status = "running"
+        _save_job(job)
+        try:
+            job.image_url = create_post_image(job.text, job.img_model)
+            if job.image_url:
+                job.status = "done"
+            else:
+                job.status = "failed"
+                job.error = "No se pudo generar o subir la imagen"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            print(f"❌ Error en el trabajo de imagen {job.id}: {e}")
+        finally:
+            job.finished_at = time.time()
+            _save_job(job)
+            job.finished.set()
+            _queue.task_done()
+
+        # Persistencia del post (u otra acción) una vez se conoce la URL de la imagen
+        if job.on_complete is not None:
+            try:
+                job.on_complete(job.image_url)
+            except Exception as e:
+                print(f"⚠️ Error tras el trabajo de imagen {job.id}: {e}")
+
+
+def _ensure_workers():
+    with _workers_lock:
+        while len(_workers) < IMAGE_JOB_WORKERS:
+            thread = threading.Thread(target=_worker, name=f"image-job-{len(_workers)}", daemon=True)
+            thread.start()
+            _workers.append(thread)
+
+
+def _prune_finished_jobs():
+    limit = time.time() - IMAGE_JOB_TTL_S
+    with _jobs_lock:
+        expired = [job_id for job_id, job in _jobs.items() if job.finished_at and job.finished_at < limit]
+        for job_id in expired:
+            del _jobs[job_id]
+    # Ficheros de estado de trabajos terminados hace más de IMAGE_JOB_TTL_S (de este worker o de otros).
+    # Los que siguen en cola o en curso se conservan aunque sean antiguos. El fichero se reescribe al terminar,
+    # así que uno modificado dentro del TTL no puede estar caducado y no hace falta leerlo.
+    try:
+        for path in IMAGE_JOBS_DIR.glob("*.json"):
+            if path.stat().st_mtime >= limit:
+                continue
+            state = _load_job(path.stem)
+            if state is not None and state.get("finished_at") and state["finished_at"] < limit:
+                path.unlink(missing_ok=True)
+    except OSError as e:
+        print(f"⚠️ No se pudieron limpiar los trabajos de imagen caducados: {e}")
+
+
+def image_queue_full() -> bool:
+    return _queue.full()
+
+
+def submit_image_job(text: str, img_model: str, on_complete: Optional[Callable[[Optional[str]], None]] = None) -> str:
+    """
+    Encola la generación de la imagen de un post y devuelve el id del trabajo.
+    - on_complete: se llama con la URL (o None) cuando termina el trabajo
+
+    Raises:
+        ImageQueueFullError: si ya hay IMAGE_JOB_QUEUE_MAX trabajos pendientes
+    """
+    _ensure_workers()
+    _prune_finished_jobs()
+
+    job = ImageJob(text, img_model, on_complete)
+    with _jobs_lock:
+        _jobs[job.id] = job
+    _save_job(job)
+    try:
+        _queue.put_nowait(job)
+    except queue.Full:
+        with _jobs_lock:
+            _jobs.pop(job.id, None)
+        _job_path(job.id).unlink(missing_ok=True)
+        raise ImageQueueFullError(f"❌ Cola de imágenes llena ({IMAGE_JOB_QUEUE_MAX} trabajos pendientes)") from None
+    print(f"🖼️ Trabajo de imagen encolado: {job.id} (pendientes: {_queue.qsize()})")
+    return job.id
+
+
+def get_image_job(job_id: str, wait_s: float = 0) -> Optional[Dict[str, Any]]:
+    """
+    Devuelve el estado de un trabajo, o None si no existe.
+    Los trabajos de otros workers se leen de IMAGE_JOBS_DIR.
+    - wait_s: si es > 0, espera hasta ese tiempo a que termine (long polling)
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is not None:
+        if wait_s > 0:
+            job.finished.wait(timeout=wait_s)
+        return job.to_dict()
+
+    if not _JOB_ID.fullmatch(job_id):
+        return None
+    deadline = time.time() + wait_s
+    state = _load_job(job_id)
+    while state is not None and state["finished_at"] is None and time.time() < deadline:
+        time.sleep(0.25)
+        state = _load_job(job_id) or state
+    return state
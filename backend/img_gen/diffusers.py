@@ -4,8 +4,6 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 import argparse
-from diffusers import StableDiffusionPipeline, StableDiffusionImg2ImgPipeline
-import torch
 import os
 import time
 
@@ -32,6 +30,9 @@ def load():
     try:
         global pipe
         if pipe is None:
+            # torch y diffusers se importan aquí para no cargarlos al arrancar la API
+            from diffusers import StableDiffusionPipeline
+            import torch
             print("Loading model... at", time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()))
             # Check if CUDA(GPU) is available and set the device accordingly
             device = "cuda" if torch.cuda.is_available() else "cpu"
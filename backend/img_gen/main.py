@@ -8,6 +8,8 @@ from .diffusers import main as diffusers_prompt
 from .stability import main as stability_prompt
 from .unsplash import main as unsplash_prompt
 from .pexels import main as pexels_prompt
+from backend.metrics import track_stage, IMAGE_PROVIDER_ATTEMPTS, IMAGE_FALLBACK_HOPS
+from backend.timing import stage
 
 pipe = None
 output_dir = "backend/img_gen/output"
@@ -27,11 +29,33 @@ default_image_prompt = ImagePrompt(
     details=os.getenv("IMG_DETAILS"),
 )
 
+# Proveedores remotos y orden de fallback para "remote:all"
+REMOTE_PROVIDERS = {
+    "stability": ("Stability AI model", stability_prompt),
+    "pexels": ("Pexels API", pexels_prompt),
+    "unsplash": ("Unsplash API", unsplash_prompt),
+}
+REMOTE_FALLBACK_ORDER = ["stability", "pexels", "unsplash"]
+
+def _run_provider(provider, prompt, output_path):
+    """Ejecuta un proveedor remoto registrando latencia y resultado (éxito / error) por proveedor."""
+    display_name, generate = REMOTE_PROVIDERS[provider]
+    print(f"Generating image using {display_name}...")
+    try:
+        with track_stage("generate_post_image", label=provider):
+            result = generate(prompt, output_path)
+    except Exception:
+        IMAGE_PROVIDER_ATTEMPTS.labels(provider, "error").inc()
+        raise
+    IMAGE_PROVIDER_ATTEMPTS.labels(provider, "success").inc()
+    return result
+
 def generate_post_image(prompt, model, output_path: str = output_path):
-    if not isinstance(prompt, ImagePrompt):
-        prompt = detect_and_translate(prompt)
-    elif isinstance(prompt, ImagePrompt):
-         prompt = translate_image_prompt(prompt).to_prompt()
+    with stage("translation"):
+        if not isinstance(prompt, ImagePrompt):
+            prompt = detect_and_translate(prompt)
+        elif isinstance(prompt, ImagePrompt):
+             prompt = translate_image_prompt(prompt).to_prompt()
     print(f"Prompt: {prompt}") # Debugging statement
     print(f"Model: {model}") # Debugging statement
     model_environment, model_name = model.split(":")
@@ -42,47 +66,25 @@ def generate_post_image(prompt, model, output_path: str = output_path):
             elif not is_ollama_running():
                 raise OSError("Ollama is not running. Please start Ollama to use the local model.")
             else:
-                return diffusers_prompt(prompt, output_path)
+                with track_stage("generate_post_image", label="local"):
+                    return diffusers_prompt(prompt, output_path)
     elif model_environment == "remote":
         if model_name == "all":
-            try:
-                print("Generating image using remote models...")    # Debugging statement
-                print("Generating image using Stability AI model...") # Debugging statement
-                return stability_prompt(prompt, output_path) # Generate image using Stability AI model API
-            except Exception as e:
-                print(f"Error generating image using Stability AI model: {e}") # Debugging statement
+            print("Generating image using remote models...")    # Debugging statement
+            for position, provider in enumerate(REMOTE_FALLBACK_ORDER):
+                if position > 0:
+                    IMAGE_FALLBACK_HOPS.labels(provider).inc()
                 try:
-                    print("Generating image using Pexels API...")
-                    return pexels_prompt(prompt, output_path)
+                    return _run_provider(provider, prompt, output_path)
                 except Exception as e:
-                    print(f"Error generating image using Pexels API: {e}") # Debugging statement
-                    try:
-                        print("Generating image using Unsplash API...")
-                        return unsplash_prompt(prompt, output_path)
-                    except Exception as e:
-                        print(f"Error generating image using Unsplash API: {e}") # Debugging statement
-                        raise ValueError("Failed to generate image using both Stability AI, Pexels and Unsplash APIs.")
-        elif model_name == "unsplash":
-            try:
-                print("Generating image using Unsplash API...")
-                return unsplash_prompt(prompt, output_path)
-            except Exception as e:
-                print(f"Error generating image using Unsplash API: {e}") # Debugging statement
-                raise ValueError("Failed to generate image using Unsplash API.")
-        elif model_name == "pexels":
-            try:
-                print("Generating image using Pexels API...")
-                return pexels_prompt(prompt, output_path)
-            except Exception as e:
-                print(f"Error generating image using Pexels API: {e}")
-                raise ValueError("Failed to generate image using Pexels API.")
-        elif model_name == "stability":
+                    print(f"Error generating image using {REMOTE_PROVIDERS[provider][0]}: {e}") # Debugging statement
+            raise ValueError("Failed to generate image using both Stability AI, Pexels and Unsplash APIs.")
+        elif model_name in REMOTE_PROVIDERS:
             try:
-                print("Generating image using Stability AI model...")
-                return stability_prompt(prompt, output_path) # Generate image using Stability AI model API
+                return _run_provider(model_name, prompt, output_path)
             except Exception as e:
-                print(f"Error generating image using Stability AI model: {e}")
-                raise ValueError("Failed to generate image using Stability AI model.")  
+                print(f"Error generating image using {REMOTE_PROVIDERS[model_name][0]}: {e}") # Debugging statement
+                raise ValueError(f"Failed to generate image using {REMOTE_PROVIDERS[model_name][0]}.")
     else:
         raise ValueError(f"Invalid model: {model}. Supported models are 'local:local', 'remote:all', 'remote:unsplash', 'remote:pexels', and 'remote:stability'.")
 
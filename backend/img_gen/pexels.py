@@ -1,12 +1,13 @@
-import requests
 import os
 import argparse
 from dotenv import load_dotenv
 from .models import ImagePrompt
 from .utils import extract_keywords, download_image_from_url, get_image_base64_from_url
+from backend.http_client import get_client
 
 load_dotenv()
 PEXELS_API_KEY = os.getenv("PEXELS_API_KEY")
+PEXELS_API_URL = os.getenv("PEXELS_API_URL", "https://api.pexels.com/v1")
 if (not PEXELS_API_KEY or PEXELS_API_KEY == "") and __name__ == "__main__":
     raise ValueError("PEXELS_API_KEY environment variable is not set.")
 
@@ -28,10 +29,10 @@ output_path = "server/image-gen/output/output.png"
 def search_pexels_by_keywords(keywords):
     try:
         query = " ".join(keywords[:3])  # combinar palabras clave
-        url = f"https://api.pexels.com/v1/search?query={query}&per_page=1"
+        url = f"{PEXELS_API_URL}/search?query={query}&per_page=1"
         headers = {"Authorization": PEXELS_API_KEY}
 
-        response = requests.get(url, headers=headers)
+        response = get_client("pexels").get(url, headers=headers)
         if response.status_code == 200:
             results = response.json()
             if results["photos"]:
@@ -1,7 +1,7 @@
 from .models import ImagePrompt
 from .utils import image_output
 import argparse
-import requests
+from backend.http_client import get_client
 from dotenv import load_dotenv  
 load_dotenv()  # Load environment variables from .env file
 import os
@@ -41,7 +41,7 @@ def generate_image(prompt: str, output_path: str):
         "steps": 30
     }
 
-    response = requests.post(url, headers=headers, json=payload)
+    response = get_client("stability").post(url, headers=headers, json=payload)
     
     if response.status_code != 200:
         raise Exception(f"Error: {response.status_code}, {response.text}")
@@ -49,7 +49,9 @@ def generate_image(prompt: str, output_path: str):
     # Get the image in base64 format
     data = response.json()
     b64_image = data["artifacts"][0]["base64"]
-    return image_output(b64_image, output_path)
+    result = image_output(b64_image, output_path)
+    # image_output guarda el fichero y no devuelve nada si hay output_path
+    return output_path if output_path else result
   
     
 
@@ -1,12 +1,13 @@
-import requests
 import os
 import argparse
 from dotenv import load_dotenv
 from .models import ImagePrompt
 from .utils import extract_keywords, download_image_from_url, get_image_base64_from_url
+from backend.http_client import get_client
 
 load_dotenv()
 UNSPLASH_ACCESS_KEY = os.getenv("UNSPLASH_ACCESS_KEY")
+UNSPLASH_API_URL = os.getenv("UNSPLASH_API_URL", "https://api.unsplash.com")
 if (not UNSPLASH_ACCESS_KEY or UNSPLASH_ACCESS_KEY == "") and __name__ == "__main__":
     raise ValueError("UNSPLASH_ACCESS_KEY environment variable is not set.")
 
@@ -27,10 +28,10 @@ output_path = "server/image-gen/output/output.png"
 def search_unsplash_by_keywords(keywords):
     try:
         query = ",".join(keywords[:3])  # combinar palabras clave
-        url = f"https://api.unsplash.com/search/photos?query={query}&per_page=1"
+        url = f"{UNSPLASH_API_URL}/search/photos?query={query}&per_page=1"
         headers = {"Authorization": f"Client-ID {UNSPLASH_ACCESS_KEY}"}
         
-        response = requests.get(url, headers=headers)
+        response = get_client("unsplash").get(url, headers=headers)
         if response.status_code == 200:
             results = response.json()
             if results["results"]:
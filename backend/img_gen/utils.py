@@ -5,7 +5,8 @@ import base64
 from langdetect import detect
 from deep_translator import GoogleTranslator
 from .models import ImagePrompt
-from keybert import KeyBERT
+from backend.model_registry import get_keybert
+from backend.http_client import get_client
 import requests
 import subprocess
 
@@ -53,7 +54,7 @@ def translate_image_prompt(prompt: ImagePrompt) -> ImagePrompt:
     return ImagePrompt(**translated_fields)
 
 def extract_keywords(text, top_n=5):
-    kw_model = KeyBERT()
+    kw_model = get_keybert()
     keywords = kw_model.extract_keywords(text, top_n=top_n, stop_words='english')
     print(f"🔑 Extracted keywords: {keywords}")
     return [kw for kw, score in keywords]
@@ -121,13 +122,15 @@ def save_image(image, filepath):
         exit(1)
 
 def download_image_from_url(url, output_path="output/output.jpg"):
-    img_data = requests.get(url).content
+    response = get_client("images").get(url)
+    response.raise_for_status()
+    img_data = response.content
     # with open(filename, "wb") as handler:
     #     handler.write(img_data)
     save_image(Image.open(io.BytesIO(img_data)), output_path)
 
 def get_image_base64_from_url(url):
-    response = requests.get(url)
+    response = get_client("images").get(url)
     if response.status_code == 200:
         base64_image = base64.b64encode(response.content).decode('utf-8')
         return f"data:image/png;base64,{base64_image}"
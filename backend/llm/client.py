@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import random
+import threading
+from contextlib import ExitStack
+from typing import Callable, Dict, Any, Iterator, Optional, Tuple
+import requests
+from dotenv import load_dotenv
+from backend.http_client import get_client
+from backend.metrics import LLM_QUEUE_WAIT, LLM_RETRIES, LLM_TOKENS
+from backend.llm.errors import (
+    LLMError, RateLimitError, LLMTimeoutError, APIError, ResponseParseError, RequestCancelledError
+)
+from backend.llm.rate_limit import RateLimiter, parse_duration_s, LLM_QUEUE_TIMEOUT_S
+
+load_dotenv()
+
+# Reintentos ante 429, 5xx, timeouts y errores de red (backoff exponencial con jitter completo)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_S = float(os.getenv("LLM_BACKOFF_S", "0.5"))
+LLM_BACKOFF_MAX_S = float(os.getenv("LLM_BACKOFF_MAX_S", "8"))
+# Tokens de respuesta que se reservan si la petición no fija max_tokens
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "1024"))
+
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def estimate_tokens(payload: Dict[str, Any]) -> int:
+    """Estimación previa del consumo: ~4 caracteres por token de prompt + tokens de respuesta."""
+    prompt_chars = sum(len(m.get("content") or "") for m in payload.get("messages", []))
+    return prompt_chars // 4 + int(payload.get("max_tokens") or LLM_EXPECTED_COMPLETION_TOKENS)
+
+
+class ChatCompletionsClient:
+    """
+    Cliente de una API compatible con OpenAI chat completions (Groq) que respeta sus límites.
+
+    Antes de cada llamada reserva presupuesto del modelo (RateLimiter); las cabeceras de la
+    respuesta corrigen ese presupuesto. Los 429 y errores transitorios se reintentan
+    con backoff y jitter, y los fallos se lanzan como errores tipados (backend.llm.errors).
+    """
+
+    def __init__(self, api_url: str, headers: Dict[str, str], service: str = "groq",
+                 limiter: Optional[RateLimiter] = None, max_retries: int = LLM_MAX_RETRIES,
+                 queue_timeout_s: float = LLM_QUEUE_TIMEOUT_S):
+        self.api_url = api_url
+        self.headers = headers
+        self.service = service
+        self.limiter = limiter or RateLimiter()
+        self.max_retries = max_retries
+        self.queue_timeout_s = queue_timeout_s
+
+    def _backoff(self, attempt: int, retry_after_s: Optional[float]) -> float:
+        delay = random.uniform(0, min(LLM_BACKOFF_MAX_S, LLM_BACKOFF_S * 2 ** attempt))
+        return max(delay, retry_after_s or 0)
+
+    def _reserve(self, model: str, estimated: int, cancel: Optional[threading.Event] = None):
+        waited = self.limiter.budget(model).acquire(estimated, timeout_s=self.queue_timeout_s, cancel=cancel)
+        LLM_QUEUE_WAIT.labels(model).observe(waited)
+
+    def _error_for(self, response: requests.Response, model: str) -> LLMError:
+        retry_after = parse_duration_s(response.headers.get("retry-after"))
+        if response.status_code == 429:
+            return RateLimitError(f"❌ Límite de Groq superado para {model}: {response.text[:300]}",
+                                  model=model, retry_after_s=retry_after)
+        return APIError(f"❌ API Error: {response.status_code} | {response.text[:300]}",
+                        model=model, status_code=response.status_code, body=response.text)
+
+    @staticmethod
+    def _check_cancelled(cancel: Optional[threading.Event], model: str):
+        if cancel is not None and cancel.is_set():
+            raise RequestCancelledError(f"Petición a {model} abandonada", model=model)
+
+    def _send(self, payload: Dict[str, Any], stream: bool, cancel: Optional[threading.Event] = None,
+              on_send: Optional[Callable[[], None]] = None) -> Tuple[requests.Response, int, ExitStack]:
+        """
+        Reserva presupuesto y hace la llamada, reintentando hasta obtener un 200.
+        Devuelve la respuesta, los tokens reservados y un ExitStack que la cierra
+        (en streaming, la conexión sigue ocupada hasta cerrarlo).
+        - cancel: si se activa, no se hacen más intentos (una petición HTTP ya enviada no se puede interrumpir)
+        - on_send: se llama justo antes de enviar cada intento, ya superada la cola de límites
+        """
+        model = payload.get("model", "")
+        estimated = estimate_tokens(payload)
+        budget = self.limiter.budget(model)
+        client = get_client(self.service)
+        last_error: Optional[LLMError] = None
+
+        for attempt in range(self.max_retries + 1):
+            self._check_cancelled(cancel, model)
+            self._reserve(model, estimated, cancel)
+            if cancel is not None and cancel.is_set():
+                # Reservado pero no enviado: se devuelven la petición y los tokens
+                budget.release(estimated)
+                self._check_cancelled(cancel, model)
+            if on_send is not None:
+                on_send()
+            stack = ExitStack()
+            try:
+                if stream:
+                    response = stack.enter_context(
+                        client.stream("POST", self.api_url, headers=self.headers, json=payload)
+                    )
+                else:
+                    response = client.post(self.api_url, headers=self.headers, json=payload)
+                budget.update_from_headers(response.headers)
+                if response.status_code == 200:
+                    return response, estimated, stack
+                last_error = self._error_for(response, model)
+                stack.close()
+            except requests.Timeout as e:
+                stack.close()
+                last_error = LLMTimeoutError(f"❌ Timeout llamando a {self.service} ({model}): {e}", model=model)
+                reason = "timeout"
+            except requests.RequestException as e:
+                stack.close()
+                last_error = APIError(f"❌ Error de red llamando a {self.service} ({model}): {e}", model=model)
+                reason = "network"
+            else:
+                reason = str(last_error.status_code)
+
+            # Un intento sin 200 (4xx, 5xx, timeout, red) no se cobra como consumo: se devuelven los tokens
+            # reservados para que el cubo local no se vacíe con errores y frene por debajo del límite real
+            budget.settle(estimated, 0)
+            if reason not in ("timeout", "network") and last_error.status_code not in _RETRYABLE_STATUS:
+                raise last_error
+            if attempt == self.max_retries:
+                break
+            retry_after = getattr(last_error, "retry_after_s", None)
+            if isinstance(last_error, RateLimitError):
+                # Nadie más debe gastar presupuesto mientras el proveedor nos frena
+                budget.block_for(retry_after or self._backoff(attempt, None))
+            LLM_RETRIES.labels(model, reason).inc()
+            delay = self._backoff(attempt, retry_after)
+            if cancel is not None:
+                cancel.wait(delay)
+            else:
+                time.sleep(delay)
+
+        raise last_error
+
+    def complete(self, payload: Dict[str, Any], cancel: Optional[threading.Event] = None,
+                 on_send: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+        """Llamada completa. Devuelve el JSON de la respuesta."""
+        model = payload.get("model", "")
+        response, estimated, _ = self._send(payload, stream=False, cancel=cancel, on_send=on_send)
+        try:
+            data = response.json()
+        except ValueError as e:
+            raise ResponseParseError(f"❌ Parse Error: {e} | Raw Response: {response.text[:300]}", model=model)
+        self._record_usage(model, estimated, data.get("usage"))
+        return data
+
+    def complete_text(self, payload: Dict[str, Any], cancel: Optional[threading.Event] = None,
+                      on_send: Optional[Callable[[], None]] = None) -> str:
+        """Llamada completa. Devuelve solo el texto del primer choice."""
+        data = self.complete(payload, cancel=cancel, on_send=on_send)
+        try:
+            return data["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError) as e:
+            raise ResponseParseError(f"❌ Parse Error: {e} | Raw Response: {json.dumps(data)[:300]}",
+                                     model=payload.get("model"))
+
+    def stream_text(self, payload: Dict[str, Any]) -> Iterator[str]:
+        """
+        Llamada en streaming (`stream: true`). Devuelve los fragmentos de texto según llegan.
+        Solo se reintenta antes del primer fragmento: después el cliente ya ha recibido texto.
+        """
+        model = payload.get("model", "")
+        payload = {**payload, "stream": True}
+        response, estimated, stack = self._send(payload, stream=True)
+        with stack:
+            usage = None
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                        delta = chunk["choices"][0]["delta"].get("content") if chunk.get("choices") else None
+                    except (ValueError, KeyError, IndexError, TypeError) as e:
+                        raise ResponseParseError(f"❌ Parse Error: {e} | Raw chunk: {data}", model=model)
+                    # Groq envía el consumo en el último fragmento (x_groq.usage)
+                    usage = (chunk.get("x_groq") or {}).get("usage") or chunk.get("usage") or usage
+                    if delta:
+                        yield delta
+            except requests.Timeout as e:
+                raise LLMTimeoutError(f"❌ Timeout leyendo el streaming de {self.service} ({model}): {e}", model=model)
+            except requests.RequestException as e:
+                raise APIError(f"❌ Streaming interrumpido ({model}): {e}", model=model)
+        self._record_usage(model, estimated, usage)
+
+    def _record_usage(self, model: str, estimated: int, usage: Optional[Dict[str, Any]]):
+        if not usage:
+            return
+        LLM_TOKENS.labels(model, "prompt").inc(usage.get("prompt_tokens") or 0)
+        LLM_TOKENS.labels(model, "completion").inc(usage.get("completion_tokens") or 0)
+        self.limiter.budget(model).settle(estimated, usage.get("total_tokens"))
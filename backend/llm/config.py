@@ -0,0 +1,25 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuración de los backends de LLM compartida por el router HTTP (router.py)
+# y por las cadenas de LangChain (noticias financieras).
+
+# Backends activos (LLM_BACKENDS="groq,openrouter,local"); sin definir, todos los configurados.
+# En CI sin red: LLM_BACKENDS=local.
+LLM_BACKENDS = {name.strip() for name in os.getenv("LLM_BACKENDS", "").split(",") if name.strip()}
+
+# Backend local compatible con OpenAI (Ollama o servidor de llama.cpp con un modelo cuantizado en CPU).
+# LOCAL_LLM_URL es la URL base de la API: Ollama http://localhost:11434/v1, llama.cpp http://localhost:8080/v1
+LOCAL_LLM_URL = os.getenv("LOCAL_LLM_URL")
+LOCAL_LLM_MODEL = os.getenv("LOCAL_LLM_MODEL", "qwen2.5:1.5b-instruct")
+LOCAL_LLM_API_KEY = os.getenv("LOCAL_LLM_API_KEY", "local")
+
+
+def backend_enabled(name: str) -> bool:
+    return not LLM_BACKENDS or name in LLM_BACKENDS
+
+
+def local_llm_configured() -> bool:
+    return bool(LOCAL_LLM_URL) and backend_enabled("local")
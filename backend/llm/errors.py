@@ -0,0 +1,52 @@
+from typing import Optional
+
+
+class LLMError(Exception):
+    """Error base de las llamadas al LLM. Nunca se devuelve como texto del post."""
+
+    def __init__(self, message: str, model: Optional[str] = None, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.model = model
+        self.status_code = status_code
+
+
+class RateLimitError(LLMError):
+    """
+    Límite de peticiones/tokens agotado: Groq respondió 429 tras los reintentos,
+    o la espera en cola superó LLM_QUEUE_TIMEOUT_S.
+    - retry_after_s: cuándo tiene sentido volver a intentarlo (si se conoce)
+    """
+
+    def __init__(self, message: str, model: Optional[str] = None, retry_after_s: Optional[float] = None,
+                 status_code: Optional[int] = 429):
+        super().__init__(message, model=model, status_code=status_code)
+        self.retry_after_s = retry_after_s
+
+
+class LLMTimeoutError(LLMError):
+    """El proveedor no respondió dentro del timeout de conexión o lectura."""
+    pass
+
+
+class APIError(LLMError):
+    """Respuesta de error del proveedor (4xx/5xx) o fallo de red tras agotar los reintentos."""
+
+    def __init__(self, message: str, model: Optional[str] = None, status_code: Optional[int] = None,
+                 body: Optional[str] = None):
+        super().__init__(message, model=model, status_code=status_code)
+        self.body = body
+
+
+class ResponseParseError(LLMError):
+    """La respuesta no tiene el formato esperado de chat completions."""
+    pass
+
+
+class LLMConfigError(LLMError):
+    """No hay ningún backend de LLM utilizable con la configuración actual (LLM_BACKENDS, claves, URLs...)."""
+    pass
+
+
+class RequestCancelledError(LLMError):
+    """La petición se abandonó (p. ej. la perdedora de una petición duplicada del router)."""
+    pass
@@ -0,0 +1,128 @@
+import os
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Perfiles de generación por plataforma (longitud, decodificación y nivel de modelo) en un JSON editable:
+# los cambios en el fichero se aplican en la siguiente petición, sin reiniciar ni tocar código.
+GENERATION_PROFILES_PATH = (os.getenv("GENERATION_PROFILES_PATH")
+                            or str(Path(__file__).with_name("generation_profiles.json")))
+
+_FIELDS = ("max_tokens", "temperature", "stop", "target_words", "max_chars", "model_tier")
+# Valores si el fichero no existe o no es válido: los de antes de los perfiles
+_BUILTIN_DEFAULT: Dict[str, Any] = {"max_tokens": None, "temperature": 0.7, "stop": [], "target_words": None,
+                                    "max_chars": None, "model_tier": None}
+
+
+class GenerationProfile:
+    """
+    Parámetros de generación de una plataforma.
+
+    - max_tokens: tope duro de la respuesta (algo por encima de target_words para no cortar frases)
+    - stop: secuencias de parada (la API admite hasta 4)
+    - target_words / max_chars: longitud objetivo que se pide en el prompt
+    - model_tier: nivel de modelo ("fast", "quality"...) según model_tiers; None = modelo de redacción
+    """
+
+    def __init__(self, name: str, max_tokens: Optional[int] = None, temperature: float = 0.7,
+                 stop: Optional[List[str]] = None, target_words: Optional[int] = None,
+                 max_chars: Optional[int] = None, model_tier: Optional[str] = None,
+                 model_tiers: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.stop = list(stop or [])[:4]
+        self.target_words = target_words
+        self.max_chars = max_chars
+        self.model_tier = model_tier
+        self.model_tiers = model_tiers or {}
+
+    def model(self, default_model: str) -> str:
+        """Modelo del nivel del perfil; sin nivel (o nivel desconocido) se usa default_model."""
+        if self.model_tier and self.model_tier not in self.model_tiers:
+            print(f"⚠️ Nivel de modelo '{self.model_tier}' no definido en model_tiers, se usa {default_model}")
+        return self.model_tiers.get(self.model_tier, default_model) if self.model_tier else default_model
+
+    def apply(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Añade al payload de chat completions la temperatura, el tope de tokens y las paradas."""
+        payload = {**payload, "temperature": self.temperature}
+        if self.max_tokens:
+            payload["max_tokens"] = self.max_tokens
+        if self.stop:
+            payload["stop"] = self.stop
+        return payload
+
+    def length_instruction(self) -> str:
+        """Frase para el prompt con la longitud objetivo (vacía si el perfil no la fija)."""
+        parts = []
+        if self.target_words:
+            parts.append(f"unas {self.target_words} palabras")
+        if self.max_chars:
+            parts.append(f"nunca más de {self.max_chars} caracteres en total")
+        if not parts:
+            return ""
+        return f"Extensión: {' y '.join(parts)}. Escribe solo el contenido, sin notas ni explicaciones al final."
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, **{field: getattr(self, field) for field in _FIELDS}}
+
+
+class ProfileStore:
+    """Lee el fichero de perfiles y lo vuelve a leer cuando cambia su fecha de modificación."""
+
+    def __init__(self, path: str = GENERATION_PROFILES_PATH):
+        self.path = path
+        self._mtime: Optional[float] = None
+        self._config: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            if self._mtime is not None or not self._config:
+                print(f"⚠️ No se encuentra {self.path}: se generan sin perfiles por plataforma")
+                self._mtime, self._config = None, {"default": {}}
+            return self._config
+        if mtime == self._mtime:
+            return self._config
+        with self._lock:
+            if mtime != self._mtime:
+                try:
+                    with open(self.path, encoding="utf-8") as f:
+                        self._config = json.load(f)
+                    print(f"✅ Perfiles de generación cargados desde {self.path}")
+                except (OSError, json.JSONDecodeError) as e:
+                    # Se mantienen los perfiles anteriores (o los valores por defecto) hasta que el fichero sea válido
+                    print(f"⚠️ Perfiles de generación no válidos en {self.path}, se ignoran: {e}")
+                    self._config = self._config or {"default": {}}
+                self._mtime = mtime
+        return self._config
+
+    def get(self, platform: Optional[str]) -> GenerationProfile:
+        config = self._load()
+        name = " ".join((platform or "").split()).lower()
+        platforms = {key.lower(): value for key, value in (config.get("platforms") or {}).items()}
+        values = {**_BUILTIN_DEFAULT, **(config.get("default") or {}), **platforms.get(name, {})}
+        return GenerationProfile(
+            name if name in platforms else "default",
+            model_tiers=config.get("model_tiers") or {},
+            **{field: values.get(field) for field in _FIELDS}
+        )
+
+    def all(self) -> Dict[str, Dict[str, Any]]:
+        config = self._load()
+        names = ["default"] + sorted(config.get("platforms") or {})
+        return {name: self.get(name if name != "default" else None).as_dict() for name in names}
+
+
+profile_store = ProfileStore()
+
+
+def get_profile(platform: Optional[str]) -> GenerationProfile:
+    """Perfil de la plataforma (sin distinguir mayúsculas); las desconocidas usan el perfil "default"."""
+    return profile_store.get(platform)
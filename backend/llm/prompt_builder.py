@@ -0,0 +1,223 @@
+import os
+import re
+import json
+from typing import List, Dict, Optional, Callable
+import numpy as np
+from dotenv import load_dotenv
+from backend.providers import LazyProvider, MODEL_CACHE_DIR
+from backend.metrics import PROMPT_TOKENS, PROMPT_TRIMMED_CHUNKS
+
+load_dotenv()
+
+# Presupuesto de tokens por sección del prompt de redacción.
+# La instrucción (plantilla + tema + tono) no se recorta: su presupuesto solo se vigila.
+PROMPT_BUDGET_INSTRUCTION = int(os.getenv("PROMPT_BUDGET_INSTRUCTION", "500"))
+PROMPT_BUDGET_CONTEXT = int(os.getenv("PROMPT_BUDGET_CONTEXT", "1500"))     # contexto de Pinecone
+PROMPT_BUDGET_DOCUMENT = int(os.getenv("PROMPT_BUDGET_DOCUMENT", "2500"))   # documento subido por el usuario
+# Fragmentos del documento que se puntúan con embeddings (el resto se descarta antes por solapamiento léxico)
+PROMPT_EMBED_MAX_CHUNKS = int(os.getenv("PROMPT_EMBED_MAX_CHUNKS", "256"))
+PROMPT_CHUNK_WORDS = int(os.getenv("PROMPT_CHUNK_WORDS", "120"))
+
+# Separador de los fragmentos de Pinecone en el texto de contexto que devuelve research_agent:
+# un carácter de control que no aparece en los documentos, para presupuestar fragmentos completos
+# (un fragmento puede tener varias líneas). En el prompt los fragmentos van separados por una línea en blanco.
+CONTEXT_CHUNK_SEPARATOR = "\x1e"
+PROMPT_CHUNK_JOINER = "\n\n"
+
+# Tokenizador de Hugging Face por modelo (PROMPT_TOKENIZERS en JSON para cambiarlo).
+# Se cargan en el calentamiento (arranque o primera sonda de /readyz), nunca dentro de una petición:
+# mientras no estén cargados, o si no se pueden cargar (sin red, sin transformers...), se estima con ~4 caracteres por token.
+PROMPT_TOKENIZERS: Dict[str, str] = {
+    "llama-3.3-70b-versatile": "Xenova/Meta-Llama-3.1-Tokenizer",
+    "llama3-8b-8192": "Xenova/Meta-Llama-3.1-Tokenizer",
+}
+if os.getenv("PROMPT_TOKENIZERS"):
+    try:
+        PROMPT_TOKENIZERS.update(json.loads(os.getenv("PROMPT_TOKENIZERS")))
+    except json.JSONDecodeError as e:
+        print(f"⚠️ PROMPT_TOKENIZERS no es JSON válido, se ignora: {e}")
+
+
+def _load_tokenizer(name: str):
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(name, cache_dir=MODEL_CACHE_DIR)
+
+
+def _tokenizer_provider(name: str) -> LazyProvider:
+    return LazyProvider(f"tokenizer:{name}", lambda: _load_tokenizer(name), required=False)
+
+
+# Un proveedor por tokenizador configurado, creados al importar (el diccionario no cambia después)
+_tokenizer_providers: Dict[str, LazyProvider] = {
+    name: _tokenizer_provider(name) for name in dict.fromkeys(PROMPT_TOKENIZERS.values()) if name
+}
+
+
+def get_token_counter(model: str) -> Callable[[str], int]:
+    """Función que cuenta tokens de un texto con el tokenizador del modelo (o la estimación por caracteres)."""
+    provider = _tokenizer_providers.get(PROMPT_TOKENIZERS.get(model))
+    if provider is not None and provider.is_ready():
+        tokenizer = provider.get()
+        return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+    return estimate_tokens
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def count_tokens(text: str, model: str) -> int:
+    return get_token_counter(model)(text)
+
+
+def join_context(chunks: List[str]) -> str:
+    """Une los fragmentos recuperados conservando sus límites (ver CONTEXT_CHUNK_SEPARATOR)."""
+    return CONTEXT_CHUNK_SEPARATOR.join(chunk.replace(CONTEXT_CHUNK_SEPARATOR, " ").strip() for chunk in chunks)
+
+
+def split_context(context: Optional[str]) -> List[str]:
+    """Fragmentos de un texto de contexto creado con join_context (un texto sin separador es un solo fragmento)."""
+    return [chunk.strip() for chunk in (context or "").split(CONTEXT_CHUNK_SEPARATOR) if chunk.strip()]
+
+
+def context_for_prompt(context: Optional[str]) -> str:
+    """Texto de contexto tal como va en el prompt, sin recortar."""
+    return PROMPT_CHUNK_JOINER.join(split_context(context))
+
+
+def split_chunks(text: str, max_words: int = PROMPT_CHUNK_WORDS) -> List[str]:
+    """Divide un texto en fragmentos por párrafos, partiendo los párrafos largos por frases."""
+    chunks = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph.split()) <= max_words:
+            chunks.append(paragraph)
+            continue
+        current: List[str] = []
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+            if current and len(" ".join(current + [sentence]).split()) > max_words:
+                chunks.append(" ".join(current))
+                current = []
+            current.append(sentence)
+        if current:
+            chunks.append(" ".join(current))
+    return chunks
+
+
+def _lexical_scores(query: str, chunks: List[str]) -> np.ndarray:
+    terms = {term for term in re.findall(r"\w+", query.lower()) if len(term) > 2}
+    scores = []
+    for chunk in chunks:
+        words = re.findall(r"\w+", chunk.lower())
+        hits = sum(1 for word in words if word in terms)
+        scores.append(hits / (1 + len(words)) ** 0.5)
+    return np.asarray(scores, dtype=np.float32)
+
+
+def rank_by_relevance(query: str, chunks: List[str]) -> List[int]:
+    """
+    Índices de los fragmentos de más a menos relevantes para la consulta.
+    Embeddings del modelo compartido (MiniLM); si no está disponible, solapamiento léxico.
+    """
+    if len(chunks) <= 1:
+        return list(range(len(chunks)))
+    lexical = _lexical_scores(query, chunks)
+    candidates = list(np.argsort(-lexical, kind="stable")[:PROMPT_EMBED_MAX_CHUNKS])
+    try:
+        from backend.model_registry import get_sentence_transformer
+        model = get_sentence_transformer()
+        vectors = model.encode([query] + [chunks[i] for i in candidates], normalize_embeddings=True, batch_size=64)
+        similarities = vectors[1:] @ vectors[0]
+        order = [candidates[i] for i in np.argsort(-similarities, kind="stable")]
+    except Exception as e:
+        print(f"⚠️ Relevancia por embeddings no disponible, se usa solapamiento léxico: {e}")
+        order = candidates
+    selected = set(order)
+    return order + [i for i in np.argsort(-lexical, kind="stable") if i not in selected]
+
+
+def fit_chunks(chunks: List[str], order: List[int], budget: int, counter: Callable[[str], int],
+               separator: str = "\n") -> List[str]:
+    """
+    Elige fragmentos en orden de relevancia hasta llenar el presupuesto
+    y los devuelve en su orden original (para que el texto siga siendo legible).
+    """
+    chosen, used = [], 0
+    separator_tokens = counter(separator) if separator.strip() else 1
+    for index in order:
+        tokens = counter(chunks[index]) + separator_tokens
+        if used + tokens > budget:
+            continue
+        chosen.append(index)
+        used += tokens
+    return [chunks[i] for i in sorted(chosen)]
+
+
+class PromptSections:
+    """Resultado del recorte: secciones ya ajustadas al presupuesto y tokens de cada una."""
+
+    def __init__(self, context: str, extra_context: str, tokens: Dict[str, int], dropped: Dict[str, int]):
+        self.context = context
+        self.extra_context = extra_context
+        self.tokens = tokens
+        self.dropped = dropped
+
+
+def budget_sections(
+    query: str,
+    context: str,
+    extra_context: str,
+    model: str,
+    context_budget: int = PROMPT_BUDGET_CONTEXT,
+    document_budget: int = PROMPT_BUDGET_DOCUMENT
+) -> PromptSections:
+    """
+    Ajusta el contexto de Pinecone y el documento del usuario a su presupuesto de tokens.
+
+    - context: fragmentos unidos con join_context, ya ordenados por relevancia;
+      se conservan enteros los primeros que quepan.
+    - extra_context: se trocea y se conservan los fragmentos más relevantes para `query`
+      (no solo el principio del documento).
+    """
+    counter = get_token_counter(model)
+    dropped = {"context": 0, "document": 0}
+
+    context_chunks = split_context(context)
+    kept_context = fit_chunks(context_chunks, list(range(len(context_chunks))), context_budget, counter,
+                              separator=PROMPT_CHUNK_JOINER)
+    dropped["context"] = len(context_chunks) - len(kept_context)
+
+    document = (extra_context or "").strip()
+    kept_document = document
+    if document and counter(document) > document_budget:
+        document_chunks = split_chunks(document)
+        kept = fit_chunks(document_chunks, rank_by_relevance(query, document_chunks), document_budget, counter,
+                          separator="\n\n")
+        dropped["document"] = len(document_chunks) - len(kept)
+        kept_document = "\n\n".join(kept)
+
+    context_text = PROMPT_CHUNK_JOINER.join(kept_context)
+    tokens = {"context": counter(context_text) if context_text else 0,
+              "document": counter(kept_document) if kept_document else 0}
+    for section, count in dropped.items():
+        if count:
+            PROMPT_TRIMMED_CHUNKS.labels(section).inc(count)
+    return PromptSections(context_text, kept_document, tokens, dropped)
+
+
+def record_prompt_tokens(prompt: str, sections: PromptSections, model: str,
+                         instruction_budget: int = PROMPT_BUDGET_INSTRUCTION) -> Dict[str, int]:
+    """Cuenta los tokens del prompt final, los registra en métricas y los devuelve por sección."""
+    total = count_tokens(prompt, model)
+    tokens = {**sections.tokens,
+              "instruction": max(0, total - sections.tokens["context"] - sections.tokens["document"]),
+              "total": total}
+    for section, count in tokens.items():
+        PROMPT_TOKENS.labels(section).observe(count)
+    if tokens["instruction"] > instruction_budget:
+        print(f"⚠️ La instrucción ocupa {tokens['instruction']} tokens (presupuesto {instruction_budget})")
+    print(f"🧮 Prompt: {tokens['total']} tokens (contexto {tokens['context']}, documento {tokens['document']}, "
+          f"instrucción {tokens['instruction']}; descartados {sections.dropped})")
+    return tokens
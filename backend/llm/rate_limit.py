@@ -0,0 +1,244 @@
+import os
+import re
+import json
+import time
+import threading
+from collections import deque
+from typing import Dict, Optional, Mapping
+from dotenv import load_dotenv
+from backend.llm.errors import RateLimitError, RequestCancelledError
+
+load_dotenv()
+
+# Presupuesto por modelo (por defecto, el de la capa gratuita de Groq).
+# LLM_RATE_LIMITS permite fijarlo por modelo: {"llama-3.3-70b-versatile": {"rpm": 30, "tpm": 12000}}
+LLM_DEFAULT_RPM = float(os.getenv("LLM_DEFAULT_RPM", "30"))
+LLM_DEFAULT_TPM = float(os.getenv("LLM_DEFAULT_TPM", "6000"))
+LLM_QUEUE_TIMEOUT_S = float(os.getenv("LLM_QUEUE_TIMEOUT_S", "60"))
+
+
+def _load_model_limits() -> Dict[str, Dict[str, float]]:
+    raw = os.getenv("LLM_RATE_LIMITS")
+    if not raw:
+        return {}
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError as e:
+        print(f"⚠️ LLM_RATE_LIMITS no es JSON válido, se ignora: {e}")
+        return {}
+
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_duration_s(value: Optional[str]) -> Optional[float]:
+    """
+    Convierte las duraciones de las cabeceras de Groq a segundos:
+    "7.66s", "2m59.56s", "120ms", "1h2m" o un número de segundos ("retry-after: 2").
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    factors = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(amount) * factors[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+    """Cubo de tokens: capacidad máxima y recarga continua a `refill_per_s`."""
+
+    def __init__(self, capacity: float, refill_per_s: float):
+        self.capacity = capacity
+        self.refill_per_s = refill_per_s
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_s)
+        self.updated = now
+
+    def wait_for(self, amount: float) -> float:
+        """Segundos hasta que haya `amount` tokens (0 si ya los hay)."""
+        # Una petición más grande que el cubo entero se deja pasar con el cubo lleno
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_per_s if self.refill_per_s > 0 else float("inf")
+
+
+class ModelBudget:
+    """
+    Presupuesto de un modelo: un cubo de peticiones (RPM) y otro de tokens (TPM).
+
+    Las peticiones esperan en cola (FIFO) hasta que ambos cubos tienen saldo; así se trabaja
+    justo en el límite del proveedor en lugar de superarlo y recibir 429.
+    Las cabeceras x-ratelimit-* y retry-after de cada respuesta corrigen el estado local.
+    """
+
+    def __init__(self, model: str, rpm: float, tpm: float):
+        self.model = model
+        self.requests = TokenBucket(rpm, rpm / 60)
+        self.tokens = TokenBucket(tpm, tpm / 60)
+        self.blocked_until = 0.0
+        self._cond = threading.Condition()
+        self._queue = deque()
+
+    def acquire(self, estimated_tokens: int, timeout_s: float = LLM_QUEUE_TIMEOUT_S,
+                cancel: Optional[threading.Event] = None) -> float:
+        """
+        Reserva una petición y `estimated_tokens` tokens, esperando en cola si hace falta.
+        Devuelve los segundos esperados.
+        - cancel: si se activa mientras espera, sale de la cola sin reservar nada
+
+        Raises:
+            RateLimitError: si la espera superaría timeout_s
+            RequestCancelledError: si se activa `cancel`
+        """
+        start = time.monotonic()
+        deadline = start + timeout_s
+        ticket = object()
+        with self._cond:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    if cancel is not None and cancel.is_set():
+                        raise RequestCancelledError(f"Petición a {self.model} abandonada en cola", model=self.model)
+                    now = time.monotonic()
+                    wait = self.blocked_until - now
+                    if self._queue[0] is ticket:
+                        self.requests.refill(now)
+                        self.tokens.refill(now)
+                        wait = max(wait, self.requests.wait_for(1), self.tokens.wait_for(estimated_tokens))
+                        if wait <= 0:
+                            self.requests.tokens -= 1
+                            self.tokens.tokens -= min(estimated_tokens, self.tokens.capacity)
+                            return now - start
+                    else:
+                        # No es el primero de la cola: se despierta cuando avance
+                        wait = max(wait, 0.05)
+                    if now + wait > deadline:
+                        raise RateLimitError(
+                            f"❌ Límite de {self.model} agotado: la espera en cola superaría {timeout_s:.0f}s",
+                            model=self.model,
+                            retry_after_s=round(wait, 2),
+                            status_code=None
+                        )
+                    # cancel no despierta la condición: con cancelación posible se revisa cada 100 ms
+                    self._cond.wait(timeout=min(wait, 0.1) if cancel is not None else wait)
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+
+    def expected_wait_s(self, estimated_tokens: int) -> float:
+        """
+        Estimación (sin reservar nada) de cuánto esperaría ahora una petición nueva,
+        contando las que ya están en cola. Sirve para decidir si desviarla a otro backend.
+        """
+        with self._cond:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            ahead = len(self._queue) + 1
+            return max(0.0, self.blocked_until - now,
+                       self.requests.wait_for(ahead), self.tokens.wait_for(estimated_tokens * ahead))
+
+    def release(self, estimated_tokens: int):
+        """Devuelve una reserva que no llegó a enviarse (la petición y sus tokens)."""
+        with self._cond:
+            self.requests.tokens = min(self.requests.capacity, self.requests.tokens + 1)
+            self.tokens.tokens = min(self.tokens.capacity, self.tokens.tokens + estimated_tokens)
+            self._cond.notify_all()
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Ajusta el cubo de tokens con el consumo real (campo `usage` de la respuesta)."""
+        if actual_tokens is None:
+            return
+        with self._cond:
+            self.tokens.tokens = min(self.tokens.capacity, self.tokens.tokens + estimated_tokens - actual_tokens)
+            self._cond.notify_all()
+
+    def block_for(self, seconds: float):
+        """Bloquea nuevas peticiones durante `seconds` (retry-after o reset de una cabecera)."""
+        with self._cond:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """
+        Sincroniza el presupuesto con las cabeceras de Groq:
+        - x-ratelimit-limit-tokens: TPM del modelo (ajusta la capacidad del cubo de tokens)
+        - x-ratelimit-remaining-tokens / -requests: saldo real en el proveedor
+        - x-ratelimit-reset-tokens / -requests: cuándo se recupera el saldo si está a 0
+        """
+        limit_tokens = _as_float(headers.get("x-ratelimit-limit-tokens"))
+        remaining_tokens = _as_float(headers.get("x-ratelimit-remaining-tokens"))
+        remaining_requests = _as_float(headers.get("x-ratelimit-remaining-requests"))
+        with self._cond:
+            now = time.monotonic()
+            self.tokens.refill(now)
+            if limit_tokens:
+                self.tokens.capacity = limit_tokens
+                self.tokens.refill_per_s = limit_tokens / 60
+            if remaining_tokens is not None:
+                self.tokens.tokens = min(self.tokens.tokens, remaining_tokens)
+                if remaining_tokens <= 0:
+                    reset = parse_duration_s(headers.get("x-ratelimit-reset-tokens"))
+                    if reset:
+                        self.blocked_until = max(self.blocked_until, now + reset)
+            if remaining_requests is not None and remaining_requests <= 0:
+                # El límite de peticiones de Groq es diario: se respeta su reset
+                reset = parse_duration_s(headers.get("x-ratelimit-reset-requests"))
+                if reset:
+                    self.blocked_until = max(self.blocked_until, now + reset)
+            self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._cond:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            return {
+                "requests_available": round(self.requests.tokens, 2),
+                "tokens_available": round(self.tokens.tokens, 1),
+                "queued": len(self._queue),
+                "blocked_for_s": round(max(0.0, self.blocked_until - now), 2),
+            }
+
+
+def _as_float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class RateLimiter:
+    """Registro de presupuestos por modelo, creados la primera vez que se usa cada modelo."""
+
+    def __init__(self, default_rpm: float = LLM_DEFAULT_RPM, default_tpm: float = LLM_DEFAULT_TPM):
+        self.default_rpm = default_rpm
+        self.default_tpm = default_tpm
+        self.model_limits = _load_model_limits()
+        self._budgets: Dict[str, ModelBudget] = {}
+        self._lock = threading.Lock()
+
+    def budget(self, model: str) -> ModelBudget:
+        budget = self._budgets.get(model)
+        if budget is None:
+            with self._lock:
+                budget = self._budgets.get(model)
+                if budget is None:
+                    limits = self.model_limits.get(model, {})
+                    budget = ModelBudget(model, float(limits.get("rpm", self.default_rpm)),
+                                         float(limits.get("tpm", self.default_tpm)))
+                    self._budgets[model] = budget
+        return budget
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {model: budget.snapshot() for model, budget in list(self._budgets.items())}
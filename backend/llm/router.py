@@ -0,0 +1,360 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, Future
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+from dotenv import load_dotenv
+from backend.metrics import track_stage, LLM_ROUTER_EVENTS
+from backend.providers import LazyProvider
+from backend.llm.client import ChatCompletionsClient, estimate_tokens
+from backend.llm.errors import LLMError, APIError, RequestCancelledError, LLMConfigError
+from backend.llm.rate_limit import RateLimiter
+from backend.llm.config import LOCAL_LLM_URL, LOCAL_LLM_MODEL, LOCAL_LLM_API_KEY, backend_enabled, local_llm_configured
+
+load_dotenv()
+
+# Petición duplicada ("hedge"): si el backend principal tarda más que su p95 reciente,
+# se lanza la misma petición al siguiente backend y se queda la primera respuesta.
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_HEDGE_DEFAULT_S = float(os.getenv("LLM_HEDGE_DEFAULT_S", "8"))    # mientras no hay muestras suficientes
+LLM_HEDGE_MIN_S = float(os.getenv("LLM_HEDGE_MIN_S", "0.5"))
+LLM_ROUTER_WINDOW = int(os.getenv("LLM_ROUTER_WINDOW", "50"))         # llamadas recientes por backend
+LLM_ROUTER_MIN_SAMPLES = int(os.getenv("LLM_ROUTER_MIN_SAMPLES", "10"))
+LLM_ROUTER_WORKERS = int(os.getenv("LLM_ROUTER_WORKERS", "16"))
+
+# Backends activos (LLM_BACKENDS) y backend local (LOCAL_LLM_*): ver backend/llm/config.py
+# Desbordamiento: si la espera estimada en la cola de un backend remoto supera estos segundos,
+# la petición va antes al backend local que a ese backend
+LLM_OVERFLOW_WAIT_S = float(os.getenv("LLM_OVERFLOW_WAIT_S", "2"))
+
+# Equivalencias de modelo entre backends: un mismo modelo lógico tiene nombres distintos en cada API.
+# LLM_MODEL_EQUIVALENTS (JSON) amplía o sustituye estas entradas.
+MODEL_EQUIVALENTS: Dict[str, Dict[str, str]] = {
+    "llama-3.3-70b-versatile": {
+        "groq": "llama-3.3-70b-versatile",
+        "openrouter": "meta-llama/llama-3.3-70b-instruct",
+    },
+    "llama3-8b-8192": {
+        "groq": "llama3-8b-8192",
+        "openrouter": "meta-llama/llama-3-8b-instruct",
+    },
+}
+if os.getenv("LLM_MODEL_EQUIVALENTS"):
+    try:
+        MODEL_EQUIVALENTS.update(json.loads(os.getenv("LLM_MODEL_EQUIVALENTS")))
+    except json.JSONDecodeError as e:
+        print(f"⚠️ LLM_MODEL_EQUIVALENTS no es JSON válido, se ignora: {e}")
+
+
+class BackendStats:
+    """
+    Latencias y errores de las últimas llamadas a un backend (ventana deslizante).
+
+    Una llamada abandonada (la perdedora de un hedge) se registra como censurada: su latencia real
+    es al menos la medida, así que cuenta para los percentiles pero no como error.
+    """
+
+    def __init__(self, window: int = LLM_ROUTER_WINDOW):
+        self._calls = deque(maxlen=window)   # (latencia_s, ok, censurada)
+        self._lock = threading.Lock()
+
+    def record(self, latency_s: float, ok: bool, censored: bool = False):
+        with self._lock:
+            self._calls.append((latency_s, ok, censored))
+
+    def _latencies(self) -> List[float]:
+        return sorted(latency for latency, ok, censored in self._calls if ok or censored)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            latencies = self._latencies()
+        if len(latencies) < LLM_ROUTER_MIN_SAMPLES:
+            return None
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+
+    def error_rate(self) -> float:
+        with self._lock:
+            if not self._calls:
+                return 0.0
+            return sum(1 for _, ok, censored in self._calls if not ok and not censored) / len(self._calls)
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        with self._lock:
+            samples = len(self._calls)
+            censored = sum(1 for _, _, is_censored in self._calls if is_censored)
+        return {
+            "samples": samples,
+            "censored": censored,
+            "p50_s": round(p50, 3) if p50 is not None else None,
+            "p95_s": round(p95, 3) if p95 is not None else None,
+            "error_rate": round(self.error_rate(), 3),
+        }
+
+
+class Backend:
+    """Un backend compatible con OpenAI chat completions (Groq, OpenRouter, servidor local...)."""
+
+    def __init__(self, name: str, client: ChatCompletionsClient, default_model: Optional[str] = None,
+                 overflow: bool = False):
+        self.name = name
+        self.client = client
+        self.default_model = default_model
+        # overflow: solo se usa si se pide expresamente, si los remotos están saturados o como último failover
+        self.overflow = overflow
+        self.stats = BackendStats()
+
+    def model_for(self, model: str) -> str:
+        """Nombre del modelo en este backend; sin equivalencia conocida se usa default_model o el mismo nombre."""
+        return MODEL_EQUIVALENTS.get(model, {}).get(self.name) or self.default_model or model
+
+    def score(self) -> float:
+        """Menor es mejor: latencia típica penalizada por la tasa de errores reciente."""
+        p50 = self.stats.percentile(50)
+        latency = p50 if p50 is not None else LLM_HEDGE_DEFAULT_S / 2
+        return latency * (1 + 4 * self.stats.error_rate())
+
+    def hedge_delay_s(self) -> float:
+        p95 = self.stats.percentile(95)
+        return max(LLM_HEDGE_MIN_S, p95 if p95 is not None else LLM_HEDGE_DEFAULT_S)
+
+    def expected_wait_s(self, payload: Dict[str, Any]) -> float:
+        """Espera estimada en la cola de límites de este backend para la petición."""
+        model = self.model_for(payload["model"])
+        return self.client.limiter.budget(model).expected_wait_s(estimate_tokens({**payload, "model": model}))
+
+
+class LLMRouter:
+    """
+    Reparte las llamadas al LLM entre varios backends.
+
+    - Ordena los backends por latencia reciente y tasa de errores.
+    - Llamada completa: si el primero supera su p95, lanza la misma petición al segundo
+      (hedge), devuelve la primera respuesta válida y abandona la otra.
+    - Si un backend falla, pasa al siguiente (failover).
+    - Streaming: sin hedge (duplicaría el texto); failover solo antes del primer fragmento.
+    - Backends de desbordamiento (local): pasan por delante de los remotos cuyo límite está agotado
+      y nunca reciben peticiones duplicadas. `backend_name` fuerza un backend concreto.
+    """
+
+    def __init__(self, backends: List[Backend], hedge_enabled: bool = LLM_HEDGE_ENABLED):
+        if not backends:
+            raise ValueError("❌ El router de LLM necesita al menos un backend")
+        self.backends = backends
+        self.hedge_enabled = hedge_enabled
+        self._executor = ThreadPoolExecutor(max_workers=LLM_ROUTER_WORKERS, thread_name_prefix="llm-router")
+
+    def names(self) -> List[str]:
+        return [backend.name for backend in self.backends]
+
+    def ranked(self, payload: Optional[Dict[str, Any]] = None, backend_name: Optional[str] = None) -> List[Backend]:
+        """
+        Orden en que se prueban los backends para una petición.
+        - backend_name: solo ese backend ("auto" o None: elección automática; ValueError si no está configurado)
+        - remotos con presupuesto disponible, después los de desbordamiento y al final los remotos saturados
+        """
+        if backend_name and backend_name != "auto":
+            selected = [candidate for candidate in self.backends if candidate.name == backend_name]
+            if not selected:
+                raise ValueError(f"❌ Backend de LLM '{backend_name}' no configurado (disponibles: {', '.join(self.names())})")
+            return selected
+        # sorted es estable: a igualdad de puntuación se respeta el orden configurado
+        primary = sorted((candidate for candidate in self.backends if not candidate.overflow),
+                         key=lambda candidate: candidate.score())
+        overflow = [candidate for candidate in self.backends if candidate.overflow]
+        if payload is None or not overflow:
+            return primary + overflow
+        ready = [candidate for candidate in primary if candidate.expected_wait_s(payload) <= LLM_OVERFLOW_WAIT_S]
+        saturated = [candidate for candidate in primary if candidate not in ready]
+        if saturated and not ready:
+            LLM_ROUTER_EVENTS.labels(overflow[0].name, "overflow").inc()
+            print(f"🏠 Límite de {', '.join(c.name for c in saturated)} agotado: la petición va a {overflow[0].name}")
+        return ready + overflow + saturated
+
+    def _call(self, backend: Backend, payload: Dict[str, Any], cancel: threading.Event, sent: Future) -> str:
+        start = time.monotonic()
+
+        def on_send():
+            # Momento del primer envío real (ya fuera de la cola del executor y de la de límites)
+            if not sent.done():
+                sent.set_result(time.monotonic())
+
+        try:
+            with track_stage("llm_backend", label=backend.name):
+                text = backend.client.complete_text({**payload, "model": backend.model_for(payload["model"])},
+                                                    cancel=cancel, on_send=on_send)
+        except RequestCancelledError:
+            # Petición abandonada (perdió el hedge): si llegó a enviarse, su latencia es una cota inferior
+            # de lo lento que iba ese backend y se registra como censurada; sin enviar no dice nada del backend
+            if sent.done():
+                backend.stats.record(time.monotonic() - start, ok=False, censored=True)
+            raise
+        except Exception:
+            backend.stats.record(time.monotonic() - start, ok=False)
+            raise
+        backend.stats.record(time.monotonic() - start, ok=True)
+        return text
+
+    def complete_text(self, payload: Dict[str, Any], backend_name: Optional[str] = None) -> str:
+        candidates = self.ranked(payload, backend_name)
+        pending: Dict[Future, Tuple[Backend, threading.Event]] = {}
+        errors: List[Exception] = []
+        next_index = 0
+        hedged = False
+
+        def launch() -> Tuple[Backend, Future]:
+            nonlocal next_index
+            backend = candidates[next_index]
+            next_index += 1
+            cancel = threading.Event()
+            sent: Future = Future()
+            # Cada llamada lleva una copia del contexto de la petición (cronómetro de etapas)
+            future = self._executor.submit(contextvars.copy_context().run, self._call, backend, payload, cancel, sent)
+            pending[future] = (backend, cancel)
+            return backend, sent
+
+        primary, primary_sent = launch()
+        hedge_delay_s = primary.hedge_delay_s()
+
+        while pending:
+            timeout = None
+            waiting_for = list(pending)
+            can_hedge = (self.hedge_enabled and not hedged and len(pending) == 1
+                         and next_index < len(candidates) and not candidates[next_index].overflow)
+            if can_hedge:
+                # El reloj del hedge empieza cuando la petición sale de verdad: la espera en el executor
+                # o en la cola de límites no cuenta contra el p95 del backend
+                if primary_sent.done():
+                    timeout = max(0.0, primary_sent.result() + hedge_delay_s - time.monotonic())
+                else:
+                    waiting_for.append(primary_sent)
+            done, _ = wait(waiting_for, timeout=timeout, return_when=FIRST_COMPLETED)
+            done = [future for future in done if future in pending]
+
+            if not done:
+                if not (primary_sent.done() and time.monotonic() >= primary_sent.result() + hedge_delay_s):
+                    continue
+                hedged = True
+                backend, _ = launch()
+                LLM_ROUTER_EVENTS.labels(backend.name, "hedge").inc()
+                print(f"⏱️ {primary.name} supera su p95 ({hedge_delay_s:.1f}s): petición duplicada a {backend.name}")
+                continue
+
+            for future in done:
+                backend, _ = pending.pop(future)
+                try:
+                    text = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    print(f"⚠️ Backend de LLM '{backend.name}' falló: {e}")
+                    if not pending and next_index < len(candidates):
+                        # El backend de failover pasa a ser el principal (también para el reloj del hedge)
+                        primary, primary_sent = launch()
+                        hedge_delay_s = primary.hedge_delay_s()
+                        LLM_ROUTER_EVENTS.labels(primary.name, "failover").inc()
+                    continue
+
+                if hedged and backend is not primary:
+                    LLM_ROUTER_EVENTS.labels(backend.name, "hedge_win").inc()
+                for loser, cancel in pending.values():
+                    cancel.set()
+                    LLM_ROUTER_EVENTS.labels(loser.name, "cancelled").inc()
+                return text
+
+        raise _pick_error(errors)
+
+    def stream_text(self, payload: Dict[str, Any], backend_name: Optional[str] = None) -> Iterator[str]:
+        errors: List[Exception] = []
+        for position, backend in enumerate(self.ranked(payload, backend_name)):
+            if position > 0:
+                LLM_ROUTER_EVENTS.labels(backend.name, "failover").inc()
+            start = time.monotonic()
+            started = False
+            try:
+                with track_stage("llm_backend", label=backend.name):
+                    for delta in backend.client.stream_text({**payload, "model": backend.model_for(payload["model"])}):
+                        started = True
+                        yield delta
+            except Exception as e:
+                backend.stats.record(time.monotonic() - start, ok=False)
+                if started:
+                    raise
+                errors.append(e)
+                print(f"⚠️ Backend de LLM '{backend.name}' falló antes del primer fragmento: {e}")
+                continue
+            backend.stats.record(time.monotonic() - start, ok=True)
+            return
+        raise _pick_error(errors)
+
+    def status(self) -> List[Dict[str, Any]]:
+        return [
+            {"backend": backend.name, "overflow": backend.overflow, "score": round(backend.score(), 3),
+             **backend.stats.snapshot(),
+             "budgets": backend.client.limiter.snapshot()}
+            for backend in self.ranked()
+        ]
+
+
+def _pick_error(errors: List[Exception]) -> Exception:
+    """Error a propagar cuando fallan todos: el último error tipado, o uno genérico."""
+    for error in reversed(errors):
+        if isinstance(error, LLMError):
+            return error
+    return APIError(f"❌ Todos los backends de LLM fallaron: {errors[-1] if errors else 'sin backends'}")
+
+
+def default_backends() -> List[Backend]:
+    """
+    Backends configurados por entorno, en orden de preferencia inicial:
+    - groq: siempre (GROQ_API_KEY, GROQ_API_URL)
+    - openrouter: si hay OPENROUTER_API_KEY (OPENROUTER_API_URL)
+    - local: si hay LOCAL_LLM_URL (LOCAL_LLM_MODEL); backend de desbordamiento
+    LLM_BACKENDS limita cuáles se activan.
+    """
+    backends = []
+    if backend_enabled("groq"):
+        backends.append(Backend("groq", ChatCompletionsClient(
+            os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions"),
+            {"Authorization": f"Bearer {os.getenv('GROQ_API_KEY')}", "Content-Type": "application/json"},
+            service="groq"
+        )))
+    if os.getenv("OPENROUTER_API_KEY") and backend_enabled("openrouter"):
+        backends.append(Backend("openrouter", ChatCompletionsClient(
+            os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions"),
+            {"Authorization": f"Bearer {os.getenv('OPENROUTER_API_KEY')}", "Content-Type": "application/json"},
+            service="openrouter"
+        )))
+    if local_llm_configured():
+        # Sin cuota del proveedor: la concurrencia la limita el pool HTTP del servicio "local" (HTTP_POOL_LOCAL)
+        backends.append(Backend("local", ChatCompletionsClient(
+            LOCAL_LLM_URL.rstrip("/") + "/chat/completions",
+            {"Authorization": f"Bearer {LOCAL_LLM_API_KEY}", "Content-Type": "application/json"},
+            service="local",
+            limiter=RateLimiter(default_rpm=float(os.getenv("LOCAL_LLM_RPM", "600")),
+                                default_tpm=float(os.getenv("LOCAL_LLM_TPM", "1000000")))
+        ), default_model=LOCAL_LLM_MODEL, overflow=True))
+    return backends
+
+
+def _build_router() -> LLMRouter:
+    try:
+        return LLMRouter(default_backends())
+    except ValueError as e:
+        raise LLMConfigError(f"{e} (revisa LLM_BACKENDS, GROQ_API_KEY, OPENROUTER_API_KEY y LOCAL_LLM_URL)") from None
+
+
+# Router compartido por todo el proceso (las estadísticas y presupuestos son por backend).
+# Se crea en la primera llamada: un error de configuración no impide arrancar la API,
+# se ve en /readyz y en cada petición que necesita el LLM (503).
+llm_router_provider = LazyProvider("llm_router", _build_router, required=False)
+
+
+def get_llm_router() -> LLMRouter:
+    """
+    Raises:
+        LLMConfigError: si la configuración no deja ningún backend
+    """
+    return llm_router_provider.get()
@@ -0,0 +1,125 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple, Dict, Any, Callable, Hashable
+import numpy as np
+from dotenv import load_dotenv
+from backend.metrics import SEMANTIC_CACHE_LOOKUPS, SEMANTIC_CACHE_SIMILARITY
+
+load_dotenv()
+
+# Caché semántica de textos generados: peticiones casi idénticas (un espacio de más en el tema,
+# una audiencia redactada de otra forma...) reutilizan el texto ya generado en vez de llamar al LLM.
+# Opt-in, como la caché de respuestas: solo se consulta si está activa y la petición usa cache: "prefer".
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))  # similitud coseno mínima
+SEMANTIC_CACHE_TTL_S = int(os.getenv("SEMANTIC_CACHE_TTL_S", "3600"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+
+
+def _default_embed(text: str) -> np.ndarray:
+    # Import diferido: el modelo compartido solo se carga si la caché llega a usarse
+    from backend.model_registry import get_sentence_transformer
+    return np.asarray(get_sentence_transformer().encode(text, normalize_embeddings=True), dtype=np.float32)
+
+
+class _Entry:
+    __slots__ = ("partition", "embedding", "value", "expires_at")
+
+    def __init__(self, partition: Hashable, embedding: np.ndarray, value: Any, expires_at: float):
+        self.partition = partition
+        self.embedding = embedding
+        self.value = value
+        self.expires_at = expires_at
+
+
+class SemanticCache:
+    """
+    Caché por similitud de embeddings (MiniLM normalizado → producto escalar = coseno).
+
+    - partition: claves que deben coincidir exactamente (modelo, idioma, plataforma, tono...);
+      solo se compara contra entradas de la misma partición.
+    - Caducidad por entrada (TTL) y tamaño máximo global con expulsión LRU.
+    """
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD, ttl_s: int = SEMANTIC_CACHE_TTL_S,
+                 max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+                 embed_fn: Callable[[str], np.ndarray] = _default_embed):
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.embed_fn = embed_fn
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._partitions: Dict[Hashable, set] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.embed_fn(text)
+
+    def lookup(self, partition: Hashable, text: str,
+               embedding: Optional[np.ndarray] = None) -> Tuple[Optional[Any], np.ndarray]:
+        """
+        Busca una entrada similar en la partición.
+        Devuelve (valor o None, embedding del texto) para reutilizar el embedding en store().
+        """
+        if embedding is None:
+            embedding = self.embed(text)
+        now = time.time()
+        with self._lock:
+            ids = [entry_id for entry_id in list(self._partitions.get(partition, ())) if self._alive(entry_id, now)]
+            if not ids:
+                SEMANTIC_CACHE_LOOKUPS.labels("miss").inc()
+                return None, embedding
+            similarities = np.stack([self._entries[entry_id].embedding for entry_id in ids]) @ embedding
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            SEMANTIC_CACHE_SIMILARITY.observe(similarity)
+            if similarity < self.threshold:
+                SEMANTIC_CACHE_LOOKUPS.labels("miss").inc()
+                return None, embedding
+            self._entries.move_to_end(ids[best])
+            SEMANTIC_CACHE_LOOKUPS.labels("hit").inc()
+            return self._entries[ids[best]].value, embedding
+
+    def store(self, partition: Hashable, text: str, value: Any, embedding: Optional[np.ndarray] = None):
+        if embedding is None:
+            embedding = self.embed(text)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(partition, embedding, value, time.time() + self.ttl_s)
+            self._partitions.setdefault(partition, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                oldest_id, _ = next(iter(self._entries.items()))
+                self._remove(oldest_id)
+
+    def _alive(self, entry_id: int, now: float) -> bool:
+        """Comprueba la caducidad (con el lock tomado) y borra la entrada si ha expirado."""
+        if self._entries[entry_id].expires_at >= now:
+            return True
+        self._remove(entry_id)
+        return False
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        ids = self._partitions.get(entry.partition)
+        if ids is not None:
+            ids.discard(entry_id)
+            if not ids:
+                del self._partitions[entry.partition]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "partitions": len(self._partitions),
+                "threshold": self.threshold,
+                "ttl_s": self.ttl_s,
+                "max_entries": self.max_entries,
+            }
+
+
+# Caché compartida por el proceso (cada worker de uvicorn tiene la suya)
+semantic_cache = SemanticCache()
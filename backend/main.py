@@ -1,22 +1,34 @@
 import os
-from pathlib import Path
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from .generate_with_rag import generate_text_with_context
-from .image_generator import generate_image_url
+from .content_pipeline import create_post_image, persist_post, stream_generation
+from .batch_generator import generate_batch
+from .image_jobs import submit_image_job, get_image_job, image_queue_full, ImageQueueFullError
+from .response_cache import response_cache, RESPONSE_CACHE_DEFAULT
 from backend.financial.models import FinancialNewsRequest
 from backend.financial.financial_service import generate_financial_news
-from backend.vector_db.db_manager import save_post, search_similar, ingest_document
-from fastapi import Body
+from backend.database.repository import get_recent_posts as get_recent_posts_page
+from backend.vector_db.db_manager import (
+    search_similar_async, search_filtered, hybrid_search, metadata_filter, ingest_document, SEARCH_MODE
+)
+from fastapi.concurrency import run_in_threadpool
 from backend.cience_data.arxiv import search_arxiv, download_and_extract, ingest_arxiv_documents, create_arxiv_rag_chain
 from backend.vector_db.document_reader import extract_text_from_file
-from backend.database.supabase_logger import log_post_to_supabase
-from backend.database.storage import upload_image_to_supabase
 from backend.database.storage import upload_document_to_supabase
-from backend.database.supabase_logger import log_post_to_supabase
-from backend.database.storage import upload_image_to_supabase
+from backend.side_effects import dispatch_side_effects
+from backend.uploads import save_upload_to_temp, UploadTooLargeError, UPLOAD_MAX_BYTES
+from backend.providers import start_warm_up_in_background, readiness, WARMUP_ON_STARTUP
+from backend.metrics import render_metrics
+from backend.timing import start_timer, current_timings, stage
+from backend.llm.errors import LLMError, RateLimitError, LLMTimeoutError, LLMConfigError
+from backend.llm.router import get_llm_router
+from backend.llm.semantic_cache import semantic_cache
+from backend.llm.generation_profiles import profile_store
+from fastapi.responses import JSONResponse, Response
 
 app = FastAPI()
 
@@ -29,6 +41,57 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Rechazo temprano de subidas demasiado grandes, antes de leer el cuerpo multipart
+UPLOAD_PATHS = {"/upload_document", "/upload_document/stream", "/index_document"}
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    if request.method == "POST" and request.url.path in UPLOAD_PATHS:
+        content_length = request.headers.get("content-length")
+        # Margen de 1 MB para las cabeceras y campos del formulario multipart
+        if content_length and content_length.isdigit() and int(content_length) > UPLOAD_MAX_BYTES + 1024 * 1024:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"❌ El fichero supera el tamaño máximo de {UPLOAD_MAX_BYTES} bytes"}
+            )
+    return await call_next(request)
+
+# Desglose de tiempos por etapa en la cabecera Server-Timing de cada respuesta.
+# En SSE las cabeceras salen antes de que se ejecute el pipeline: ahí no se añade y
+# los tiempos van en el campo `timings` del evento final "done".
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    timer = start_timer()
+    response = await call_next(request)
+    if not response.headers.get("content-type", "").startswith("text/event-stream"):
+        response.headers["Server-Timing"] = timer.as_header()
+        response.headers["Timing-Allow-Origin"] = "*"
+    return response
+
+# Errores del LLM: nunca se devuelven como texto del post
+# - RateLimitError → 429 (con Retry-After si se conoce)
+# - LLMTimeoutError → 504
+# - LLMConfigError → 503 (ningún backend configurado; el resto de endpoints sigue funcionando)
+# - resto (APIError, ResponseParseError) → 502
+@app.exception_handler(LLMError)
+async def llm_error_handler(request: Request, exc: LLMError):
+    headers = {}
+    if isinstance(exc, RateLimitError):
+        status_code = 429
+        if exc.retry_after_s:
+            headers["Retry-After"] = str(max(1, round(exc.retry_after_s)))
+    elif isinstance(exc, LLMTimeoutError):
+        status_code = 504
+    elif isinstance(exc, LLMConfigError):
+        status_code = 503
+    else:
+        status_code = 502
+    return JSONResponse(
+        status_code=status_code,
+        content={"detail": str(exc), "error_type": type(exc).__name__, "model": exc.model},
+        headers=headers
+    )
+
 # Modelos
 class ContentRequest(BaseModel):
     topic: str
@@ -41,15 +104,33 @@ class ContentRequest(BaseModel):
     audience: Optional[str] = None
     img_model: Optional[str] = "remote:all"
     generate_image: bool = True
+    image_async: bool = False
+    cache: Optional[Literal["bypass", "prefer"]] = None
+    include_timings: bool = False
+    llm_backend: Optional[str] = None   # "groq", "openrouter", "local" o "auto" (por defecto)
+
+class BatchContentRequest(BaseModel):
+    items: List[ContentRequest]
+    llm_concurrency: Optional[int] = None
+    image_concurrency: Optional[int] = None
 
 class SearchRequest(BaseModel):
     query: str
     top_k: Optional[int] = 3
+    # Filtros de metadatos (se resuelven en Pinecone)
+    company: Optional[str] = None
+    language: Optional[str] = None
+    platform: Optional[str] = None
+    source_type: Optional[List[Literal["post", "document", "arxiv"]]] = None
+    # "hybrid": Pinecone + índice léxico BM25 fusionados; "dense": solo Pinecone (por defecto SEARCH_MODE)
+    mode: Optional[Literal["hybrid", "dense"]] = None
 
 class SearchResult(BaseModel):
     text: str
     metadata: Dict[str, Any]
-    similarity_score: float
+    similarity_score: Optional[float] = None   # None si el fragmento solo lo encontró la búsqueda léxica
+    lexical_score: Optional[float] = None
+    hybrid_score: Optional[float] = None
 
 class ArxivIngestRequest(BaseModel):
     topic: str
@@ -58,21 +139,76 @@ class ArxivIngestRequest(BaseModel):
 class ArxivQueryRequest(BaseModel):
     question: str
 
+@app.on_event("startup")
+def start_warm_up():
+    # El calentamiento corre en segundo plano: /healthz responde ya y /readyz pasa a 200 al terminar
+    if WARMUP_ON_STARTUP:
+        start_warm_up_in_background()
+
 @app.get("/")
 def read_root():
     return {"message": "✅ API en funcionamiento"}
 
+@app.get("/healthz")
+def healthz():
+    """Liveness: el proceso responde (no comprueba modelos ni conexiones)."""
+    return {"status": "ok"}
+
+@app.get("/metrics")
+def metrics():
+    """Métricas Prometheus de todas las etapas del pipeline."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/readyz")
+def readyz():
+    """
+    Readiness: 200 cuando los modelos y conexiones necesarios ya están inicializados.
+    Si aún no lo están, la sonda lanza el calentamiento en segundo plano (si no hay uno en curso).
+    """
+    status = readiness()
+    if not status["ready"]:
+        start_warm_up_in_background()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+def _check_llm_backend(llm_backend: Optional[str]):
+    """400 si la petición pide un backend de LLM que no está configurado."""
+    if llm_backend and llm_backend != "auto" and llm_backend not in get_llm_router().names():
+        raise HTTPException(
+            status_code=400,
+            detail=f"Backend de LLM no disponible: {llm_backend} (configurados: {', '.join(get_llm_router().names())})"
+        )
+
 @app.post("/generate")
 def generate_content(data: ContentRequest):
     """
     1️⃣ Genera el texto y el prompt usado.
     2️⃣ (Opcional) Genera imagen usando el texto generado como prompt.
-    3️⃣ Guarda todo en la base vectorial.
+    3️⃣ Lanza en segundo plano el guardado en la base vectorial y en Supabase.
     4️⃣ Devuelve los resultados al frontend.
     """
+    _check_llm_backend(data.llm_backend)
+    # Con la cola de imágenes llena se rechaza antes de gastar la llamada al LLM
+    if data.generate_image and data.image_async and image_queue_full():
+        raise HTTPException(status_code=503, detail="❌ Cola de imágenes llena, inténtalo más tarde",
+                            headers={"Retry-After": "10"})
     # Fallback: si no se proporciona model_research, usa el mismo que model_writer
     model_research = data.model_research or data.model_writer
 
+    # 0️⃣ Caché de respuestas (opt-in): peticiones idénticas devuelven el resultado ya generado
+    use_cache = (data.cache or RESPONSE_CACHE_DEFAULT) == "prefer" and not data.image_async
+    cache_key = None
+    if use_cache:
+        cache_key = response_cache.make_key(data.dict())
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            result = {**cached, "cached": True}
+            if data.include_timings:
+                result["timings"] = current_timings()
+            return result
+    else:
+        response_cache.record_bypass()
+
     # 1️⃣ Generar texto y prompt real
     text, prompt_used = generate_text_with_context(
         topic=data.topic,
@@ -82,41 +218,12 @@ def generate_content(data: ContentRequest):
         language=data.language,
         model_writer=data.model_writer,
         model_research=model_research,
-        audience=data.audience
-    )
-
-        # 2️⃣ (Opcional) Generar imagen
-    image_url = None
-    if data.generate_image:
-        image_path = generate_image_url(text, data.img_model)
-        if image_path and os.path.exists(image_path):
-            uploaded_url = upload_image_to_supabase(image_path)
-            if uploaded_url and uploaded_url.startswith("http"):
-                image_url = uploaded_url
-                try:
-                    os.remove(image_path)
-                except Exception as del_err:
-                    print(f"⚠️ No se pudo eliminar imagen local: {del_err}")
-            else:
-                print("⚠️ La imagen no se subió correctamente")
-        else:
-            print("⚠️ No se generó imagen válida")
-
-    save_post(
-        text=text,
-        prompt=prompt_used,
-        platform=data.platform,
-        tone=data.tone,
-        company=data.company,
-        language=data.language,
         audience=data.audience,
-        model=data.model_writer,
-        image_url=image_url
+        use_cache=(data.cache or RESPONSE_CACHE_DEFAULT) == "prefer",
+        llm_backend=data.llm_backend
     )
 
-    # 4️⃣ Devolver resultado
-    # 5️⃣ Guardar en Supabase (relacional)
-    log_post_to_supabase({
+    record = {
         "prompt": prompt_used,
         "text": text,
         "platform": data.platform,
@@ -125,17 +232,121 @@ def generate_content(data: ContentRequest):
         "language": data.language,
         "audience": data.audience,
         "model": data.model_writer,
-        "image_url": image_url
-    })
+        "image_url": None
+    }
 
-    # 6️⃣ Devolver al frontend
-    return {
+    # 2️⃣ (Opcional) Generar imagen en segundo plano: se devuelve el id del trabajo
+    # y el post se guarda cuando la imagen está lista (consultar /jobs/{job_id})
+    if data.generate_image and data.image_async:
+        def _persist_with_image(image_url):
+            persist_post({**record, "image_url": image_url})
+
+        try:
+            job_id = submit_image_job(text, data.img_model, on_complete=_persist_with_image)
+        except ImageQueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+        result = {
+            "text": text,
+            "image_url": None,
+            "image_job_id": job_id
+        }
+        if data.include_timings:
+            result["timings"] = current_timings()
+        return result
+
+    # 2️⃣ (Opcional) Generar imagen
+    # La subida a Supabase se queda en el camino crítico: la URL pública forma parte de la respuesta
+    image_url = None
+    if data.generate_image:
+        image_url = create_post_image(text, data.img_model)
+
+    # 3️⃣ Guardar en Pinecone y en Supabase (relacional) en paralelo, fuera del camino crítico
+    persist_post({**record, "image_url": image_url})
+
+    # 4️⃣ Devolver al frontend
+    result = {
         "text": text,
         "image_url": image_url
     }
+    if cache_key is not None:
+        response_cache.set(cache_key, result)
+    if data.include_timings:
+        result = {**result, "timings": current_timings()}
+    return result
+
+@app.post("/generate/stream")
+def generate_content_stream(data: ContentRequest):
+    """
+    Igual que /generate pero en modo Server-Sent Events: el texto se envía
+    token a token según lo genera Groq, junto con eventos de cada etapa.
+    """
+    _check_llm_backend(data.llm_backend)
+    return StreamingResponse(
+        stream_generation(
+            topic=data.topic,
+            platform=data.platform,
+            tone=data.tone,
+            company=data.company,
+            language=data.language,
+            model_writer=data.model_writer,
+            model_research=data.model_research or data.model_writer,
+            audience=data.audience,
+            img_model=data.img_model,
+            generate_image=data.generate_image,
+            use_cache=(data.cache or RESPONSE_CACHE_DEFAULT) == "prefer",
+            llm_backend=data.llm_backend
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/generate/batch")
+def generate_content_batch(data: BatchContentRequest):
+    """
+    Genera varios contenidos en una sola llamada (p. ej. 5 plataformas × 4 idiomas).
+    Los elementos con el mismo tema y empresa comparten la investigación en Pinecone,
+    y las llamadas al LLM y de imagen se lanzan en paralelo con un límite configurable.
+    """
+    for item in data.items:
+        _check_llm_backend(item.llm_backend)
+    try:
+        return generate_batch(
+            data.items,
+            llm_concurrency=data.llm_concurrency,
+            image_concurrency=data.image_concurrency
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/jobs/{job_id}")
+def get_job_status(job_id: str, wait: float = 0):
+    """
+    Estado de un trabajo de imagen lanzado con `image_async`.
+    - wait: segundos que se espera a que termine antes de responder (long polling, máx. 30)
+    """
+    job = get_image_job(job_id, wait_s=min(max(wait, 0), 30))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Trabajo no encontrado: {job_id}")
+    return job
+
+@app.get("/llm/status")
+def get_llm_status():
+    """Backends de LLM en orden de preferencia actual, con latencias, errores y presupuesto restante."""
+    return {"backends": get_llm_router().status()}
+
+@app.get("/generation/profiles")
+def get_generation_profiles():
+    """Perfiles de generación por plataforma tal como se aplican ahora (GENERATION_PROFILES_PATH)."""
+    return {"path": profile_store.path, "profiles": profile_store.all()}
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    """Contadores de la caché de respuestas de /generate y estado de la caché semántica de textos."""
+    return {"response_cache": response_cache.stats(), "semantic_cache": semantic_cache.stats()}
 
 @app.post("/financial-news")
 def financial_news_endpoint(data: FinancialNewsRequest):
+    _check_llm_backend(data.llm_backend)
     return generate_financial_news(data)
 
 @app.get("/financial-news")
@@ -144,9 +355,29 @@ def get_financial_news_endpoint(limit: int = 10):
     return get_recent_financial_news(limit)
 
 @app.post("/search")
-def search_content(data: SearchRequest):
-    results = search_similar(data.query, top_k=data.top_k)
-    output: List[SearchResult] = [
+async def search_content(data: SearchRequest):
+    filters = metadata_filter(company=data.company, language=data.language, platform=data.platform,
+                              source_type=data.source_type)
+    stats = None
+    if (data.mode or SEARCH_MODE) == "hybrid":
+        fused, stats = await run_in_threadpool(hybrid_search, data.query, data.top_k, filters)
+        output: List[SearchResult] = [
+            SearchResult(
+                text=doc.page_content,
+                metadata=doc.metadata,
+                similarity_score=round(scores["similarity_score"], 3) if scores["similarity_score"] is not None else None,
+                lexical_score=round(scores["lexical_score"], 3) if scores["lexical_score"] is not None else None,
+                hybrid_score=round(rrf_score, 4)
+            )
+            for doc, rrf_score, scores in fused
+        ]
+        return {"results": output, "stats": stats}
+
+    if filters:
+        results, stats = await run_in_threadpool(search_filtered, data.query, data.top_k, filters)
+    else:
+        results = await search_similar_async(data.query, top_k=data.top_k)
+    output = [
         SearchResult(
             text=doc.page_content,
             metadata=doc.metadata,
@@ -154,30 +385,45 @@ def search_content(data: SearchRequest):
         )
         for doc, score in results
     ]
+    if stats is not None:
+        return {"results": output, "stats": stats}
     return {"results": output}
 
 # ✅ NUEVO ENDPOINT PARA POSTS RECIENTES
 @app.get("/recent-posts")
-def get_recent_posts(limit: int = 10):
+def get_recent_posts(limit: int = 10, cursor: Optional[str] = None):
     """
-    Obtiene los posts más recientes de la base vectorial
+    Obtiene los posts más recientes (por fecha de creación) desde posts_history.
+    - cursor: `next_cursor` de la respuesta anterior para pedir la siguiente página
     """
     try:
-        # Buscar con query general para obtener posts recientes
-        results = search_similar("contenido", top_k=limit)
+        page = get_recent_posts_page(limit=min(max(limit, 1), 100), cursor=cursor)
         output = [
             {
-                "text": doc.page_content,
-                "content": doc.page_content,  # Agregar alias para compatibilidad
-                "metadata": doc.metadata,
-                "similarity_score": round(score, 3)
+                "id": row.get("id"),
+                "text": row.get("generated_text"),
+                "content": row.get("generated_text"),  # Agregar alias para compatibilidad
+                "metadata": {
+                    "created_at": row.get("created_at"),
+                    "prompt": row.get("prompt_input"),
+                    "platform": row.get("platform"),
+                    "tone": row.get("tone"),
+                    "language": row.get("language"),
+                    "audience": row.get("audience"),
+                    "company": row.get("company"),
+                    "model": row.get("model_used"),
+                    "image_url": row.get("image_url"),
+                    "doc_url": row.get("doc_url")
+                }
             }
-            for doc, score in results
+            for row in page["results"]
         ]
-        return {"results": output}
+        return {"results": output, "next_cursor": page["next_cursor"]}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"❌ Error obteniendo posts recientes: {e}")
-        return {"error": str(e), "results": []}
+        return {"error": str(e), "results": [], "next_cursor": None}
 
 @app.post("/upload_document")
 def upload_document(
@@ -189,26 +435,14 @@ def upload_document(
     img_model: str = Form("remote:all"),
     audience: str = Form(None),
     company: str = Form(None),
+    include_timings: bool = Form(False),
+    llm_backend: Optional[str] = Form(None),
     file: Optional[UploadFile] = File(None)
 ):
-    extra_context = ""
+    _check_llm_backend(llm_backend)
+    extra_context, doc_upload, content_hash = _prepare_uploaded_document(file)
     file_url = None
 
-    if file:
-        temp_dir = Path("backend/tmp_docs")
-        temp_dir.mkdir(parents=True, exist_ok=True)
-        temp_path = temp_dir / file.filename
-        with open(temp_path, "wb") as f_out:
-            f_out.write(file.file.read())
-
-        extra_context = extract_text_from_file(temp_path)
-        ingest_document(temp_path, source_name=file.filename)
-        file_url = upload_document_to_supabase(temp_path)
-
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-
-
     text, prompt_used = generate_text_with_context(
         topic=topic,
         platform=platform,
@@ -219,19 +453,23 @@ def upload_document(
         model_research=model,
         img_model=img_model,
         audience=audience,
-        extra_context=extra_context
+        extra_context=extra_context,
+        llm_backend=llm_backend
     )
 
     image_url = None
     if img_model:
-        image_path = generate_image_url(text, img_model)
-        if image_path and os.path.exists(image_path):
-            uploaded_url = upload_image_to_supabase(image_path)
-            if uploaded_url and uploaded_url.startswith("http"):
-                image_url = uploaded_url
-            os.remove(image_path)
-
-    log_post_to_supabase({
+        image_url = create_post_image(text, img_model)
+
+    # La URL del documento forma parte de la respuesta: se espera a su subida (ya solapada)
+    if doc_upload is not None:
+        try:
+            with stage("document_upload_wait"):
+                file_url = doc_upload.result()
+        except Exception as e:
+            print(f"⚠️ No se pudo subir el documento: {e}")
+
+    persist_post({
         "prompt": prompt_used,
         "text": text,
         "platform": platform,
@@ -242,15 +480,90 @@ def upload_document(
         "model": model,
         "image_url": image_url,
         "doc_url": file_url
-    })
+    }, save_vector=False)
 
     return {
         "text": text,
         "prompt": prompt_used,
         "image": image_url,
-        "doc_url": file_url
+        "doc_url": file_url,
+        "content_hash": content_hash,
+        **({"timings": current_timings()} if include_timings else {})
     }
 
+@app.post("/upload_document/stream")
+def upload_document_stream(
+    topic: str = Form(...),
+    platform: str = Form(...),
+    tone: str = Form(...),
+    language: str = Form(...),
+    model: str = Form(...),
+    img_model: str = Form("remote:all"),
+    audience: str = Form(None),
+    company: str = Form(None),
+    llm_backend: Optional[str] = Form(None),
+    file: Optional[UploadFile] = File(None)
+):
+    """
+    Variante Server-Sent Events de /upload_document.
+    """
+    _check_llm_backend(llm_backend)
+    extra_context, doc_upload, _content_hash = _prepare_uploaded_document(file)
+    return StreamingResponse(
+        stream_generation(
+            topic=topic,
+            platform=platform,
+            tone=tone,
+            company=company,
+            language=language,
+            model_writer=model,
+            model_research=model,
+            audience=audience,
+            img_model=img_model,
+            generate_image=bool(img_model),
+            extra_context=extra_context,
+            doc_upload=doc_upload,
+            save_vector=False,
+            llm_backend=llm_backend
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _prepare_uploaded_document(file: Optional[UploadFile]):
+    """
+    Guarda el documento subido, extrae su texto y lanza en segundo plano su indexación
+    en Pinecone y su subida a Supabase. El fichero temporal se borra cuando ambas terminan.
+
+    Devuelve (texto extraído, future de la subida a Supabase o None, hash SHA-256 o None).
+    """
+    if not file:
+        return "", None, None
+
+    try:
+        temp_path, content_hash, _size = save_upload_to_temp(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    try:
+        with stage("document_extract"):
+            extra_context = extract_text_from_file(temp_path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+    def _remove_temp(_futures):
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    # En Storage se guarda bajo el hash: el mismo contenido ocupa un único objeto
+    storage_name = f"{content_hash[:16]}/{file.filename}"
+    doc_effects = dispatch_side_effects({
+        "ingest_document": lambda: ingest_document(temp_path, source_name=file.filename, content_hash=content_hash),
+        "upload_document_to_supabase": lambda: upload_document_to_supabase(temp_path, storage_name=storage_name)
+    }, on_complete=_remove_temp)
+    return extra_context, doc_effects["upload_document_to_supabase"], content_hash
+
 @app.post("/index_document")
 def index_document(file: UploadFile = File(...)):
     allowed_extensions = {".txt", ".pdf", ".docx", ".md"}
@@ -259,15 +572,14 @@ def index_document(file: UploadFile = File(...)):
     if ext not in allowed_extensions:
         return {"error": f"❌ Tipo de archivo no permitido: {ext}"}
 
-    temp_dir = Path("backend/tmp_docs")
-    temp_dir.mkdir(parents=True, exist_ok=True)
-    temp_path = temp_dir / file.filename
-    with open(temp_path, "wb") as f:
-        f.write(file.file.read())
+    try:
+        temp_path, content_hash, _size = save_upload_to_temp(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     
     try:
-        ingest_document(temp_path, source_name=file.filename)
-        return {"message": f"✅ Documento {file.filename} indexado correctamente."}
+        ingest_document(temp_path, source_name=file.filename, content_hash=content_hash)
+        return {"message": f"✅ Documento {file.filename} indexado correctamente.", "content_hash": content_hash}
     except Exception as e:
         return {"error": f"❌ Error al procesar el archivo: {str(e)}"}
     finally:
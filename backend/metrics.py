@@ -0,0 +1,209 @@
+import os
+import time
+import functools
+from contextlib import contextmanager
+from prometheus_client import Counter, Histogram, Gauge, CollectorRegistry, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import multiprocess
+
+# Métricas Prometheus de cada etapa del pipeline (todo en memoria, sin llamadas de red).
+# Con varios workers de uvicorn, definir PROMETHEUS_MULTIPROC_DIR para agregarlas entre procesos.
+
+# Buckets pensados para etapas de red y LLM (de milisegundos a minutos)
+_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120)
+
+STAGE_LATENCY = Histogram(
+    "magicpost_stage_duration_seconds",
+    "Duración de cada etapa del pipeline",
+    ["stage", "label"],
+    buckets=_LATENCY_BUCKETS
+)
+STAGE_CALLS = Counter(
+    "magicpost_stage_calls_total",
+    "Llamadas a cada etapa del pipeline",
+    ["stage", "label"]
+)
+STAGE_ERRORS = Counter(
+    "magicpost_stage_errors_total",
+    "Errores en cada etapa del pipeline",
+    ["stage", "label"]
+)
+STAGE_IN_FLIGHT = Gauge(
+    "magicpost_stage_in_flight",
+    "Llamadas en curso en cada etapa del pipeline",
+    ["stage"],
+    multiprocess_mode="livesum"
+)
+IMAGE_PROVIDER_ATTEMPTS = Counter(
+    "magicpost_image_provider_attempts_total",
+    "Intentos por proveedor de imagen (incluye saltos de fallback)",
+    ["provider", "outcome"]
+)
+IMAGE_FALLBACK_HOPS = Counter(
+    "magicpost_image_fallback_hops_total",
+    "Saltos de fallback en remote:all, por proveedor al que se salta",
+    ["provider"]
+)
+INGESTED_CHUNKS = Counter(
+    "magicpost_ingested_chunks_total",
+    "Fragmentos indexados en Pinecone",
+    ["source"]
+)
+INGEST_DOCUMENT_CHUNKS = Histogram(
+    "magicpost_ingest_document_chunks",
+    "Fragmentos por documento indexado",
+    ["source"],
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+HTTP_POOL_IN_USE = Gauge(
+    "magicpost_http_pool_in_use",
+    "Conexiones HTTP salientes en uso por servicio",
+    ["service"],
+    multiprocess_mode="livesum"
+)
+HTTP_POOL_WAIT = Histogram(
+    "magicpost_http_pool_wait_seconds",
+    "Espera hasta obtener una conexión libre del pool, por servicio",
+    ["service"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+LLM_QUEUE_WAIT = Histogram(
+    "magicpost_llm_queue_wait_seconds",
+    "Espera en cola hasta tener presupuesto de peticiones/tokens, por modelo",
+    ["model"],
+    buckets=(0.001, 0.01, 0.1, 0.5, 1, 2.5, 5, 10, 20, 40, 60)
+)
+LLM_RETRIES = Counter(
+    "magicpost_llm_retries_total",
+    "Reintentos de llamadas al LLM por modelo y motivo (429, 5xx, timeout, network)",
+    ["model", "reason"]
+)
+LLM_TOKENS = Counter(
+    "magicpost_llm_tokens_total",
+    "Tokens consumidos según el campo usage de la respuesta",
+    ["model", "kind"]
+)
+LLM_ROUTER_EVENTS = Counter(
+    "magicpost_llm_router_events_total",
+    "Eventos del router de LLM por backend: hedge (petición duplicada lanzada), hedge_win, cancelled, failover",
+    ["backend", "event"]
+)
+SEMANTIC_CACHE_LOOKUPS = Counter(
+    "magicpost_semantic_cache_lookups_total",
+    "Consultas a la caché semántica de textos generados (hit / miss / bypass)",
+    ["result"]
+)
+SEMANTIC_CACHE_SIMILARITY = Histogram(
+    "magicpost_semantic_cache_best_similarity",
+    "Mejor similitud encontrada en cada consulta a la caché semántica (para ajustar el umbral)",
+    buckets=(0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.92, 0.94, 0.95, 0.96, 0.97, 0.98, 0.99, 1.0)
+)
+PROMPT_TOKENS = Histogram(
+    "magicpost_prompt_tokens",
+    "Tokens del prompt de redacción por sección (instruction, context, document, total)",
+    ["section"],
+    buckets=(50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+)
+PROMPT_TRIMMED_CHUNKS = Counter(
+    "magicpost_prompt_trimmed_chunks_total",
+    "Fragmentos descartados por no caber en el presupuesto de tokens del prompt",
+    ["section"]
+)
+CONTEXT_COLLAPSED_CHUNKS = Counter(
+    "magicpost_context_collapsed_chunks_total",
+    "Fragmentos de Pinecone descartados del contexto por ser repetidos o casi duplicados de otro ya elegido"
+)
+CONTEXT_TOKENS_SAVED = Counter(
+    "magicpost_context_tokens_saved_total",
+    "Tokens de contexto ahorrados por la selección sin redundancia frente a pegar los primeros resultados"
+)
+HTTP_REQUESTS = Counter(
+    "magicpost_http_requests_total",
+    "Peticiones HTTP salientes por servicio y resultado (código de estado, timeout o error)",
+    ["service", "outcome"]
+)
+RETRIEVAL_CANDIDATES = Counter(
+    "magicpost_retrieval_candidates_total",
+    "Candidatos de búsqueda vectorial: scanned (devueltos por Pinecone) y kept (tras filtros y score mínimo)",
+    ["outcome"]
+)
+RERANK_OUTCOMES = Counter(
+    "magicpost_rerank_outcomes_total",
+    "Resultado de cada reordenación con cross-encoder: reranked, cold, busy, budget_exceeded, error",
+    ["outcome"]
+)
+RERANK_PAIRS = Counter(
+    "magicpost_rerank_pairs_total",
+    "Pares (consulta, fragmento) del reranker servidos desde la caché (hit) o puntuados por el modelo (miss)",
+    ["result"]
+)
+SINGLE_FLIGHT_CALLS = Counter(
+    "magicpost_single_flight_calls_total",
+    "Llamadas agrupadas por single-flight: leader (ejecuta) o follower (reutiliza una en curso)",
+    ["name", "role"]
+)
+SINGLE_FLIGHT_IN_FLIGHT = Gauge(
+    "magicpost_single_flight_in_flight",
+    "Llamadas distintas en curso por single-flight",
+    ["name"],
+    multiprocess_mode="livesum"
+)
+
+
+@contextmanager
+def track_stage(stage: str, label: str = ""):
+    """
+    Mide una etapa: duración, llamadas, errores (excepciones) y llamadas en curso.
+
+    with track_stage("generate_text", label=model):
+        ...
+    """
+    label = label or ""
+    STAGE_CALLS.labels(stage, label).inc()
+    in_flight = STAGE_IN_FLIGHT.labels(stage)
+    in_flight.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(stage, label).inc()
+        raise
+    finally:
+        STAGE_LATENCY.labels(stage, label).observe(time.perf_counter() - start)
+        in_flight.dec()
+
+
+def instrument(stage: str, label: str = "", error_on_falsy: bool = False):
+    """
+    Decorador equivalente a track_stage.
+    - error_on_falsy: cuenta como error un resultado False/None
+      (para funciones que señalan el fallo devolviendo un valor en lugar de lanzar)
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with track_stage(stage, label):
+                result = fn(*args, **kwargs)
+            if error_on_falsy and (result is None or result is False):
+                STAGE_ERRORS.labels(stage, label).inc()
+            return result
+        return wrapper
+    return decorator
+
+
+def record_stage_error(stage: str, label: str = ""):
+    """Cuenta un error de una etapa que no se manifiesta como excepción."""
+    STAGE_ERRORS.labels(stage, label or "").inc()
+
+
+def record_ingested_chunks(source: str, count: int):
+    INGESTED_CHUNKS.labels(source).inc(count)
+    INGEST_DOCUMENT_CHUNKS.labels(source).observe(count)
+
+
+def render_metrics():
+    """Devuelve (cuerpo, content-type) en formato de exposición de Prometheus."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
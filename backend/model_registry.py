@@ -0,0 +1,35 @@
+from langchain_huggingface import HuggingFaceEmbeddings
+from backend.providers import LazyProvider, MODEL_CACHE_DIR
+
+# Registro único de modelos de sentence-transformers: una sola instancia por proceso,
+# compartida por el vector store, la ingesta de arXiv y la extracción de keywords (KeyBERT)
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def _load_keybert():
+    from keybert import KeyBERT
+    # KeyBERT reutiliza el mismo backbone que los embeddings en lugar de cargar otro modelo
+    return KeyBERT(model=get_sentence_transformer())
+
+
+embedding_provider = LazyProvider(
+    "embeddings",
+    lambda: HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME, cache_folder=MODEL_CACHE_DIR)
+)
+keybert_provider = LazyProvider("keybert", _load_keybert, required=False)
+
+
+def get_embedding_model() -> HuggingFaceEmbeddings:
+    """Modelo de embeddings (LangChain) que convierte texto en vectores numéricos."""
+    return embedding_provider.get()
+
+
+def get_sentence_transformer():
+    """SentenceTransformer que hay debajo de get_embedding_model()."""
+    embeddings = get_embedding_model()
+    return getattr(embeddings, "_client", None) or embeddings.client
+
+
+def get_keybert():
+    """Extractor de keywords KeyBERT sobre el modelo compartido."""
+    return keybert_provider.get()
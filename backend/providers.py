@@ -0,0 +1,97 @@
+import os
+import time
+import threading
+from typing import Callable, Dict, Any, Optional, List
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Directorio local donde se cachean los modelos de Hugging Face (vacío = caché por defecto de HF)
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR") or None
+# Si está activo, los proveedores se inicializan al arrancar el worker (en segundo plano)
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+
+
+class LazyProvider:
+    """
+    Crea un recurso pesado (modelo, conexión a Pinecone, cliente...) la primera vez que se pide
+    y lo reutiliza después. Es thread-safe: si varios hilos lo piden a la vez, solo uno lo crea.
+    Si la creación falla, se lanza la excepción y se reintenta en la siguiente llamada.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any], required: bool = True):
+        self.name = name
+        self.factory = factory
+        self.required = required
+        self._instance = None
+        self._lock = threading.Lock()
+        self.load_time_s: Optional[float] = None
+        self.last_error: Optional[str] = None
+        _registry.append(self)
+
+    def get(self):
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    start = time.time()
+                    try:
+                        self._instance = self.factory()
+                    except Exception as e:
+                        self.last_error = str(e)
+                        raise
+                    self.load_time_s = round(time.time() - start, 3)
+                    self.last_error = None
+                    print(f"✅ '{self.name}' inicializado en {self.load_time_s}s")
+        return self._instance
+
+    def is_ready(self) -> bool:
+        return self._instance is not None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.is_ready(),
+            "required": self.required,
+            "load_time_s": self.load_time_s,
+            "error": self.last_error
+        }
+
+
+_registry: List[LazyProvider] = []
+_warm_up_thread: Optional[threading.Thread] = None
+_warm_up_lock = threading.Lock()
+
+
+def warm_up() -> Dict[str, Any]:
+    """
+    Inicializa todos los proveedores registrados. Los errores no interrumpen el resto:
+    el proveedor afectado queda como no listo y se reintentará bajo demanda.
+    """
+    print("🔥 Calentando proveedores...")
+    for provider in list(_registry):
+        try:
+            provider.get()
+        except Exception as e:
+            print(f"⚠️ No se pudo inicializar '{provider.name}': {e}")
+    return readiness()
+
+
+def start_warm_up_in_background() -> bool:
+    """
+    Lanza warm_up en un hilo si no hay uno en curso. Devuelve True si lo ha lanzado.
+    Lo usan el arranque (WARMUP_ON_STARTUP) y /readyz: sin calentamiento al arrancar, la primera
+    sonda de readiness lo inicia, y si algún proveedor falló, la siguiente sonda lo reintenta.
+    """
+    global _warm_up_thread
+    with _warm_up_lock:
+        if _warm_up_thread is not None and _warm_up_thread.is_alive():
+            return False
+        _warm_up_thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+        _warm_up_thread.start()
+        return True
+
+
+def readiness() -> Dict[str, Any]:
+    """Estado de cada proveedor, sin inicializar ninguno."""
+    providers = {provider.name: provider.status() for provider in _registry}
+    ready = all(status["ready"] for status in providers.values() if status["required"])
+    return {"ready": ready, "providers": providers}
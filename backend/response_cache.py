@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuración de la caché de respuestas de /generate (opt-in por petición con `cache: "prefer"`)
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")  # "memory" | "redis"
+RESPONSE_CACHE_REDIS_URL = os.getenv("RESPONSE_CACHE_REDIS_URL", "redis://localhost:6379/0")
+RESPONSE_CACHE_TTL_S = int(os.getenv("RESPONSE_CACHE_TTL_S", "3600"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+RESPONSE_CACHE_DEFAULT = os.getenv("RESPONSE_CACHE_DEFAULT", "bypass")  # modo si la petición no indica nada
+
+# Campos de ContentRequest que determinan la respuesta
+_KEY_FIELDS = ("topic", "platform", "tone", "language", "company", "audience", "model_writer", "model_research", "img_model", "generate_image", "llm_backend")
+
+
+class MemoryCacheBackend:
+    """
+    Backend en proceso: LRU con caducidad por entrada.
+    Cada worker de uvicorn tiene su propia copia.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict[str, Any], ttl_s: int):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl_s, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class RedisCacheBackend:
+    """
+    Backend compartido entre workers/instancias sobre Redis.
+    La caducidad la gestiona Redis (EX); para la expulsión LRU configurar
+    `maxmemory-policy allkeys-lru` en el servidor.
+    """
+
+    def __init__(self, url: str = RESPONSE_CACHE_REDIS_URL, prefix: str = "magicpost:generate:"):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("❌ Para RESPONSE_CACHE_BACKEND=redis hay que instalar el paquete 'redis'")
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = self._client.get(self.prefix + key)
+        return json.loads(raw) if raw else None
+
+    def set(self, key: str, value: Dict[str, Any], ttl_s: int):
+        self._client.set(self.prefix + key, json.dumps(value, ensure_ascii=False), ex=ttl_s)
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return " ".join(value.split()).lower()
+    return value
+
+
+class ResponseCache:
+    """
+    Caché de respuestas completas de /generate, indexada por un hash de la petición normalizada.
+    Cuenta aciertos, fallos y peticiones que la saltan.
+    """
+
+    def __init__(self, backend=None, ttl_s: int = RESPONSE_CACHE_TTL_S):
+        self.backend = backend
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def _get_backend(self):
+        if self.backend is None:
+            self.backend = RedisCacheBackend() if RESPONSE_CACHE_BACKEND == "redis" else MemoryCacheBackend()
+        return self.backend
+
+    def set_backend(self, backend):
+        """Permite enchufar otro backend con la misma interfaz (get / set / size)."""
+        self.backend = backend
+
+    @staticmethod
+    def make_key(request: Dict[str, Any]) -> str:
+        normalized = {field: _normalize(request.get(field)) for field in _KEY_FIELDS}
+        # Sin model_research se usa model_writer, igual que en /generate
+        normalized["model_research"] = normalized["model_research"] or normalized["model_writer"]
+        if not normalized["generate_image"]:
+            normalized["img_model"] = None
+        if normalized["llm_backend"] == "auto":
+            normalized["llm_backend"] = None
+        raw = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            value = self._get_backend().get(key)
+        except Exception as e:
+            self._count("errors")
+            print(f"⚠️ Error leyendo la caché de respuestas: {e}")
+            value = None
+        self._count("hits" if value is not None else "misses")
+        return value
+
+    def set(self, key: str, value: Dict[str, Any]):
+        try:
+            self._get_backend().set(key, value, self.ttl_s)
+        except Exception as e:
+            self._count("errors")
+            print(f"⚠️ Error escribiendo en la caché de respuestas: {e}")
+
+    def record_bypass(self):
+        self._count("bypassed")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        try:
+            size = self._get_backend().size()
+        except Exception:
+            size = None
+        return {
+            "backend": type(self.backend).__name__ if self.backend else RESPONSE_CACHE_BACKEND,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "errors": self.errors,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": size,
+            "ttl_s": self.ttl_s
+        }
+
+
+# Instancia global de la caché
+response_cache = ResponseCache()
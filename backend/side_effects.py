@@ -0,0 +1,89 @@
+import os
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuración de la etapa de efectos secundarios (escrituras posteriores a la generación)
+SIDE_EFFECT_WORKERS = int(os.getenv("SIDE_EFFECT_WORKERS", "4"))
+SIDE_EFFECT_RETRIES = int(os.getenv("SIDE_EFFECT_RETRIES", "2"))
+SIDE_EFFECT_BACKOFF_S = float(os.getenv("SIDE_EFFECT_BACKOFF_S", "0.5"))
+
+# Pool propio: las escrituras no ocupan hilos del threadpool de FastAPI
+_executor = ThreadPoolExecutor(max_workers=SIDE_EFFECT_WORKERS, thread_name_prefix="side-effects")
+
+
+def run_with_retries(name: str, fn: Callable, *args, retries: int = SIDE_EFFECT_RETRIES, **kwargs):
+    """
+    Ejecuta una escritura con reintentos y backoff exponencial.
+
+    Las funciones de persistencia del proyecto señalan el fallo de dos formas:
+    lanzando una excepción (save_post, ingest_document) o devolviendo
+    False/None (log_post_to_supabase, upload_*_to_supabase). Ambas cuentan como fallo.
+
+    Un intento que agota el tiempo puede haber escrito igualmente: las escrituras que se reintentan
+    deben ser idempotentes (save_post e ingest_document usan ids deterministas en Pinecone).
+    """
+    last_error = None
+    for attempt in range(retries + 1):
+        try:
+            result = fn(*args, **kwargs)
+            if result is not False and result is not None:
+                return result
+            last_error = f"{name} devolvió {result!r}"
+        except Exception as e:
+            last_error = str(e)
+
+        if attempt < retries:
+            wait = SIDE_EFFECT_BACKOFF_S * (2 ** attempt)
+            print(f"🔁 Reintentando '{name}' en {wait:.1f}s (intento {attempt + 2}/{retries + 1}): {last_error}")
+            time.sleep(wait)
+
+    print(f"❌ Efecto secundario '{name}' falló tras {retries + 1} intentos: {last_error}")
+    raise RuntimeError(f"{name}: {last_error}")
+
+
+def dispatch_side_effects(
+    tasks: Dict[str, Callable[[], object]],
+    on_complete: Optional[Callable[[Dict[str, Future]], None]] = None
+) -> Dict[str, Future]:
+    """
+    Lanza en paralelo las escrituras posteriores a la generación, sin bloquear la respuesta.
+
+    - tasks: nombre → función sin argumentos (usar lambda / functools.partial)
+    - on_complete: se llama una vez han terminado todas (p. ej. para borrar ficheros temporales)
+
+    Devuelve los futures por nombre; quien necesite el resultado (ids persistidos) puede esperarlos.
+    """
+    # Cada tarea se ejecuta con una copia del contexto de la petición (p. ej. su cronómetro de etapas)
+    futures = {
+        name: _executor.submit(contextvars.copy_context().run, run_with_retries, name, fn)
+        for name, fn in tasks.items()
+    }
+
+    if on_complete is not None and not futures:
+        on_complete(futures)
+    elif on_complete is not None:
+        lock = threading.Lock()
+        pending = set(futures)
+
+        def _done(name):
+            def _callback(_future):
+                with lock:
+                    pending.discard(name)
+                    finished = not pending
+                if finished:
+                    try:
+                        on_complete(futures)
+                    except Exception as e:
+                        print(f"⚠️ Error en el cierre de efectos secundarios: {e}")
+            return _callback
+
+        for name, future in futures.items():
+            future.add_done_callback(_done(name))
+
+    return futures
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, Tuple, Any
+from backend.metrics import SINGLE_FLIGHT_CALLS, SINGLE_FLIGHT_IN_FLIGHT
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas idénticas concurrentes: la primera ("leader") ejecuta la función y
+    las que llegan mientras sigue en curso ("follower") esperan su mismo resultado (o excepción).
+    No es una caché: en cuanto la llamada termina, la siguiente vuelve a ejecutarse.
+
+    Las variantes síncrona (threadpool) y asíncrona comparten el mismo registro,
+    así que una petición async y otra síncrona con la misma clave también se agrupan.
+
+    search_flight = SingleFlight("search_similar")
+    results = search_flight.do(("query", 3), search, "query", 3)
+    results = await search_flight.do_async(("query", 3), search, "query", 3)
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def _claim(self, key: Hashable) -> Tuple[Future, bool]:
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                SINGLE_FLIGHT_CALLS.labels(self.name, "follower").inc()
+                return future, False
+            future = Future()
+            self._in_flight[key] = future
+        SINGLE_FLIGHT_CALLS.labels(self.name, "leader").inc()
+        SINGLE_FLIGHT_IN_FLIGHT.labels(self.name).inc()
+        return future, True
+
+    def _release(self, key: Hashable):
+        with self._lock:
+            self._in_flight.pop(key, None)
+        SINGLE_FLIGHT_IN_FLIGHT.labels(self.name).dec()
+
+    def _run(self, key: Hashable, future: Future, fn: Callable, args, kwargs):
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            # Se libera la clave después de resolver el future: quien llegue ahora ejecuta de nuevo
+            self._release(key)
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        """Variante síncrona (endpoints def, hilos de lotes y efectos secundarios)."""
+        future, leader = self._claim(key)
+        if leader:
+            return self._run(key, future, fn, args, kwargs)
+        return future.result()
+
+    async def do_async(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Variante asíncrona: la función (síncrona) se ejecuta en el executor por defecto del loop
+        y los seguidores esperan con asyncio.wrap_future, sin bloquear el event loop.
+        """
+        future, leader = self._claim(key)
+        if leader:
+            loop = asyncio.get_running_loop()
+            context = contextvars.copy_context()
+            await asyncio.shield(
+                loop.run_in_executor(None, context.run, self._run, key, future, fn, args, kwargs)
+            )
+        return await asyncio.wrap_future(future)
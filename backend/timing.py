@@ -0,0 +1,74 @@
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, List, Tuple
+
+# Cronómetro por petición: el middleware crea uno y las etapas del pipeline van sumando su duración.
+# Se propaga por contextvars, así que funciona igual en endpoints síncronos (threadpool) y asíncronos.
+_current_timer: ContextVar[Optional["StageTimer"]] = ContextVar("stage_timer", default=None)
+
+
+class StageTimer:
+    """Acumula la duración (ms) de cada etapa de una petición, en orden de aparición."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self._stages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, duration_ms: float):
+        with self._lock:
+            self._stages[name] = self._stages.get(name, 0.0) + duration_ms
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def items(self) -> List[Tuple[str, float]]:
+        with self._lock:
+            return list(self._stages.items())
+
+    def as_dict(self) -> Dict[str, float]:
+        timings = {name: round(duration, 1) for name, duration in self.items()}
+        timings["total"] = round(self.total_ms(), 1)
+        return timings
+
+    def as_header(self) -> str:
+        """Valor de la cabecera Server-Timing: `research;dur=12.3, llm;dur=2345.0, total;dur=...`"""
+        parts = [f"{name};dur={duration:.1f}" for name, duration in self.items()]
+        parts.append(f"total;dur={self.total_ms():.1f}")
+        return ", ".join(parts)
+
+
+def start_timer() -> StageTimer:
+    """Crea el cronómetro de la petición actual."""
+    timer = StageTimer()
+    _current_timer.set(timer)
+    return timer
+
+
+def current_timer() -> Optional[StageTimer]:
+    return _current_timer.get()
+
+
+def current_timings() -> Optional[Dict[str, float]]:
+    """Tiempos de la petición actual (para el campo `timings` de la respuesta)."""
+    timer = _current_timer.get()
+    return timer.as_dict() if timer else None
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Mide una etapa y la suma al cronómetro de la petición.
+    Fuera de una petición (scripts, hilos sin contexto) no hace nada.
+    """
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, (time.perf_counter() - start) * 1000)
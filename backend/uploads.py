@@ -0,0 +1,64 @@
+import os
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import Tuple
+from fastapi import UploadFile
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Límites de subida de documentos
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+UPLOAD_TMP_DIR = Path("backend/tmp_docs")
+
+
+class UploadTooLargeError(ValueError):
+    """El fichero supera UPLOAD_MAX_BYTES."""
+    pass
+
+
+def save_upload_to_temp(file: UploadFile, max_bytes: int = UPLOAD_MAX_BYTES) -> Tuple[Path, str, int]:
+    """
+    Copia el fichero subido a un fichero temporal único, por bloques de tamaño fijo,
+    calculando a la vez su hash SHA-256. Nunca carga el documento entero en memoria.
+
+    Se conserva la extensión original (la necesita extract_text_from_file) y el nombre es único,
+    así que subidas concurrentes con el mismo nombre no se pisan.
+
+    Returns:
+        (ruta temporal, hash SHA-256 en hex, tamaño en bytes)
+
+    Raises:
+        UploadTooLargeError: si el fichero supera max_bytes (se borra lo escrito)
+    """
+    # Rechazo temprano si el tamaño ya es conocido
+    declared_size = getattr(file, "size", None)
+    if declared_size is not None and declared_size > max_bytes:
+        raise UploadTooLargeError(f"❌ El fichero supera el tamaño máximo de {max_bytes} bytes")
+
+    UPLOAD_TMP_DIR.mkdir(parents=True, exist_ok=True)
+    suffix = os.path.splitext(file.filename or "")[1].lower()
+    fd, temp_name = tempfile.mkstemp(dir=UPLOAD_TMP_DIR, suffix=suffix)
+    temp_path = Path(temp_name)
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f_out:
+            while True:
+                chunk = file.file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"❌ El fichero supera el tamaño máximo de {max_bytes} bytes")
+                digest.update(chunk)
+                f_out.write(chunk)
+    except Exception:
+        if temp_path.exists():
+            temp_path.unlink()
+        raise
+
+    return temp_path, digest.hexdigest(), size
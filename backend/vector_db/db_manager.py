@@ -1,31 +1,142 @@
 import os
+import json
+import math
+import hashlib
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Any, Union
 from dotenv import load_dotenv
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_pinecone import Pinecone as PineconeVectorStore
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.docstore.document import Document
 from pathlib import Path
 from .document_reader import extract_text_from_file
 from langsmith import traceable
+from backend.providers import LazyProvider
+from backend.model_registry import get_embedding_model
+from backend.metrics import instrument, track_stage, record_ingested_chunks, RETRIEVAL_CANDIDATES
+from backend.timing import stage
+from backend.single_flight import SingleFlight
+from backend.vector_db.lexical_index import lexical_index, index_chunks, LEXICAL_INDEX_ENABLED
+from backend.vector_db.fusion import reciprocal_rank_fusion
 
 
 # Cargamos las variables de entorno
 load_dotenv()
 
-# Inicializamos el modelo de embeddings que convertirá texto en vectores numéricos
-embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-
 # Pinecone index config (debe existir en la nube)
 INDEX_NAME = "generated-posts"   
 API_KEY = os.getenv("PINECONE_API_KEY")
 ENVIRONMENT = os.getenv("PINECONE_ENV")
 
-# Creamos la conexión al vector store de Pinecone usando el modelo de embeddings
-vector_db = PineconeVectorStore.from_existing_index(
-    index_name=INDEX_NAME,
-    embedding=embedding_model
+# Búsqueda con filtros de metadatos:
+# - los filtros se resuelven en Pinecone sobre los campos normalizados (*_norm, source_type)
+# - los vectores antiguos no tienen esos campos: si el filtro nativo no llena top_k, se repite la consulta
+#   sin filtro y se filtra aquí, pidiendo más candidatos cuanto más selectivo ha resultado el filtro
+SEARCH_LEGACY_FALLBACK = os.getenv("SEARCH_LEGACY_FALLBACK", "true").lower() in ("1", "true", "yes")
+SEARCH_MAX_FETCH_K = int(os.getenv("SEARCH_MAX_FETCH_K", "100"))   # candidatos máximos por consulta
+# Búsqueda híbrida (/search): Pinecone + índice léxico BM25 en paralelo, fusionados con RRF
+SEARCH_MODE = os.getenv("SEARCH_MODE", "hybrid").lower()            # "hybrid" o "dense"
+SEARCH_LEXICAL_FETCH_FACTOR = int(os.getenv("SEARCH_LEXICAL_FETCH_FACTOR", "2"))  # candidatos léxicos por top_k
+
+# Campos filtrables: nombre del filtro → campo normalizado en los metadatos de Pinecone
+FILTER_FIELDS = {
+    "company": "company_norm",
+    "language": "language_norm",
+    "platform": "platform_norm",
+    "source_type": "source_type",
+}
+
+# La conexión a Pinecone se crea la primera vez que se usa (o en el calentamiento al arrancar),
+# con el modelo de embeddings compartido del registro de modelos
+vector_db_provider = LazyProvider(
+    "pinecone",
+    lambda: PineconeVectorStore.from_existing_index(index_name=INDEX_NAME, embedding=get_embedding_model())
 )
 
 
+def get_vector_db() -> PineconeVectorStore:
+    """Conexión al vector store de Pinecone usando el modelo de embeddings."""
+    return vector_db_provider.get()
+
+
+def normalize_metadata_value(value: Any) -> Optional[str]:
+    """Valor de metadato comparable: sin espacios repetidos y en minúsculas ("  Ruiz Tech" → "ruiz tech")."""
+    if value is None:
+        return None
+    normalized = " ".join(str(value).split()).lower()
+    return normalized or None
+
+
+def metadata_filter(company: Optional[str] = None, language: Optional[str] = None,
+                    platform: Optional[str] = None,
+                    source_type: Union[str, List[str], None] = None) -> Dict[str, Any]:
+    """
+    Filtros de búsqueda normalizados ({"company": "ruiztech", "source_type": ["post"]}).
+    Los valores vacíos se omiten; source_type admite varios tipos ("post", "document", "arxiv").
+    """
+    filters: Dict[str, Any] = {}
+    for field, value in (("company", company), ("language", language), ("platform", platform)):
+        normalized = normalize_metadata_value(value)
+        if normalized:
+            filters[field] = normalized
+    if source_type:
+        types = [source_type] if isinstance(source_type, str) else list(source_type)
+        types = sorted({normalize_metadata_value(t) for t in types if normalize_metadata_value(t)})
+        if types:
+            filters["source_type"] = types
+    return filters
+
+
+def _pinecone_filter(filters: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Traduce los filtros normalizados a la sintaxis de filtros de metadatos de Pinecone."""
+    if not filters:
+        return None
+    clauses = {}
+    for field, value in filters.items():
+        key = FILTER_FIELDS[field]
+        clauses[key] = {"$in": value} if isinstance(value, list) else {"$eq": value}
+    return clauses
+
+
+def _legacy_source_type(metadata: Dict[str, Any]) -> str:
+    if metadata.get("source_type"):
+        return metadata["source_type"]
+    if "platform" in metadata:
+        return "post"
+    return "arxiv" if "arxiv" in str(metadata.get("source", "")).lower() else "document"
+
+
+def _matches(metadata: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    """Mismo criterio que el filtro de Pinecone, sobre los metadatos originales (vectores sin campos *_norm)."""
+    for field, value in filters.items():
+        actual = _legacy_source_type(metadata) if field == "source_type" else normalize_metadata_value(metadata.get(field))
+        if isinstance(value, list):
+            if actual not in value:
+                return False
+        elif actual != value:
+            return False
+    return True
+
+
+def post_vector_id(text: str, platform=None, company=None, language=None) -> str:
+    """
+    Id determinista del vector de un post (hash del texto y de su plataforma, empresa e idioma).
+    add_texts con ids hace upsert: si la escritura se reintenta tras un timeout que sí llegó a Pinecone,
+    el reintento sobrescribe el mismo vector en lugar de duplicarlo.
+    """
+    key = "\n".join(normalize_metadata_value(value) or "" for value in (platform, company, language))
+    return "post-" + hashlib.sha256(f"{key}\n{text}".encode("utf-8")).hexdigest()
+
+
+def document_vector_ids(content_key: str, count: int) -> List[str]:
+    """Ids deterministas de los fragmentos de un documento: hash del contenido + posición del fragmento."""
+    return [f"doc-{content_key}-{position}" for position in range(count)]
+
+
+@instrument("save_post")
 def save_post(
     text,
     prompt,
@@ -35,9 +146,11 @@ def save_post(
     language=None,
     audience=None,
     model=None,
-    image_url=None
+    image_url=None,
+    created_at=None
 ):
     metadata = {
+        "created_at": created_at,
         "prompt": prompt,
         "platform": platform,
         "company": company,
@@ -45,28 +158,200 @@ def save_post(
         "language": language,
         "audience": audience,
         "model": model,
-        "image_url": image_url
+        "image_url": image_url,
+        # Campos normalizados para filtrar en Pinecone (ver metadata_filter)
+        "source_type": "post",
+        "company_norm": normalize_metadata_value(company),
+        "language_norm": normalize_metadata_value(language),
+        "platform_norm": normalize_metadata_value(platform)
     }
     # Filtra claves con valor None (Pinecone no acepta None)
     metadata_clean = {k: v for k, v in metadata.items() if v is not None}
-    vector_db.add_texts([text], metadatas=[metadata_clean])
+    with stage("pinecone_upsert"):
+        ids = get_vector_db().add_texts([text], metadatas=[metadata_clean],
+                                        ids=[post_vector_id(text, platform, company, language)])
+    index_chunks([(text, metadata_clean)], source="post")
     print("✅ Post guardado en Pinecone con metadatos:", metadata_clean)
+    return ids
+
+
+# Búsquedas idénticas simultáneas (misma consulta normalizada, top_k y filtro) comparten una sola llamada a Pinecone
+search_flight = SingleFlight("search_similar")
+
+
+def _search_key(query, top_k, pinecone_filter=None):
+    return " ".join(str(query).split()), int(top_k), json.dumps(pinecone_filter, sort_keys=True)
+
+
+def _search(query, top_k, pinecone_filter=None, embedding=None):
+    kwargs = {"filter": pinecone_filter} if pinecone_filter else {}
+    if embedding is not None:
+        return get_vector_db().similarity_search_by_vector_with_score(embedding, k=top_k, **kwargs)
+    return get_vector_db().similarity_search_with_score(query, k=top_k, **kwargs)
 
 
-def search_similar(query, top_k=3):
+@instrument("search_similar")
+def search_similar(query, top_k=3, pinecone_filter: Optional[Dict[str, Any]] = None,
+                   embedding: Optional[List[float]] = None):
     """
     Busca los posts más similares semánticamente al query recibido.
+    - pinecone_filter: filtro de metadatos que se aplica en Pinecone (sintaxis de Pinecone)
+    - embedding: vector del query ya calculado (p. ej. en lote con otros queries); si no, se calcula aquí
     Devuelve tuplas (documento, score de similitud).
     """
-    results = vector_db.similarity_search_with_score(query, k=top_k)
-    return results
+    # Copia de la lista: quienes comparten la llamada no deben verse afectados si otro la modifica
+    key = _search_key(query, top_k, pinecone_filter)
+    return list(search_flight.do(key, _search, query, top_k, pinecone_filter, embedding))
+
+
+async def search_similar_async(query, top_k=3, pinecone_filter: Optional[Dict[str, Any]] = None):
+    """Variante para endpoints async: la consulta se ejecuta en el executor sin bloquear el event loop."""
+    with track_stage("search_similar"):
+        key = _search_key(query, top_k, pinecone_filter)
+        return list(await search_flight.do_async(key, _search, query, top_k, pinecone_filter))
+
+
+class _Selectivity:
+    """Fracción de candidatos que pasan cada combinación de filtros (última observada), para dimensionar fetch_k."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._ratios: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[float]:
+        with self._lock:
+            return self._ratios.get(key)
+
+    def update(self, key: str, kept: int, scanned: int):
+        if not scanned:
+            return
+        with self._lock:
+            self._ratios[key] = kept / scanned
+            self._ratios.move_to_end(key)
+            while len(self._ratios) > self.max_entries:
+                self._ratios.popitem(last=False)
+
+
+_selectivity = _Selectivity()
+
+
+def search_filtered(query, top_k: int = 3, filters: Optional[Dict[str, Any]] = None,
+                    min_score: Optional[float] = None,
+                    embedding: Optional[List[float]] = None) -> Tuple[List[Tuple[Any, float]], Dict[str, Any]]:
+    """
+    Búsqueda semántica con filtros de metadatos (ver metadata_filter) resueltos en Pinecone.
+
+    Si el filtro nativo devuelve menos de top_k resultados (vectores indexados antes de los campos
+    normalizados), se completa con consultas sin filtro filtradas aquí: fetch_k parte de la
+    selectividad observada para esos filtros y se duplica hasta llenar top_k o SEARCH_MAX_FETCH_K.
+    - embedding: vector del query ya calculado (investigación ampliada, embeddings en lote)
+
+    Devuelve (resultados, estadísticas): candidatos escaneados, conservados tras filtro y score mínimo,
+    y cómo se resolvió la consulta.
+    """
+    filters = filters or {}
+    stats: Dict[str, Any] = {"filters": filters, "pushed_down": bool(filters), "fallback": False,
+                             "fetch_k": [], "scanned": 0, "kept": 0}
+
+    def passes(score: float) -> bool:
+        return min_score is None or score >= min_score
+
+    with stage("vector_search"):
+        candidates = search_similar(query, top_k=top_k, pinecone_filter=_pinecone_filter(filters), embedding=embedding)
+    stats["fetch_k"].append(top_k)
+    stats["scanned"] += len(candidates)
+    results = [(doc, score) for doc, score in candidates if passes(score)]
+
+    if filters and SEARCH_LEGACY_FALLBACK and len(candidates) < top_k:
+        stats["fallback"] = True
+        signature = json.dumps(filters, sort_keys=True)
+        seen = {(doc.page_content, doc.metadata.get("source")) for doc, _ in candidates}
+        ratio = _selectivity.get(signature)
+        fetch_k = min(SEARCH_MAX_FETCH_K, max(top_k * 2, math.ceil(top_k / ratio) if ratio else top_k * 4))
+        while True:
+            with stage("vector_search_fallback"):
+                unfiltered = search_similar(query, top_k=fetch_k, embedding=embedding)
+            stats["fetch_k"].append(fetch_k)
+            stats["scanned"] += len(unfiltered)
+            matched = [(doc, score) for doc, score in unfiltered if _matches(doc.metadata, filters)]
+            _selectivity.update(signature, len(matched), len(unfiltered))
+            extra = [(doc, score) for doc, score in matched
+                     if (doc.page_content, doc.metadata.get("source")) not in seen]
+            # Por debajo del score mínimo ya no hay nada útil más abajo en el ranking
+            exhausted = len(unfiltered) < fetch_k or (unfiltered and not passes(unfiltered[-1][1]))
+            if len(candidates) + len(extra) >= top_k or exhausted or fetch_k >= SEARCH_MAX_FETCH_K:
+                break
+            fetch_k = min(SEARCH_MAX_FETCH_K, fetch_k * 2)
+        results += [(doc, score) for doc, score in extra if passes(score)]
+        results.sort(key=lambda item: item[1], reverse=True)
+        results = results[:top_k]
+
+    stats["kept"] = len(results)
+    RETRIEVAL_CANDIDATES.labels("scanned").inc(stats["scanned"])
+    RETRIEVAL_CANDIDATES.labels("kept").inc(stats["kept"])
+    return results, stats
+
+
+_hybrid_executor = ThreadPoolExecutor(max_workers=int(os.getenv("SEARCH_HYBRID_WORKERS", "8")),
+                                      thread_name_prefix="hybrid-search")
+
+
+def _lexical_search(query, top_k, filters):
+    predicate = (lambda metadata: _matches(metadata, filters)) if filters else None
+    return [(Document(page_content=text, metadata=metadata), score)
+            for text, metadata, score in lexical_index.search(query, top_k=top_k, predicate=predicate)]
+
+
+@instrument("hybrid_search")
+def hybrid_search(query, top_k: int = 3,
+                  filters: Optional[Dict[str, Any]] = None) -> Tuple[List[Tuple[Any, float, Dict[str, Any]]], Dict[str, Any]]:
+    """
+    Búsqueda híbrida: similitud semántica en Pinecone y BM25 en el índice léxico local, en paralelo,
+    fusionadas con RRF por hash del texto (un mismo fragmento en ambas listas suma las dos posiciones).
+
+    Devuelve (resultados, estadísticas); cada resultado es (documento, score RRF,
+    {"similarity_score": coseno o None, "lexical_score": BM25 o None}).
+    """
+    filters = filters or {}
+    lexical_future = None
+    if LEXICAL_INDEX_ENABLED:
+        lexical_future = _hybrid_executor.submit(contextvars.copy_context().run, _lexical_search,
+                                                 query, top_k * SEARCH_LEXICAL_FETCH_FACTOR, filters)
+    if filters:
+        dense, dense_stats = search_filtered(query, top_k=top_k, filters=filters)
+    else:
+        dense, dense_stats = search_similar(query, top_k=top_k), None
+    lexical = []
+    if lexical_future is not None:
+        try:
+            lexical = lexical_future.result()
+        except Exception as e:
+            # Sin índice léxico la búsqueda sigue siendo la semántica de siempre
+            print(f"⚠️ Búsqueda léxica no disponible: {e}")
+
+    # RRF se queda con el documento de la primera lista en la que aparece; los scores de cada lista se conservan
+    dense_scores = {doc.page_content: score for doc, score in dense}
+    lexical_scores = {doc.page_content: score for doc, score in lexical}
+    fused = reciprocal_rank_fusion([dense, lexical])
+    results = [
+        (doc, rrf_score, {"similarity_score": dense_scores.get(doc.page_content),
+                          "lexical_score": lexical_scores.get(doc.page_content)})
+        for doc, rrf_score, _info in fused[:top_k]
+    ]
+    stats = {"dense": len(dense), "lexical": len(lexical), "fused": len(fused), "kept": len(results)}
+    if dense_stats is not None:
+        stats["dense_scanned"] = dense_stats["scanned"]
+    return results, stats
 
 @traceable(name="Indexación de documento en Pinecone")
-def ingest_document(file_path: str, source_name: str = None):
+@instrument("ingest_document")
+def ingest_document(file_path: str, source_name: str = None, content_hash: str = None):
     """
     Dividimos el documento en fragmentos y los guardamos en Pinecone con metadatos.
     - file_path: Ruta al archivo de texto a procesar
     - source_name: Nombre identificador del documento (opcional)
+    - content_hash: SHA-256 del fichero original, para deduplicar (opcional)
     """
         # 1. Lee el documento
     
@@ -78,9 +363,17 @@ def ingest_document(file_path: str, source_name: str = None):
     chunks = splitter.split_text(content)
 
         # 3. Sube cada fragmento a Pinecone con metadatos (incluye el nombre del documento original)
-    metadatas = [{"source": source_name or file_path}] * len(chunks)
-    vector_db.add_texts(chunks, metadatas=metadatas)
+    metadata = {"source": source_name or str(file_path), "source_type": "document"}
+    if content_hash:
+        metadata["content_hash"] = content_hash
+    metadatas = [metadata] * len(chunks)
+    # Ids deterministas: reintentar la ingesta (o subir otra vez el mismo fichero) sobrescribe los mismos vectores
+    content_key = content_hash or hashlib.sha256(content.encode("utf-8")).hexdigest()
+    ids = get_vector_db().add_texts(chunks, metadatas=metadatas, ids=document_vector_ids(content_key, len(chunks)))
+    index_chunks(zip(chunks, metadatas), source="document")
+    record_ingested_chunks("document", len(chunks))
     print(f"✅ Documento '{file_path}' indexado en Pinecone ({len(chunks)} fragmentos)")
+    return ids
 
 # Este bloque permite usar el archivo como script para pruebas directas desde consola
 if __name__ == "__main__":
@@ -0,0 +1,39 @@
+import hashlib
+from typing import Any, Callable, Dict, Hashable, List, Sequence, Tuple
+
+# Constante k de Reciprocal Rank Fusion (Cormack et al.): amortigua el peso de los primeros puestos
+RRF_K = 60
+
+
+def text_key(doc) -> str:
+    """Identidad de un fragmento para fusionar listas: hash de su texto (los ids no siempre vienen en el Document)."""
+    return hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def reciprocal_rank_fusion(
+    result_lists: Sequence[Sequence[Tuple[Any, float]]],
+    k: int = RRF_K,
+    key: Callable[[Any], Hashable] = text_key
+) -> List[Tuple[Any, float, Dict[str, Any]]]:
+    """
+    Fusiona varias listas ordenadas de (documento, score) con Reciprocal Rank Fusion:
+    cada documento suma 1 / (k + posición) por cada lista en la que aparece.
+
+    Devuelve (documento, score RRF, info) de mayor a menor score RRF, con info:
+    - best_score: mejor score original del documento en cualquiera de las listas
+    - hits: en cuántas listas aparece
+    """
+    fused: Dict[Hashable, List[Any]] = {}
+    for results in result_lists:
+        for rank, (doc, score) in enumerate(results, start=1):
+            doc_key = key(doc)
+            entry = fused.get(doc_key)
+            if entry is None:
+                fused[doc_key] = [doc, 1.0 / (k + rank), {"best_score": score, "hits": 1}]
+                continue
+            entry[1] += 1.0 / (k + rank)
+            entry[2]["hits"] += 1
+            if score > entry[2]["best_score"]:
+                entry[2]["best_score"] = score
+    # sorted es estable: a igualdad de score RRF se respeta el orden de aparición
+    return [tuple(entry) for entry in sorted(fused.values(), key=lambda entry: entry[1], reverse=True)]
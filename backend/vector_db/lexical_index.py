@@ -0,0 +1,408 @@
+import os
+import re
+import json
+import math
+import zlib
+import hashlib
+import threading
+import unicodedata
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from backend.metrics import track_stage
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos (un solo worker)
+    fcntl = None
+
+load_dotenv()
+
+# Índice léxico BM25 local, complementario a Pinecone: encuentra coincidencias exactas
+# (nombres de producto, tickers, empresas) que la similitud de MiniLM no prioriza.
+#
+# En disco (LEXICAL_INDEX_DIR):
+# - snapshot.npz: índice completo en arrays de numpy, sin pickle (se reescribe al compactar o reconstruir)
+# - journal.jsonl: fragmentos añadidos desde el último snapshot, una línea por fragmento
+# Cada worker añade al journal y relee lo que han añadido los demás antes de consultar.
+LEXICAL_INDEX_ENABLED = os.getenv("LEXICAL_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+LEXICAL_INDEX_DIR = Path(os.getenv("LEXICAL_INDEX_DIR") or Path(__file__).resolve().parents[2] / "data" / "lexical_index")
+LEXICAL_INDEX_COMPACT_BYTES = int(os.getenv("LEXICAL_INDEX_COMPACT_BYTES", str(8 * 1024 * 1024)))  # tamaño del journal
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+_SNAPSHOT_VERSION = 2
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.&-][a-z0-9]+)*")
+# Palabras vacías (español e inglés) que no aportan a la relevancia léxica
+_STOPWORDS = frozenset("""
+a al algo como con de del el ella en es esta este esto la las lo los mas mi mis muy no o para pero por que se
+sin sobre su sus te tu un una uno unos unas y ya
+an and are as at be by for from has have in is it its of on or that the this to was were will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Minúsculas, sin tildes y sin palabras vacías; conserva tickers y nombres como "brk.b" o "at&t"."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return [token for token in _TOKEN.findall(text) if token not in _STOPWORDS and len(token) > 1]
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class _Doc:
+    __slots__ = ("hash", "blob")
+
+    def __init__(self, doc_hash: str, blob: bytes):
+        self.hash = doc_hash
+        self.blob = blob   # texto y metadatos en JSON comprimido con zlib
+
+    def load(self) -> Tuple[str, Dict[str, Any]]:
+        data = json.loads(zlib.decompress(self.blob))
+        return data["text"], data["metadata"]
+
+
+class LexicalIndex:
+    """
+    Índice invertido BM25 en memoria.
+
+    Compacto: las listas de postings son arrays de enteros (id de documento y frecuencia del término)
+    y el texto con sus metadatos se guarda comprimido; solo se descomprime para los resultados.
+    Los fragmentos se identifican por el hash de su texto: añadir uno repetido no hace nada.
+    """
+
+    def __init__(self, directory: Path = LEXICAL_INDEX_DIR):
+        self.directory = Path(directory)
+        self._docs: List[_Doc] = []
+        self._by_hash: Dict[str, int] = {}
+        self._lengths = array("I")
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._total_length = 0
+        self._journal_offset = 0
+        self._snapshot_mtime: Optional[float] = None
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._file_lock_depth = 0   # > 0 mientras este proceso tiene tomado el bloqueo del directorio
+
+    @property
+    def snapshot_path(self) -> Path:
+        return self.directory / "snapshot.npz"
+
+    @property
+    def journal_path(self) -> Path:
+        return self.directory / "journal.jsonl"
+
+    # --- Construcción ---
+
+    def _reset(self):
+        self._docs, self._by_hash, self._lengths = [], {}, array("I")
+        self._postings, self._total_length = {}, 0
+
+    def _index(self, text: str, metadata: Dict[str, Any], doc_hash: Optional[str] = None) -> bool:
+        doc_hash = doc_hash or text_hash(text)
+        if doc_hash in self._by_hash:
+            return False
+        doc_id = len(self._docs)
+        tokens = tokenize(text)
+        frequencies: Dict[str, int] = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+        for token, frequency in frequencies.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = (array("I"), array("H"))
+            postings[0].append(doc_id)
+            postings[1].append(min(frequency, 65535))
+        blob = zlib.compress(json.dumps({"text": text, "metadata": metadata}, ensure_ascii=False).encode("utf-8"))
+        self._docs.append(_Doc(doc_hash, blob))
+        self._by_hash[doc_hash] = doc_id
+        self._lengths.append(len(tokens))
+        self._total_length += len(tokens)
+        return True
+
+    def add(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """Añade fragmentos (texto, metadatos) al índice y al journal. Devuelve cuántos eran nuevos."""
+        with self._lock:
+            self._ensure_loaded()
+            lines = []
+            for text, metadata in items:
+                if not text:
+                    continue
+                doc_hash = text_hash(text)
+                if self._index(text, metadata or {}, doc_hash):
+                    lines.append(json.dumps({"hash": doc_hash, "text": text, "metadata": metadata or {}},
+                                            ensure_ascii=False))
+            if lines:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                with self._file_lock():
+                    up_to_date = self._journal_size() == self._journal_offset
+                    with open(self.journal_path, "a", encoding="utf-8") as journal:
+                        journal.write("\n".join(lines) + "\n")
+                    # Las líneas propias ya están indexadas: si nadie más ha escrito, no hace falta releerlas
+                    # (si otro proceso escribió antes, se releen y se saltan por hash)
+                    if up_to_date:
+                        self._journal_offset = self._journal_size()
+            return len(lines)
+
+    # --- Persistencia ---
+
+    @contextmanager
+    def _file_lock(self, shared: bool = False):
+        """
+        Bloqueo entre procesos (workers de uvicorn): exclusivo para escribir el journal o el snapshot,
+        compartido para leerlos. Se llama siempre con self._lock tomado; si este proceso ya tiene
+        el bloqueo (p. ej. compact lee el journal antes de escribir el snapshot), no se vuelve a pedir.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if fcntl is None or self._file_lock_depth:
+            self._file_lock_depth += 1
+            try:
+                yield
+            finally:
+                self._file_lock_depth -= 1
+            return
+        with open(self.directory / ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            self._file_lock_depth += 1
+            try:
+                yield
+            finally:
+                self._file_lock_depth -= 1
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _needs_reload(self, snapshot_mtime: Optional[float], journal_size: int) -> bool:
+        return not self._loaded or snapshot_mtime != self._snapshot_mtime or journal_size < self._journal_offset
+
+    def _file_state(self) -> Tuple[Optional[float], int]:
+        snapshot_mtime = self.snapshot_path.stat().st_mtime if self.snapshot_path.exists() else None
+        return snapshot_mtime, self._journal_size()
+
+    def _ensure_loaded(self):
+        """
+        Carga el snapshot la primera vez (o si otro proceso lo ha reescrito) y aplica el journal pendiente.
+        La lectura se hace con el bloqueo compartido, para no ver un snapshot o una línea a medio escribir.
+        """
+        snapshot_mtime, journal_size = self._file_state()
+        if not self._needs_reload(snapshot_mtime, journal_size) and journal_size == self._journal_offset:
+            return
+        with self._file_lock(shared=True):
+            snapshot_mtime, journal_size = self._file_state()
+            if self._needs_reload(snapshot_mtime, journal_size):
+                self._load_snapshot(snapshot_mtime)
+            if journal_size > self._journal_offset:
+                self._replay_journal()
+
+    def _load_snapshot(self, snapshot_mtime: Optional[float]):
+        self._reset()
+        if snapshot_mtime is not None:
+            try:
+                # Solo arrays numéricos y de texto: allow_pickle=False impide ejecutar nada al cargar
+                with np.load(self.snapshot_path, allow_pickle=False) as data:
+                    version = int(data["version"])
+                    if version == _SNAPSHOT_VERSION:
+                        self._load_arrays(data)
+                    else:
+                        print(f"⚠️ Snapshot del índice léxico con versión {version}: se ignora")
+            except Exception as e:
+                print(f"⚠️ No se pudo leer el snapshot del índice léxico ({self.snapshot_path}): {e}")
+                self._reset()
+        self._snapshot_mtime = snapshot_mtime
+        self._journal_offset = 0
+        self._loaded = True
+
+    def _replay_journal(self, offset: Optional[int] = None):
+        """Indexa las líneas del journal desde `offset` (por defecto, desde la última leída)."""
+        offset = self._journal_offset if offset is None else offset
+        with open(self.journal_path, "rb") as journal:
+            journal.seek(offset)
+            for raw in journal:
+                if not raw.endswith(b"\n"):
+                    break  # línea a medio escribir por otro proceso: se leerá en la siguiente consulta
+                offset += len(raw)
+                try:
+                    entry = json.loads(raw)
+                except ValueError:
+                    continue
+                self._index(entry["text"], entry.get("metadata") or {}, entry.get("hash"))
+        self._journal_offset = offset
+
+    def _journal_size(self) -> int:
+        return self.journal_path.stat().st_size if self.journal_path.exists() else 0
+
+    def _load_arrays(self, data):
+        blobs = data["blobs"].tobytes()
+        blob_offsets = data["blob_offsets"]
+        self._docs = [_Doc(str(doc_hash), blobs[blob_offsets[i]:blob_offsets[i + 1]])
+                      for i, doc_hash in enumerate(data["hashes"])]
+        self._by_hash = {doc.hash: doc_id for doc_id, doc in enumerate(self._docs)}
+        self._lengths = array("I", data["lengths"].astype(np.uint32).tobytes())
+        doc_ids, frequencies, offsets = data["doc_ids"], data["frequencies"], data["term_offsets"]
+        for i, term in enumerate(data["terms"]):
+            start, end = offsets[i], offsets[i + 1]
+            self._postings[str(term)] = (array("I", doc_ids[start:end].tobytes()),
+                                         array("H", frequencies[start:end].tobytes()))
+        self._total_length = sum(self._lengths)
+
+    def _snapshot_arrays(self) -> Dict[str, np.ndarray]:
+        """El índice como arrays planos: postings concatenadas con sus desplazamientos por término."""
+        terms = list(self._postings)
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.uint64)
+        term_offsets[1:] = np.cumsum([len(self._postings[term][0]) for term in terms])
+        blob_offsets = np.zeros(len(self._docs) + 1, dtype=np.uint64)
+        blob_offsets[1:] = np.cumsum([len(doc.blob) for doc in self._docs])
+        return {
+            "version": np.asarray(_SNAPSHOT_VERSION),
+            "hashes": np.asarray([doc.hash for doc in self._docs], dtype="<U64"),
+            "blobs": np.frombuffer(b"".join(doc.blob for doc in self._docs), dtype=np.uint8),
+            "blob_offsets": blob_offsets,
+            "lengths": np.frombuffer(self._lengths.tobytes(), dtype=np.uint32),
+            "terms": np.asarray(terms, dtype=str),
+            "term_offsets": term_offsets,
+            "doc_ids": np.frombuffer(b"".join(self._postings[term][0].tobytes() for term in terms), dtype=np.uint32),
+            "frequencies": np.frombuffer(b"".join(self._postings[term][1].tobytes() for term in terms),
+                                         dtype=np.uint16),
+        }
+
+    def _write_snapshot(self):
+        """Escribe el índice en memoria como snapshot (escritura atómica) y vacía el journal. Con _file_lock tomado."""
+        tmp_path = self.snapshot_path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **self._snapshot_arrays())
+        os.replace(tmp_path, self.snapshot_path)
+        open(self.journal_path, "w").close()
+        self._snapshot_mtime = self.snapshot_path.stat().st_mtime
+        self._journal_offset = 0
+        print(f"✅ Índice léxico guardado: {len(self._docs)} fragmentos, {len(self._postings)} términos")
+
+    def compact(self):
+        """Pasa el journal al snapshot."""
+        with self._lock, self._file_lock():
+            self._ensure_loaded()
+            self._write_snapshot()
+
+    def compact_if_needed(self):
+        if self._journal_size() >= LEXICAL_INDEX_COMPACT_BYTES:
+            self.compact()
+
+    def rebuild(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """
+        Reconstruye el índice desde cero con los fragmentos dados (p. ej. todo el vector store).
+        Lo que se escriba mientras tanto llega por el journal y se conserva.
+        """
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            journal_start = self._journal_size()
+            self._reset()
+            for text, metadata in items:
+                if text:
+                    self._index(text, metadata or {})
+            with self._file_lock():
+                if self.journal_path.exists() and self._journal_size() >= journal_start:
+                    self._replay_journal(journal_start)
+                self._write_snapshot()
+            self._loaded = True
+            return len(self._docs)
+
+    # --- Consulta ---
+
+    def search(self, query: str, top_k: int = 5,
+               predicate: Optional[Callable[[Dict[str, Any]], bool]] = None) -> List[Tuple[str, Dict[str, Any], float]]:
+        """
+        Fragmentos con mayor puntuación BM25 para la consulta: (texto, metadatos, score).
+        - predicate: filtro sobre los metadatos (p. ej. los mismos filtros que la búsqueda en Pinecone)
+        """
+        with track_stage("lexical_search"), self._lock:
+            self._ensure_loaded()
+            count = len(self._docs)
+            if not count:
+                return []
+            average_length = self._total_length / count or 1
+            scores: Dict[int, float] = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                doc_ids, frequencies = postings
+                idf = math.log(1 + (count - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+                for doc_id, frequency in zip(doc_ids, frequencies):
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+            results = []
+            for doc_id in sorted(scores, key=scores.get, reverse=True):
+                text, metadata = self._docs[doc_id].load()
+                if predicate is not None and not predicate(metadata):
+                    continue
+                results.append((text, metadata, scores[doc_id]))
+                if len(results) >= top_k:
+                    break
+            return results
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._ensure_loaded()
+            return {
+                "enabled": LEXICAL_INDEX_ENABLED,
+                "documents": len(self._docs),
+                "terms": len(self._postings),
+                "postings": sum(len(doc_ids) for doc_ids, _ in self._postings.values()),
+                "compressed_text_bytes": sum(len(doc.blob) for doc in self._docs),
+                "journal_bytes": self._journal_size(),
+                "directory": str(self.directory),
+            }
+
+
+# Índice compartido por el proceso (los workers se sincronizan a través del journal)
+lexical_index = LexicalIndex()
+
+
+def index_chunks(items: Iterable[Tuple[str, Dict[str, Any]]], source: str = ""):
+    """
+    Añade fragmentos recién escritos en Pinecone al índice léxico.
+    Un fallo aquí no debe romper la escritura en Pinecone: solo se avisa.
+    """
+    if not LEXICAL_INDEX_ENABLED:
+        return
+    try:
+        added = lexical_index.add(items)
+        if added:
+            print(f"🔤 Índice léxico: {added} fragmentos nuevos ({source or 'sin origen'})")
+        lexical_index.compact_if_needed()
+    except Exception as e:
+        print(f"⚠️ No se pudo actualizar el índice léxico: {e}")
+
+
+def iter_vector_store(page_size: int = 100) -> Iterable[Tuple[str, Dict[str, Any]]]:
+    """
+    Recorre todos los vectores del índice de Pinecone y devuelve (texto, metadatos).
+    Usa list + fetch del SDK de Pinecone (índices serverless).
+    """
+    from backend.vector_db.db_manager import get_vector_db
+    store = get_vector_db()
+    index = store._index
+    text_key = getattr(store, "_text_key", "text")
+    for ids in index.list(limit=page_size):
+        vectors = index.fetch(ids=list(ids)).vectors
+        for vector in vectors.values():
+            metadata = dict(vector.metadata or {})
+            text = metadata.pop(text_key, None)
+            if text:
+                yield text, metadata
+
+
+def rebuild_from_vector_store() -> int:
+    """Reconstruye el índice léxico con todo el contenido de Pinecone. Devuelve el número de fragmentos."""
+    with track_stage("lexical_index_rebuild"):
+        total = lexical_index.rebuild(iter_vector_store())
+    print(f"✅ Índice léxico reconstruido desde Pinecone: {total} fragmentos")
+    return total
+
+
+if __name__ == "__main__":
+    # python -m backend.vector_db.lexical_index: reconstruye el índice desde Pinecone
+    rebuild_from_vector_store()
@@ -0,0 +1,175 @@
+import os
+import time
+import hashlib
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from backend.providers import LazyProvider, MODEL_CACHE_DIR
+from backend.metrics import track_stage, RERANK_OUTCOMES, RERANK_PAIRS
+from backend.timing import stage
+
+load_dotenv()
+
+# Reordenación opcional del contexto de Pinecone con un cross-encoder pequeño en CPU:
+# puntúa cada par (consulta, fragmento) leyendo ambos textos a la vez, más fiable que el coseno de MiniLM.
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() in ("1", "true", "yes")
+# Multilingüe (el contenido es mayoritariamente en español); en inglés basta cross-encoder/ms-marco-MiniLM-L-6-v2
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "300"))     # si se supera, orden original
+RERANK_CACHE_MAX = int(os.getenv("RERANK_CACHE_MAX", "20000"))     # pares (consulta, fragmento) en caché
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "256"))     # tokens por par
+RERANK_FETCH_FACTOR = int(os.getenv("RERANK_FETCH_FACTOR", "3"))   # candidatos = top_k * factor
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "3"))                 # fragmentos que pasan al prompt
+
+
+def _load_cross_encoder():
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(RERANK_MODEL, max_length=RERANK_MAX_LENGTH, device="cpu", cache_folder=MODEL_CACHE_DIR)
+
+
+# Solo se registra si está activo, para que el calentamiento no descargue un modelo que no se usa
+cross_encoder_provider = LazyProvider("reranker", _load_cross_encoder, required=False) if RERANK_ENABLED else None
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class Reranker:
+    """
+    Cross-encoder con caché de puntuaciones y presupuesto de latencia.
+
+    - Una sola pasada por lotes con todos los pares de la consulta que no están en caché.
+    - Caché LRU de puntuaciones por (hash de la consulta normalizada, hash del fragmento).
+    - Si el modelo aún no está cargado, o la pasada no termina dentro del presupuesto, se devuelve
+      el orden original; una pasada ya empezada termina en segundo plano y deja sus puntuaciones en la caché.
+    - Como mucho una pasada en cola o en curso: mientras la haya, las demás peticiones usan el orden
+      original en lugar de esperar detrás (bajo carga no se acumulan pasadas abandonadas).
+    """
+
+    def __init__(self, provider: LazyProvider, budget_ms: float = RERANK_BUDGET_MS,
+                 cache_max: int = RERANK_CACHE_MAX):
+        self.provider = provider
+        self.budget_ms = budget_ms
+        self.cache_max = cache_max
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Un solo hilo: el cross-encoder ya usa varios núcleos en cada pasada
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        self._loading = False
+        self._busy = False
+
+    def _cached(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], float]:
+        with self._lock:
+            found = {}
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    found[key] = self._cache[key]
+            return found
+
+    def _store(self, scores: Dict[Tuple[str, str], float]):
+        with self._lock:
+            self._cache.update(scores)
+            for key in scores:
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_max:
+                self._cache.popitem(last=False)
+
+    def _warm_up_in_background(self):
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+
+        def _load():
+            try:
+                self.provider.get()
+            except Exception as e:
+                print(f"⚠️ No se pudo cargar el reranker '{RERANK_MODEL}': {e}")
+            finally:
+                self._loading = False
+
+        self._executor.submit(_load)
+
+    def _predict(self, query: str, pending: List[Tuple[Tuple[str, str], str]]) -> Dict[Tuple[str, str], float]:
+        model = self.provider.get()
+        with track_stage("rerank_forward"):
+            raw = model.predict([(query, text) for _, text in pending], batch_size=len(pending),
+                                show_progress_bar=False)
+        scores = {key: float(score) for (key, _), score in zip(pending, raw)}
+        self._store(scores)
+        return scores
+
+    def rerank(self, query: str, results: List[Tuple[Any, float]],
+               top_n: Optional[int] = None) -> Tuple[List[Tuple[Any, float]], Dict[str, Any]]:
+        """
+        Reordena (documento, score) por la puntuación del cross-encoder.
+        Devuelve (resultados, estadísticas); en los resultados reordenados el score es el del cross-encoder.
+        Si no se puede reordenar a tiempo, devuelve los resultados originales y stats["reranked"] = False.
+        """
+        stats: Dict[str, Any] = {"reranked": False, "candidates": len(results), "cached": 0, "scored": 0,
+                                 "outcome": "empty"}
+        if not results:
+            return results, stats
+        start = time.perf_counter()
+        query_hash = _hash(" ".join(query.split()).lower())
+        keys = [(query_hash, _hash(doc.page_content)) for doc, _ in results]
+        scores = self._cached(keys)
+        stats["cached"] = len(scores)
+        RERANK_PAIRS.labels("hit").inc(len(scores))
+
+        pending, seen = [], set()
+        for key, (doc, _) in zip(keys, results):
+            if key not in scores and key not in seen:
+                seen.add(key)
+                pending.append((key, doc.page_content))
+        if pending:
+            RERANK_PAIRS.labels("miss").inc(len(pending))
+            if not self.provider.is_ready():
+                # No se bloquea la petición cargando el modelo: se carga en segundo plano para las siguientes
+                self._warm_up_in_background()
+                return self._degrade(results, stats, "cold")
+            with self._lock:
+                if self._busy:
+                    return self._degrade(results, stats, "busy")
+                self._busy = True
+            remaining_s = max(0.0, self.budget_ms / 1000 - (time.perf_counter() - start))
+            future = self._executor.submit(contextvars.copy_context().run, self._predict, query, pending)
+            # Se libera al terminar o al cancelarse la pasada, no al agotarse el presupuesto de esta petición
+            future.add_done_callback(self._release)
+            try:
+                with stage("rerank"):
+                    scores.update(future.result(timeout=remaining_s))
+            except FutureTimeoutError:
+                # Si aún no ha empezado, se descarta; si ya está en curso, termina y llena la caché
+                future.cancel()
+                return self._degrade(results, stats, "budget_exceeded")
+            except Exception as e:
+                print(f"⚠️ Reranking no disponible, se mantiene el orden original: {e}")
+                return self._degrade(results, stats, "error")
+            stats["scored"] = len(pending)
+
+        order = sorted(range(len(results)), key=lambda i: scores[keys[i]], reverse=True)
+        reranked = [(results[i][0], scores[keys[i]]) for i in order][:top_n]
+        stats.update({"reranked": True, "outcome": "reranked",
+                      "latency_ms": round((time.perf_counter() - start) * 1000, 1)})
+        RERANK_OUTCOMES.labels("reranked").inc()
+        return reranked, stats
+
+    def _release(self, _future):
+        with self._lock:
+            self._busy = False
+
+    @staticmethod
+    def _degrade(results, stats, outcome: str):
+        RERANK_OUTCOMES.labels(outcome).inc()
+        stats["outcome"] = outcome
+        return results, stats
+
+
+# Reranker compartido por el proceso (la caché de puntuaciones es por worker); None si está desactivado
+reranker = Reranker(cross_encoder_provider) if RERANK_ENABLED else None
@@ -0,0 +1,50 @@
+"""
+Compara dos resultados de benchmarks/loadtest.py (p. ej. antes y después de un commit).
+
+Uso:
+    python -m benchmarks.compare benchmarks/results/A.json benchmarks/results/B.json
+"""
+import sys
+import json
+from typing import Optional
+
+
+def _delta(before: Optional[float], after: Optional[float]) -> str:
+    if before is None or after is None:
+        return "-"
+    if before == 0:
+        return f"{after:+.1f}"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def main():
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    with open(sys.argv[1], encoding="utf-8") as f:
+        before = json.load(f)
+    with open(sys.argv[2], encoding="utf-8") as f:
+        after = json.load(f)
+
+    print(f"Antes:   {before['meta']['commit']} ({before['meta']['timestamp']})")
+    print(f"Después: {after['meta']['commit']} ({after['meta']['timestamp']})")
+    print(f"{'endpoint':<18}{'métrica':<10}{'antes':>10}{'después':>10}{'cambio':>10}")
+
+    endpoints = list(before["results"]["endpoints"]) + ["TOTAL"]
+    for endpoint in endpoints:
+        if endpoint == "TOTAL":
+            a, b = before["results"]["overall"], after["results"]["overall"]
+        else:
+            a = before["results"]["endpoints"].get(endpoint)
+            b = after["results"]["endpoints"].get(endpoint)
+            if not a or not b:
+                continue
+        for metric in ("p50", "p95", "p99"):
+            x, y = a["latency_ms"][metric], b["latency_ms"][metric]
+            print(f"{endpoint:<18}{metric:<10}{x if x is not None else '-':>10}{y if y is not None else '-':>10}{_delta(x, y):>10}")
+        print(f"{endpoint:<18}{'rps':<10}{a['throughput_rps']:>10}{b['throughput_rps']:>10}{_delta(a['throughput_rps'], b['throughput_rps']):>10}")
+        print(f"{endpoint:<18}{'errores':<10}{a['error_rate']:>10}{b['error_rate']:>10}{'':>10}")
+
+
+if __name__ == "__main__":
+    main()
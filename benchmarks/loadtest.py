@@ -0,0 +1,368 @@
+"""
+Prueba de carga offline del backend.
+
+Arranca los servicios simulados (benchmarks/fake_services.py), lanza la API con uvicorn apuntando a ellos
+y genera carga en bucle abierto (a RPS fijo, sin esperar a que terminen las peticiones anteriores)
+contra /generate, /search, /upload_document, /arxiv_query y /financial-news.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.loadtest --rps 5 --duration 60
+    python -m benchmarks.loadtest --config benchmarks/scenarios/default.json
+
+Escribe los resultados (p50/p95/p99, throughput y errores por endpoint) en
+benchmarks/results/<fecha>_<commit>.json para poder comparar entre commits (benchmarks/compare.py).
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import threading
+import subprocess
+from pathlib import Path
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+import requests
+
+from benchmarks.fake_services import start_fake_services, app_environment, service_stats
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+TOPICS = [
+    "Lanzamiento de un nuevo producto de IA",
+    "Consejos de productividad para equipos remotos",
+    "Tendencias de ciberseguridad",
+    "Sostenibilidad en la cadena de suministro",
+    "Resultados trimestrales",
+]
+COMPANIES = ["RuizTech", "Acme", "Globex", "Initech"]
+PLATFORMS = ["LinkedIn", "Twitter", "Instagram", "Blog"]
+TONES = ["Profesional", "Cercano", "Inspirador"]
+LANGUAGES = ["Español", "Inglés"]
+
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "rps": 2.0,
+    "duration_s": 60,
+    "warmup_s": 10,
+    "seed": 42,
+    "workers": 1,
+    "max_in_flight": 256,
+    "request_timeout_s": 120,
+    # Reparto de la carga entre endpoints (pesos relativos)
+    "mix": {
+        "/generate": 4,
+        "/search": 3,
+        "/upload_document": 1,
+        "/arxiv_query": 1,
+        "/financial-news": 1,
+    },
+    # Perfiles de latencia/errores por servicio; ver DEFAULT_PROFILES en fake_services.py
+    "profiles": {},
+    # Variables de entorno adicionales para la API (p. ej. RESPONSE_CACHE_DEFAULT=bypass)
+    "app_env": {},
+}
+
+SAMPLE_DOCUMENT = (
+    "Informe interno de ejemplo.\n"
+    "Nuestro equipo ha reducido el tiempo de entrega un 30% gracias a la automatización.\n"
+) * 20
+
+
+# ---------------------------------------------------------------- Peticiones por endpoint
+
+def _generate_request(rng: random.Random) -> Dict[str, Any]:
+    return {"json": {
+        "topic": rng.choice(TOPICS),
+        "platform": rng.choice(PLATFORMS),
+        "company": rng.choice(COMPANIES),
+        "tone": rng.choice(TONES),
+        "language": rng.choice(LANGUAGES),
+        "model_writer": "llama-3.3-70b-versatile",
+        "img_model": "remote:all",
+        "generate_image": rng.random() < 0.5,
+        "cache": "bypass",
+    }}
+
+
+def _search_request(rng: random.Random) -> Dict[str, Any]:
+    return {"json": {"query": rng.choice(TOPICS), "top_k": 3}}
+
+
+def _upload_request(rng: random.Random) -> Dict[str, Any]:
+    return {
+        "data": {
+            "topic": rng.choice(TOPICS),
+            "platform": rng.choice(PLATFORMS),
+            "tone": rng.choice(TONES),
+            "language": rng.choice(LANGUAGES),
+            "model": "llama-3.3-70b-versatile",
+            "company": rng.choice(COMPANIES),
+        },
+        "files": {"file": (f"informe_{rng.randint(0, 10**6)}.txt", SAMPLE_DOCUMENT.encode("utf-8"), "text/plain")},
+    }
+
+
+def _arxiv_request(rng: random.Random) -> Dict[str, Any]:
+    return {"json": {"question": f"¿Qué dice la literatura reciente sobre {rng.choice(TOPICS).lower()}?"}}
+
+
+def _financial_request(rng: random.Random) -> Dict[str, Any]:
+    return {"json": {"topic": "resultados trimestrales", "company": rng.choice(["Apple", "Tesla", "Microsoft"]),
+                     "language": rng.choice(LANGUAGES)}}
+
+
+REQUEST_BUILDERS = {
+    "/generate": _generate_request,
+    "/search": _search_request,
+    "/upload_document": _upload_request,
+    "/arxiv_query": _arxiv_request,
+    "/financial-news": _financial_request,
+}
+
+
+# ---------------------------------------------------------------- Estadísticas
+
+def percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(p / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(samples: List[Dict[str, Any]], window_s: float) -> Dict[str, Any]:
+    latencies = sorted(s["latency_ms"] for s in samples)
+    errors = [s for s in samples if not s["ok"]]
+    statuses: Dict[str, int] = {}
+    for s in samples:
+        statuses[str(s["status"])] = statuses.get(str(s["status"]), 0) + 1
+    return {
+        "count": len(samples),
+        "errors": len(errors),
+        "error_rate": round(len(errors) / len(samples), 4) if samples else 0.0,
+        "throughput_rps": round((len(samples) - len(errors)) / window_s, 3) if window_s > 0 else 0.0,
+        "status_codes": statuses,
+        "latency_ms": {
+            "p50": _round(percentile(latencies, 50)),
+            "p95": _round(percentile(latencies, 95)),
+            "p99": _round(percentile(latencies, 99)),
+            "mean": _round(sum(latencies) / len(latencies)) if latencies else None,
+            "max": _round(latencies[-1]) if latencies else None,
+        },
+    }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+
+# ---------------------------------------------------------------- Ejecución
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", *args], cwd=ROOT_DIR, text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def _free_port() -> int:
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(env: Dict[str, str], workers: int, port: int, log_path: Path) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1",
+           "--port", str(port), "--workers", str(workers), "--log-level", "warning"]
+    log_file = open(log_path, "w")
+    return subprocess.Popen(cmd, cwd=ROOT_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+
+def wait_until_ready(base_url: str, process: subprocess.Popen, timeout_s: float = 300):
+    """Espera a /healthz y, si existe, a que /readyz indique que los modelos están cargados."""
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"❌ La API terminó durante el arranque (código {process.returncode})")
+        try:
+            if requests.get(f"{base_url}/healthz", timeout=2).status_code == 200:
+                break
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    else:
+        raise TimeoutError("❌ La API no respondió a /healthz a tiempo")
+
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/readyz", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(1)
+    print("⚠️ /readyz no llegó a 200; se mide igualmente (incluirá cargas en frío)")
+
+
+def run_load(base_url: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Bucle abierto: las peticiones se programan a intervalos exponenciales (llegadas de Poisson)
+    a la tasa objetivo, independientemente de lo que tarden las anteriores.
+    """
+    rng = random.Random(config["seed"])
+    mix = {endpoint: weight for endpoint, weight in config["mix"].items() if weight > 0}
+    endpoints, weights = list(mix), list(mix.values())
+
+    samples: List[Dict[str, Any]] = []
+    samples_lock = threading.Lock()
+    in_flight = threading.BoundedSemaphore(config["max_in_flight"])
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=len(endpoints), pool_maxsize=config["max_in_flight"])
+    session.mount("http://", adapter)
+
+    dropped = 0
+    warmup_end = time.perf_counter() + config["warmup_s"]
+
+    def fire(endpoint: str, kwargs: Dict[str, Any], scheduled: float):
+        status, ok = 0, False
+        try:
+            response = session.post(f"{base_url}{endpoint}", timeout=config["request_timeout_s"], **kwargs)
+            status = response.status_code
+            ok = response.ok and not (isinstance(_safe_json(response), dict) and _safe_json(response).get("error"))
+        except requests.RequestException:
+            status = "exception"
+        finally:
+            in_flight.release()
+        # La latencia se mide desde el instante programado: incluye el retraso si el generador se atrasó
+        latency_ms = (time.perf_counter() - scheduled) * 1000
+        if scheduled >= warmup_end:
+            with samples_lock:
+                samples.append({"endpoint": endpoint, "latency_ms": latency_ms, "status": status, "ok": ok})
+
+    executor = ThreadPoolExecutor(max_workers=config["max_in_flight"])
+    start = time.perf_counter()
+    end = start + config["warmup_s"] + config["duration_s"]
+    next_at = start
+    while next_at < end:
+        now = time.perf_counter()
+        if next_at > now:
+            time.sleep(next_at - now)
+        endpoint = rng.choices(endpoints, weights)[0]
+        kwargs = REQUEST_BUILDERS[endpoint](rng)
+        if in_flight.acquire(blocking=False):
+            executor.submit(fire, endpoint, kwargs, next_at)
+        elif next_at >= warmup_end:
+            dropped += 1
+        next_at += rng.expovariate(config["rps"])
+    executor.shutdown(wait=True)
+    session.close()
+
+    window_s = config["duration_s"]
+    by_endpoint = {endpoint: summarize([s for s in samples if s["endpoint"] == endpoint], window_s)
+                   for endpoint in endpoints}
+    return {
+        "overall": summarize(samples, window_s),
+        "endpoints": by_endpoint,
+        "dropped_over_max_in_flight": dropped,
+    }
+
+
+def _safe_json(response: requests.Response):
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+
+def load_config(path: Optional[str], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    config = json.loads(json.dumps(DEFAULT_CONFIG))
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            file_config = json.load(f)
+        for key, value in file_config.items():
+            if isinstance(value, dict) and isinstance(config.get(key), dict):
+                config[key].update(value)
+            else:
+                config[key] = value
+    config.update({key: value for key, value in overrides.items() if value is not None})
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga offline con servicios simulados")
+    parser.add_argument("--config", help="JSON con rps, duration_s, mix, profiles, app_env...")
+    parser.add_argument("--rps", type=float, help="Peticiones por segundo objetivo")
+    parser.add_argument("--duration", dest="duration_s", type=float, help="Duración de la medición (s)")
+    parser.add_argument("--warmup", dest="warmup_s", type=float, help="Segundos iniciales que no se miden")
+    parser.add_argument("--workers", type=int, help="Workers de uvicorn")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--label", default="", help="Etiqueta libre que se guarda en los resultados")
+    parser.add_argument("--output", help="Ruta del JSON de resultados")
+    args = parser.parse_args()
+
+    config = load_config(args.config, {
+        "rps": args.rps, "duration_s": args.duration_s, "warmup_s": args.warmup_s,
+        "workers": args.workers, "seed": args.seed,
+    })
+
+    services = start_fake_services(config["profiles"], seed=config["seed"])
+    env = {**os.environ, **app_environment(services), "WARMUP_ON_STARTUP": "true",
+           **{key: str(value) for key, value in config["app_env"].items()}}
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    commit = _git("rev-parse", "--short", "HEAD") or "nogit"
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{stamp}_{commit}.json"
+
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    process = start_app(env, config["workers"], port, output.with_suffix(".log"))
+    try:
+        print(f"🚀 Esperando a la API en {base_url}...")
+        wait_until_ready(base_url, process)
+        print(f"📈 Carga: {config['rps']} rps durante {config['duration_s']}s (+{config['warmup_s']}s de calentamiento)")
+        results = run_load(base_url, config)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        for service in services.values():
+            service.stop()
+
+    report = {
+        "meta": {
+            "timestamp": stamp,
+            "commit": commit,
+            "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+            "label": args.label,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "config": config,
+        "results": results,
+        "fake_services": service_stats(services),
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"{'endpoint':<18}{'n':>6}{'err':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'rps':>8}")
+    for endpoint, stats in [*results["endpoints"].items(), ("TOTAL", results["overall"])]:
+        lat = stats["latency_ms"]
+        print(f"{endpoint:<18}{stats['count']:>6}{stats['errors']:>6}{_fmt(lat['p50']):>10}"
+              f"{_fmt(lat['p95']):>10}{_fmt(lat['p99']):>10}{stats['throughput_rps']:>8}")
+    print(f"✅ Resultados guardados en {output}")
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.0f}ms"
+
+
+if __name__ == "__main__":
+    main()
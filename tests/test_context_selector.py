@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from backend.agents import context_selector
+from backend.agents.context_selector import mmr_select, select_context
+
+
+class _Doc:
+    def __init__(self, page_content):
+        self.page_content = page_content
+
+
+def _unit(*rows):
+    vectors = np.asarray(rows, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_mmr_select_collapses_near_duplicates_and_prefers_diversity():
+    chunks = _unit([1, 0, 0], [0.99, 0.05, 0], [0.7, 0.7, 0], [0.8, 0, 0.6])
+    relevance = chunks @ _unit([1, 0, 0])[0]
+    selected, collapsed = mmr_select(relevance, chunks @ chunks.T, max_chunks=3,
+                                     lambda_mult=0.7, dedup_threshold=0.95)
+    assert selected[0] == 0
+    assert collapsed == [1]
+    assert sorted(selected) == [0, 2, 3]
+
+
+def test_mmr_select_with_lambda_one_keeps_relevance_order():
+    chunks = _unit([1, 0], [0.9, 0.1], [0.5, 0.5])
+    relevance = np.asarray([0.9, 0.8, 0.7], dtype=np.float32)
+    selected, collapsed = mmr_select(relevance, chunks @ chunks.T, max_chunks=2,
+                                     lambda_mult=1.0, dedup_threshold=1.1)
+    assert selected == [0, 1]
+    assert collapsed == []
+
+
+def test_mmr_select_stops_at_max_chunks():
+    chunks = _unit([1, 0], [0, 1], [1, 1])
+    selected, _ = mmr_select(np.ones(3, dtype=np.float32), chunks @ chunks.T, max_chunks=1)
+    assert len(selected) == 1
+
+
+@pytest.fixture
+def fake_embeddings(monkeypatch):
+    vectors = {"q": [1, 0, 0], "a": [0.9, 0.1, 0], "a2": [0.9, 0.11, 0], "b": [0.6, 0.8, 0], "c": [0.7, 0, 0.7]}
+
+    def encode(texts):
+        return _unit(*[vectors[text.split()[0]] for text in texts])
+
+    monkeypatch.setattr(context_selector._embedding_cache, "encode", encode)
+
+
+def test_select_context_removes_duplicates(fake_embeddings):
+    results = [(_Doc("a " + "x" * 40), 0.9), (_Doc("a2 " + "x" * 40), 0.89), (_Doc("a " + "x" * 40), 0.88),
+               (_Doc("c yyyy"), 0.8), (_Doc("b zzzz"), 0.7)]
+    selected, stats = select_context("q", results, max_chunks=3)
+    assert [doc.page_content.split()[0] for doc, _ in selected] == ["a", "c", "b"]
+    assert stats["collapsed"] == 2
+    assert stats["mmr"]
+
+
+def test_tokens_saved_is_measured_against_the_prompt_chunks(fake_embeddings):
+    results = [(_Doc("a " + "x" * 400), 0.9), (_Doc("a2 " + "x" * 400), 0.89), (_Doc("c yyyy"), 0.8),
+               (_Doc("b zzzz"), 0.7)] + [(_Doc("b zzzz" + " z" * 200), 0.6)] * 4
+    # Sin límite (reranker activo) el ahorro se mide solo en los 2 fragmentos que irían al prompt
+    _, stats = select_context("q", results, max_chunks=None, prompt_chunks=2)
+    pasted = len("a " + "x" * 400) + 1 + len("a2 " + "x" * 400)
+    kept = len("a " + "x" * 400) + 1 + len("c yyyy")
+    assert stats["tokens_saved"] == (pasted + 3) // 4 - (kept + 3) // 4
@@ -0,0 +1,42 @@
+import pytest
+from backend.vector_db.fusion import reciprocal_rank_fusion, text_key
+
+
+class _Doc:
+    def __init__(self, page_content):
+        self.page_content = page_content
+
+
+def test_reciprocal_rank_fusion_rewards_documents_in_both_lists():
+    a, b, c = _Doc("a"), _Doc("b"), _Doc("c")
+    dense = [(a, 0.9), (b, 0.8)]
+    lexical = [(c, 7.0), (_Doc("b"), 5.0)]
+    fused = reciprocal_rank_fusion([dense, lexical], k=60)
+
+    assert [doc.page_content for doc, _, _ in fused] == ["b", "a", "c"]
+    doc, score, info = fused[0]
+    assert doc is b
+    assert score == pytest.approx(1 / 62 + 1 / 62)
+    assert info == {"best_score": 5.0, "hits": 2}
+
+
+def test_reciprocal_rank_fusion_keeps_first_seen_order_on_ties():
+    fused = reciprocal_rank_fusion([[(_Doc("x"), 1.0)], [(_Doc("y"), 1.0)]])
+    assert [doc.page_content for doc, _, _ in fused] == ["x", "y"]
+    assert all(info["hits"] == 1 for _, _, info in fused)
+
+
+def test_reciprocal_rank_fusion_accepts_custom_key():
+    fused = reciprocal_rank_fusion([[(_Doc("Hola"), 1.0)], [(_Doc("hola"), 2.0)]],
+                                   key=lambda doc: doc.page_content.lower())
+    assert len(fused) == 1
+    assert fused[0][2] == {"best_score": 2.0, "hits": 2}
+
+
+def test_text_key_depends_only_on_content():
+    assert text_key(_Doc("mismo texto")) == text_key(_Doc("mismo texto"))
+    assert text_key(_Doc("mismo texto")) != text_key(_Doc("otro texto"))
+
+
+def test_reciprocal_rank_fusion_of_empty_lists_is_empty():
+    assert reciprocal_rank_fusion([[], []]) == []
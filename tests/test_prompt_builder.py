@@ -0,0 +1,38 @@
+from backend.llm import prompt_builder
+from backend.llm.prompt_builder import (
+    budget_sections, fit_chunks, join_context, split_context, context_for_prompt, estimate_tokens
+)
+
+
+def test_join_and_split_context_keep_multiline_chunks():
+    chunks = ["Título\nprimera línea\nsegunda línea", "otro fragmento"]
+    assert split_context(join_context(chunks)) == chunks
+    assert context_for_prompt(join_context(chunks)) == "Título\nprimera línea\nsegunda línea\n\notro fragmento"
+
+
+def test_split_context_without_separator_is_one_chunk():
+    assert split_context("línea 1\nlínea 2") == ["línea 1\nlínea 2"]
+    assert split_context(None) == []
+
+
+def test_fit_chunks_keeps_original_order_within_budget():
+    chunks = ["a" * 40, "b" * 400, "c" * 40]
+    assert fit_chunks(chunks, [2, 1, 0], budget=30, counter=estimate_tokens) == ["a" * 40, "c" * 40]
+
+
+def test_budget_sections_trims_whole_context_chunks():
+    first = "Documento A\n" + "alfa " * 100
+    second = "Documento B\nbeta"
+    third = "Documento C\n" + "gamma " * 1000
+    sections = budget_sections("tema", join_context([first, second, third]), "", model="sin-tokenizador",
+                               context_budget=300)
+    assert sections.context == f"{first.strip()}\n\n{second}"
+    assert sections.dropped["context"] == 1
+
+
+def test_token_counter_does_not_load_tokenizers_inside_a_request(monkeypatch):
+    def fail(name):
+        raise AssertionError("el tokenizador no debe cargarse dentro de una petición")
+    monkeypatch.setattr(prompt_builder, "_load_tokenizer", fail)
+    assert prompt_builder.get_token_counter("llama-3.3-70b-versatile") is prompt_builder.estimate_tokens
+    assert prompt_builder.get_token_counter("modelo-sin-tokenizador") is prompt_builder.estimate_tokens
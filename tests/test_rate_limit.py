@@ -0,0 +1,119 @@
+import time
+import pytest
+import requests
+from backend.llm import client as client_module
+from backend.llm.client import ChatCompletionsClient
+from backend.llm.errors import APIError, RateLimitError
+from backend.llm.rate_limit import parse_duration_s, TokenBucket, ModelBudget, RateLimiter
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2", 2.0),
+    ("7.66s", 7.66),
+    ("120ms", 0.12),
+    ("2m59.56s", 179.56),
+    ("1h2m", 3720.0),
+])
+def test_parse_duration_s(value, expected):
+    assert parse_duration_s(value) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("value", [None, "", "soon"])
+def test_parse_duration_s_unparseable(value):
+    assert parse_duration_s(value) is None
+
+
+def test_token_bucket_refills_up_to_capacity():
+    bucket = TokenBucket(capacity=10, refill_per_s=2)
+    bucket.tokens = 0
+    bucket.refill(bucket.updated + 3)
+    assert bucket.tokens == pytest.approx(6)
+    bucket.refill(bucket.updated + 100)
+    assert bucket.tokens == 10
+
+
+def test_token_bucket_wait_for():
+    bucket = TokenBucket(capacity=10, refill_per_s=2)
+    assert bucket.wait_for(5) == 0
+    bucket.tokens = 1
+    assert bucket.wait_for(5) == pytest.approx(2)
+    # Una petición mayor que el cubo espera solo a que se llene
+    assert bucket.wait_for(50) == pytest.approx(4.5)
+    empty = TokenBucket(capacity=10, refill_per_s=0)
+    empty.tokens = 0
+    assert empty.wait_for(1) == float("inf")
+
+
+def test_model_budget_acquire_and_settle():
+    budget = ModelBudget("m", rpm=60, tpm=1000)
+    assert budget.acquire(400) < 0.1
+    assert budget.tokens.tokens == pytest.approx(600, abs=5)
+    budget.settle(400, 100)
+    assert budget.tokens.tokens == pytest.approx(900, abs=5)
+    budget.settle(400, None)
+    assert budget.tokens.tokens == pytest.approx(900, abs=5)
+
+
+def test_model_budget_queue_timeout():
+    budget = ModelBudget("m", rpm=1, tpm=1000)
+    budget.acquire(10)
+    with pytest.raises(RateLimitError) as excinfo:
+        budget.acquire(10, timeout_s=0.1)
+    assert excinfo.value.retry_after_s > 0
+
+
+def test_rate_limiter_uses_per_model_limits():
+    limiter = RateLimiter(default_rpm=30, default_tpm=6000)
+    limiter.model_limits = {"big": {"rpm": 5, "tpm": 100}}
+    assert limiter.budget("big").tokens.capacity == 100
+    assert limiter.budget("other").tokens.capacity == 6000
+    assert limiter.budget("big") is limiter.budget("big")
+
+
+class _FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = "error"
+
+    def json(self):
+        return {"choices": [{"message": {"content": "ok"}}]}
+
+
+class _FakeSession:
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+
+    def post(self, *args, **kwargs):
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return _FakeResponse(outcome)
+
+
+def _client(monkeypatch, outcomes, max_retries=2):
+    monkeypatch.setattr(client_module, "get_client", lambda service: _FakeSession(outcomes))
+    monkeypatch.setattr(client_module, "LLM_BACKOFF_S", 0)
+    limiter = RateLimiter(default_rpm=600, default_tpm=100000)
+    return ChatCompletionsClient("http://llm.test", {}, limiter=limiter, max_retries=max_retries), limiter
+
+
+@pytest.mark.parametrize("outcomes, error", [
+    ([500, 503, 502], APIError),
+    ([400], APIError),
+    ([requests.Timeout("slow"), requests.ConnectionError("down"), 500], Exception),
+])
+def test_failed_attempts_refund_reserved_tokens(monkeypatch, outcomes, error):
+    llm, limiter = _client(monkeypatch, outcomes)
+    payload = {"model": "m", "messages": [{"role": "user", "content": "x" * 400}], "max_tokens": 100}
+    with pytest.raises(error):
+        llm.complete_text(payload)
+    assert limiter.budget("m").tokens.tokens == pytest.approx(100000, abs=50)
+
+
+def test_successful_attempt_keeps_the_reservation(monkeypatch):
+    llm, limiter = _client(monkeypatch, [503, 200])
+    payload = {"model": "m", "messages": [{"role": "user", "content": "x" * 400}], "max_tokens": 100}
+    assert llm.complete_text(payload) == "ok"
+    # Sin campo usage en la respuesta se mantiene la estimación (100 de prompt + 100 de respuesta)
+    assert limiter.budget("m").tokens.tokens == pytest.approx(100000 - 200, abs=50)
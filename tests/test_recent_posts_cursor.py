@@ -0,0 +1,110 @@
+import json
+import base64
+import pytest
+
+pytest.importorskip("supabase")
+
+from backend.database import repository
+from backend.database.repository import _decode_cursor, _encode_cursor, get_recent_posts
+
+
+class _FakeQuery:
+    """Imita el query builder de Supabase sobre una lista de filas en memoria."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+        self._filter = None
+        self._limit = None
+
+    def table(self, name):
+        self.calls.append(("table", name))
+        return self
+
+    def select(self, columns):
+        return self
+
+    def or_(self, expression):
+        self.calls.append(("or", expression))
+        before = expression.split(",")[0].split(".lt.")[1]
+        last_id = int(expression.rsplit("id.lt.", 1)[1].rstrip(")"))
+        self._filter = lambda row: (row["created_at"] < before
+                                    or (row["created_at"] == before and row["id"] < last_id))
+        return self
+
+    def order(self, column, desc=False):
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def execute(self):
+        rows = sorted(self.rows, key=lambda row: (row["created_at"], row["id"]), reverse=True)
+        if self._filter:
+            rows = [row for row in rows if self._filter(row)]
+        self._filter = None
+
+        class _Result:
+            data = rows[:self._limit]
+        return _Result()
+
+
+@pytest.fixture
+def posts(monkeypatch):
+    # Dos posts con la misma fecha para comprobar el desempate por id
+    rows = [{"id": i, "created_at": f"2024-01-0{min(i, 5)}T00:00:00"} for i in range(1, 8)]
+    client = _FakeQuery(rows)
+    monkeypatch.setattr(repository, "get_supabase_client", lambda: client)
+    return client
+
+
+def test_cursor_round_trip():
+    cursor = _encode_cursor({"id": 42, "created_at": "2024-01-01T10:00:00+00:00", "text": "x"})
+    assert _decode_cursor(cursor) == ("2024-01-01T10:00:00+00:00", 42)
+
+
+def test_invalid_cursor_raises_value_error():
+    with pytest.raises(ValueError):
+        _decode_cursor("no-es-un-cursor")
+
+
+@pytest.mark.parametrize("payload", [
+    {"created_at": "2024-01-01T00:00:00,id.gt.0)", "id": 1},
+    {"created_at": "2024-01-01T00:00:00", "id": "1),or(id.gt.0"},
+    {"created_at": "2024-01-01T00:00:00", "id": 1.5},
+    {"created_at": 20240101, "id": 1},
+    {"id": 1},
+])
+def test_crafted_cursor_is_rejected(payload):
+    cursor = base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")
+    with pytest.raises(ValueError):
+        _decode_cursor(cursor)
+
+
+def test_uuid_ids_are_accepted():
+    row_id = "3f2504e0-4f89-11d3-9a0c-0305e82c3301"
+    assert _decode_cursor(_encode_cursor({"id": row_id, "created_at": "2024-01-01T00:00:00"}))[1] == row_id
+
+
+def test_pages_cover_every_post_once_in_order(posts):
+    seen, cursor = [], None
+    while True:
+        page = get_recent_posts(limit=3, cursor=cursor)
+        seen.extend(row["id"] for row in page["results"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [7, 6, 5, 4, 3, 2, 1]
+
+
+def test_last_page_has_no_cursor(posts):
+    page = get_recent_posts(limit=7)
+    assert len(page["results"]) == 7
+    assert page["next_cursor"] is None
+
+
+def test_missing_client_raises(monkeypatch):
+    monkeypatch.setattr(repository, "get_supabase_client", lambda: None)
+    with pytest.raises(RuntimeError):
+        get_recent_posts()
@@ -0,0 +1,91 @@
+import time
+import threading
+from backend.llm.errors import APIError, RequestCancelledError
+from backend.llm.rate_limit import ModelBudget, RateLimiter
+from backend.llm.router import Backend, LLMRouter
+
+
+class _FakeClient:
+    """Cliente con espera en cola (`queued_s`) antes de enviar y latencia de respuesta (`latency_s`)."""
+
+    def __init__(self, text, queued_s=0.0, latency_s=0.0, error=None):
+        self.text = text
+        self.queued_s = queued_s
+        self.latency_s = latency_s
+        self.error = error
+        self.limiter = RateLimiter()
+        self.calls = 0
+
+    def complete_text(self, payload, cancel=None, on_send=None):
+        self.calls += 1
+        time.sleep(self.queued_s)
+        if on_send is not None:
+            on_send()
+        time.sleep(self.latency_s)
+        if cancel is not None and cancel.is_set():
+            raise RequestCancelledError("abandonada", model=payload["model"])
+        if self.error is not None:
+            raise self.error
+        return self.text
+
+
+def _router(*clients, hedge_s=0.2):
+    backends = [Backend(f"b{index}", client) for index, client in enumerate(clients)]
+    for backend in backends:
+        backend.hedge_delay_s = lambda: hedge_s
+    return LLMRouter(backends)
+
+
+def test_time_queued_before_sending_does_not_trigger_a_hedge():
+    primary, secondary = _FakeClient("primary", queued_s=0.4, latency_s=0.05), _FakeClient("secondary")
+    assert _router(primary, secondary).complete_text({"model": "m"}) == "primary"
+    assert secondary.calls == 0
+
+
+def test_slow_primary_is_hedged_after_sending():
+    primary, secondary = _FakeClient("primary", latency_s=0.6), _FakeClient("secondary", latency_s=0.05)
+    assert _router(primary, secondary).complete_text({"model": "m"}) == "secondary"
+    assert secondary.calls == 1
+
+
+def test_hedge_loser_latency_is_recorded_as_censored():
+    primary, secondary = _FakeClient("primary", latency_s=0.4), _FakeClient("secondary", latency_s=0.05)
+    router = _router(primary, secondary)
+    assert router.complete_text({"model": "m"}) == "secondary"
+    loser = router.backends[0].stats
+    deadline = time.monotonic() + 2
+    while loser.snapshot()["samples"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert loser.snapshot()["censored"] == 1
+    assert loser.error_rate() == 0.0
+    assert loser._latencies()[0] >= 0.4
+
+
+def test_failover_when_primary_fails():
+    primary = _FakeClient("primary", error=APIError("caído", status_code=500))
+    secondary = _FakeClient("secondary")
+    assert _router(primary, secondary).complete_text({"model": "m"}) == "secondary"
+
+
+def test_acquire_leaves_the_queue_when_cancelled():
+    budget = ModelBudget("m", rpm=1, tpm=1000)
+    budget.acquire(10)
+    cancel = threading.Event()
+    threading.Timer(0.1, cancel.set).start()
+    start = time.monotonic()
+    try:
+        budget.acquire(10, timeout_s=120, cancel=cancel)
+    except RequestCancelledError:
+        pass
+    else:
+        raise AssertionError("acquire debía abandonar la cola")
+    assert time.monotonic() - start < 1
+    assert not budget._queue
+
+
+def test_release_returns_request_slot_and_tokens():
+    budget = ModelBudget("m", rpm=2, tpm=1000)
+    budget.acquire(300)
+    budget.release(300)
+    assert budget.requests.tokens == 2
+    assert budget.tokens.tokens == 1000
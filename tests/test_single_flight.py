@@ -0,0 +1,84 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from backend.single_flight import SingleFlight
+
+
+def _blocking(calls, release):
+    def fn(value):
+        calls.append(value)
+        release.wait(5)
+        return value * 2
+    return fn
+
+
+def _wait_for_leader(flight, key):
+    for _ in range(500):
+        if key in flight._in_flight:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError("el leader no llegó a registrarse")
+
+
+def test_concurrent_calls_share_one_execution():
+    flight, calls, release = SingleFlight("test"), [], threading.Event()
+    fn = _blocking(calls, release)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        leader = pool.submit(flight.do, "k", fn, 21)
+        _wait_for_leader(flight, "k")
+        followers = [pool.submit(flight.do, "k", fn, 21) for _ in range(3)]
+        release.set()
+        results = [leader.result(5)] + [future.result(5) for future in followers]
+    assert results == [42] * 4
+    assert calls == [21]
+    assert flight._in_flight == {}
+
+
+def test_followers_receive_the_leader_exception():
+    flight, release = SingleFlight("test"), threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise ValueError("fallo")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.do, "k", failing)
+        _wait_for_leader(flight, "k")
+        follower = pool.submit(flight.do, "k", failing)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(ValueError):
+                future.result(5)
+    assert flight._in_flight == {}
+
+
+def test_calls_after_completion_run_again():
+    flight, calls = SingleFlight("test"), []
+    assert flight.do("k", lambda: calls.append(1) or len(calls)) == 1
+    assert flight.do("k", lambda: calls.append(1) or len(calls)) == 2
+
+
+def test_different_keys_do_not_coalesce():
+    flight, calls, release = SingleFlight("test"), [], threading.Event()
+    fn = _blocking(calls, release)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        first = pool.submit(flight.do, "a", fn, 1)
+        second = pool.submit(flight.do, "b", fn, 2)
+        release.set()
+        assert (first.result(5), second.result(5)) == (2, 4)
+    assert sorted(calls) == [1, 2]
+
+
+def test_async_callers_coalesce_with_each_other():
+    flight, calls, release = SingleFlight("test"), [], threading.Event()
+    fn = _blocking(calls, release)
+
+    async def main():
+        tasks = [asyncio.create_task(flight.do_async("k", fn, 5)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(*tasks)
+
+    assert asyncio.run(main()) == [10, 10, 10]
+    assert calls == [5]